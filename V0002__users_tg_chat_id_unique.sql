@@ -0,0 +1,19 @@
+-- Merge users registered more than once for the same chat into the earliest record
+UPDATE communications.messages AS m
+SET user_id = keep.user_id
+FROM communications.users AS u
+JOIN (
+    SELECT tg_chat_id, MIN(user_id) AS user_id
+    FROM communications.users
+    GROUP BY tg_chat_id
+) AS keep ON keep.tg_chat_id = u.tg_chat_id
+WHERE m.user_id = u.user_id
+  AND u.user_id <> keep.user_id;
+
+DELETE FROM communications.users AS u
+USING communications.users AS earlier
+WHERE earlier.tg_chat_id = u.tg_chat_id
+  AND earlier.user_id < u.user_id;
+
+CREATE UNIQUE INDEX users_tg_chat_id_key
+    ON communications.users (tg_chat_id);
@@ -0,0 +1,10 @@
+-- Aiogram FSM state per chat and user, shared by all bot worker processes
+CREATE TABLE communications.fsm_states (
+    chat_id             BIGINT NOT NULL,
+    user_id             BIGINT NOT NULL,
+    state               TEXT,
+    data                JSONB NOT NULL              DEFAULT '{}',
+    bucket              JSONB NOT NULL              DEFAULT '{}',
+    dttm_updated        TIMESTAMPTZ NOT NULL        DEFAULT NOW(),
+    PRIMARY KEY (chat_id, user_id)
+);
@@ -0,0 +1,108 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request cannot be admitted because the wait queue is full.
+    """
+
+
+class ConcurrencyLimiter:
+    """
+    Bound the number of conversations running on the event loop at once.
+
+    At most `max_concurrency` holders run concurrently; up to `max_queue` more
+    wait for a slot, and anything beyond that is rejected immediately with
+    `Overloaded` so the caller can shed load (HTTP 503) instead of letting
+    latency grow without bound. Waiters that exceed `queue_timeout` are
+    rejected the same way.
+
+    Must be used from a single event loop; the semaphore is created on first
+    use so it binds to the loop serving requests.
+    """
+
+    def __init__(self, max_concurrency: int = 100, max_queue: int = 200, queue_timeout: float = 30.0) -> None:
+        """
+        Parameters:
+        ----------
+        max_concurrency : int
+            Conversations processed at the same time
+        max_queue : int
+            Requests allowed to wait for a free slot
+        queue_timeout : float
+            Seconds a request may wait for a slot before being rejected
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold one concurrency slot for the duration of the block.
+
+        Raises:
+        ------
+        Overloaded
+            If the wait queue is full or the wait exceeds `queue_timeout`
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("Too many concurrent requests.")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded("Timed out waiting for a free slot.")
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the number of running, waiting and rejected requests.
+        """
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+def limiter_from_env() -> ConcurrencyLimiter:
+    """
+    Build the request limiter from environment variables.
+
+    Environment variables:
+    ----------------------
+    AGENT_MAX_CONCURRENCY : int
+        Conversations processed at the same time (default: 100).
+    AGENT_MAX_QUEUE : int
+        Requests allowed to wait for a slot before getting 503 (default: 200).
+    AGENT_QUEUE_TIMEOUT : float
+        Seconds a request may wait for a slot (default: 30).
+    """
+    return ConcurrencyLimiter(
+        max_concurrency=int(os.getenv("AGENT_MAX_CONCURRENCY", "100")),
+        max_queue=int(os.getenv("AGENT_MAX_QUEUE", "200")),
+        queue_timeout=float(os.getenv("AGENT_QUEUE_TIMEOUT", "30")),
+    )
@@ -0,0 +1,212 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.messages import (
+    AIMessage,
+    AnyMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    ToolMessage,
+    trim_messages,
+)
+
+from prompts import summary_prompt
+
+# Appended to tool outputs cut after use
+TRUNCATED_MARK = " …[сокращено]"
+
+
+def approximate_tokens(messages: Sequence[BaseMessage], chars_per_token: float = 3.0) -> int:
+    """
+    Estimate the prompt tokens of `messages` from their length.
+
+    GigaChat only counts tokens through an API call, so the budget is kept
+    with a character ratio instead (about 3 characters per token for Russian
+    text) plus a small per-message overhead.
+    """
+    total = 0
+    for message in messages:
+        text = message.content if isinstance(message.content, str) else str(message.content)
+        if isinstance(message, AIMessage) and message.tool_calls:
+            text += str(message.tool_calls)
+        total += int(len(text) / chars_per_token) + 4
+    return total
+
+
+def usage_of(message: BaseMessage) -> Dict[str, int]:
+    """
+    Read the token usage reported for one LLM response.
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return {
+            "prompt_tokens": usage.get("input_tokens", 0),
+            "completion_tokens": usage.get("output_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0),
+        }
+    usage = message.response_metadata.get("token_usage") or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "total_tokens": usage.get("total_tokens", 0),
+    }
+
+
+def add_usage(total: Optional[Dict[str, int]], message: BaseMessage) -> Dict[str, int]:
+    """
+    Add the usage of one LLM response to a turn's running totals.
+    """
+    result = dict(total or {})
+    for name, value in usage_of(message).items():
+        result[name] = result.get(name, 0) + value
+    result["llm_calls"] = result.get("llm_calls", 0) + 1
+    return result
+
+
+@dataclass
+class Compaction:
+    """
+    Changes needed to bring a conversation back within budget.
+
+    Attributes:
+    -----------
+    updates : List[AnyMessage]
+        Shortened copies of consumed tool outputs (same IDs, replacing the originals).
+    evicted : List[AnyMessage]
+        Oldest messages to fold into the summary and remove from state.
+    """
+    updates: List[AnyMessage] = field(default_factory=list)
+    evicted: List[AnyMessage] = field(default_factory=list)
+
+
+class ContextWindow:
+    """
+    Token budget for the conversation history sent to the LLM.
+
+    Before each turn, tool outputs from earlier turns are cut to
+    `tool_output_chars` (the assistant has already used them), and when the
+    history exceeds `max_tokens` the oldest turns are evicted until
+    `window_tokens` remain; evicted turns are folded into a rolling summary
+    kept in state. The window always starts at a user message, so tool calls
+    are never separated from their results.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 4000,
+        window_tokens: int = 2000,
+        tool_output_chars: int = 1500,
+        chars_per_token: float = 3.0,
+    ) -> None:
+        """
+        Parameters:
+        ----------
+        max_tokens : int
+            History size that triggers summarization
+        window_tokens : int
+            History size kept verbatim after summarization
+        tool_output_chars : int
+            Length tool outputs of earlier turns are cut to
+        chars_per_token : float
+            Characters per token used to estimate sizes
+        """
+        self.max_tokens = max_tokens
+        self.window_tokens = window_tokens
+        self.tool_output_chars = tool_output_chars
+        self.chars_per_token = chars_per_token
+
+    def count(self, messages: Sequence[BaseMessage]) -> int:
+        return approximate_tokens(messages, self.chars_per_token)
+
+    def plan(self, messages: Sequence[AnyMessage]) -> Compaction:
+        """
+        Decide which tool outputs to shorten and which messages to evict.
+
+        Parameters:
+        ----------
+        messages : Sequence[AnyMessage]
+            Thread history, ending with the new user message
+
+        Returns:
+        -------
+        Compaction
+            Replacement messages and messages to evict (both may be empty)
+        """
+        compaction = Compaction()
+        messages = list(messages)
+        for position, message in enumerate(messages[:-1]):
+            content = str(message.content)
+            if (
+                isinstance(message, ToolMessage)
+                and len(content) > self.tool_output_chars
+                and not content.endswith(TRUNCATED_MARK)
+            ):
+                short = message.model_copy(update={"content": content[:self.tool_output_chars] + TRUNCATED_MARK})
+                compaction.updates.append(short)
+                messages[position] = short
+
+        if self.count(messages) <= self.max_tokens:
+            return compaction
+
+        window = trim_messages(
+            messages,
+            max_tokens=self.window_tokens,
+            token_counter=self.count,
+            strategy="last",
+            start_on="human",
+        )
+        if not window:
+            # The latest turn alone exceeds the window: keep it whole
+            last_human = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+            window = messages[last_human:]
+        kept = {message.id for message in window}
+        compaction.evicted = [message for message in messages if message.id not in kept]
+        evicted_ids = {message.id for message in compaction.evicted}
+        compaction.updates = [message for message in compaction.updates if message.id not in evicted_ids]
+        return compaction
+
+    def summary_request(self, previous: str, evicted: Sequence[AnyMessage]) -> List[HumanMessage]:
+        """
+        Build the LLM request folding `evicted` messages into the `previous` summary.
+        """
+        lines = []
+        for message in evicted:
+            if isinstance(message, HumanMessage):
+                lines.append(f"Пользователь: {message.content}")
+            elif isinstance(message, AIMessage) and message.content:
+                lines.append(f"Ассистент: {message.content}")
+            elif isinstance(message, ToolMessage):
+                lines.append(f"Результат поиска: {str(message.content)[:self.tool_output_chars]}")
+        return [HumanMessage(content=summary_prompt.format(
+            previous=f"Предыдущее содержание:\n{previous}" if previous else "",
+            messages="\n".join(lines),
+        ))]
+
+    @staticmethod
+    def removals(evicted: Sequence[AnyMessage]) -> List[RemoveMessage]:
+        return [RemoveMessage(id=message.id) for message in evicted]
+
+
+def context_window_from_env() -> ContextWindow:
+    """
+    Build the history budget from environment variables.
+
+    Environment variables:
+    ----------------------
+    CONTEXT_MAX_TOKENS : int
+        History size that triggers summarization (default: 4000).
+    CONTEXT_WINDOW_TOKENS : int
+        History size kept verbatim after summarization (default: 2000).
+    TOOL_OUTPUT_MAX_CHARS : int
+        Length tool outputs of earlier turns are cut to (default: 1500).
+    CONTEXT_CHARS_PER_TOKEN : float
+        Characters per token for size estimates (default: 3.0).
+    """
+    return ContextWindow(
+        max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "4000")),
+        window_tokens=int(os.getenv("CONTEXT_WINDOW_TOKENS", "2000")),
+        tool_output_chars=int(os.getenv("TOOL_OUTPUT_MAX_CHARS", "1500")),
+        chars_per_token=float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "3.0")),
+    )
@@ -14,4 +14,27 @@ output_format = """
     "reasoning": "<тут рассуждение про себя>",
     "answer": "<в формате текста финальный ответ>"
 }}
-"""
\ No newline at end of file
+"""
+catalogue_prompt = """
+Ниже сведения из каталога турагентства, найденные по вопросу пользователя.
+Отвечай на их основе. Поиск в интернете для этого вопроса недоступен: если сведений не хватает,
+поищи в каталоге ещё раз инструментом catalogue_search или прямо скажи, каких сведений в каталоге нет.
+
+{context}
+"""
+
+summary_prompt = """
+Кратко перескажи диалог туристического ассистента с пользователем, чтобы продолжить его без исходных сообщений.
+Сохрани пожелания пользователя (направления, даты, бюджет, состав туристов), уже предложенные варианты и ссылки, принятые решения.
+Пиши по-русски, не более 10 предложений.
+
+{previous}
+
+Новые сообщения:
+{messages}
+"""
+
+history_prompt = """
+Краткое содержание предыдущей части диалога:
+{summary}
+"""
@@ -0,0 +1,291 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+from langchain_core.embeddings import Embeddings
+from langchain_core.tools import BaseTool, StructuredTool
+
+
+class FaissServiceClient:
+    """
+    Client for the Faiss service over pooled keep-alive HTTP connections.
+
+    One sync and one async `httpx` client are created per instance and reused
+    for every call, so retrieval does not pay connection setup per query.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 5.0, max_connections: int = 20) -> None:
+        """
+        Parameters:
+        ----------
+        base_url : str
+            Faiss service URL, e.g. http://faiss:5000
+        timeout : float
+            Per-request timeout in seconds
+        max_connections : int
+            Connection pool size of each underlying client
+        """
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client = httpx.Client(base_url=base_url, timeout=timeout, limits=limits)
+        self._aclient = httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits)
+
+    def search(self, key: str, vector: List[float], k: int, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Call `/search` and return its JSON response.
+
+        Raises:
+        ------
+        httpx.HTTPError
+            If the service is unreachable or returns an error status
+        """
+        resp = self._client.post("/search", json={"key": key, "query": vector, "k": k, "fields": fields})
+        resp.raise_for_status()
+        return resp.json()
+
+    async def asearch(
+        self, key: str, vector: List[float], k: int, fields: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Async variant of `search`.
+        """
+        resp = await self._aclient.post("/search", json={"key": key, "query": vector, "k": k, "fields": fields})
+        resp.raise_for_status()
+        return resp.json()
+
+    def create_index(self, key: str, dimension: int, index: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Call `/create_index`; an already existing index is not an error.
+
+        Returns:
+        -------
+        bool
+            True if the index was created, False if it already existed
+        """
+        payload = {"key": key, "dimension": dimension, "index": index or {}}
+        resp = self._client.post("/create_index", json=payload)
+        if resp.status_code == 400 and "already exists" in resp.text:
+            return False
+        resp.raise_for_status()
+        return True
+
+    async def acreate_index(self, key: str, dimension: int, index: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Async variant of `create_index`.
+        """
+        payload = {"key": key, "dimension": dimension, "index": index or {}}
+        resp = await self._aclient.post("/create_index", json=payload)
+        if resp.status_code == 400 and "already exists" in resp.text:
+            return False
+        resp.raise_for_status()
+        return True
+
+    def upsert(
+        self, key: str, ids: List[int], vectors: List[List[float]], metadata: Dict[str, List[Any]]
+    ) -> None:
+        """
+        Call `/upsert/{key}` with columnar metadata.
+        """
+        resp = self._client.post(f"/upsert/{key}", json={"ids": ids, "vectors": vectors, "metadata": metadata})
+        resp.raise_for_status()
+
+    async def aupsert(
+        self, key: str, ids: List[int], vectors: List[List[float]], metadata: Dict[str, List[Any]]
+    ) -> None:
+        """
+        Async variant of `upsert`.
+        """
+        resp = await self._aclient.post(
+            f"/upsert/{key}", json={"ids": ids, "vectors": vectors, "metadata": metadata}
+        )
+        resp.raise_for_status()
+
+    def remove_ids(self, key: str, ids: List[int]) -> int:
+        """
+        Call `/remove_ids/{key}` and return the number of vectors removed.
+        """
+        resp = self._client.post(f"/remove_ids/{key}", json={"ids": ids})
+        resp.raise_for_status()
+        return resp.json()["removed"]
+
+    async def aremove_ids(self, key: str, ids: List[int]) -> int:
+        """
+        Async variant of `remove_ids`.
+        """
+        resp = await self._aclient.post(f"/remove_ids/{key}", json={"ids": ids})
+        resp.raise_for_status()
+        return resp.json()["removed"]
+
+    def close(self) -> None:
+        self._client.close()
+
+    async def aclose(self) -> None:
+        await self._aclient.aclose()
+
+
+@dataclass
+class Passage:
+    """
+    Catalogue passage returned by retrieval.
+    """
+    text: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class CatalogueRetriever:
+    """
+    Embed a question and fetch the closest catalogue passages from a Faiss index.
+
+    Attributes:
+    -----------
+    embedder : Embeddings
+        Model turning text into vectors (GigaChatEmbeddings in production).
+    index : FaissServiceClient
+        Vector index holding catalogue passages with a text metadata field,
+        or any object with the same search methods.
+    key : str
+        Index key in the Faiss service.
+    k : int
+        Number of passages to return.
+    min_score : float
+        Cosine similarity above which local passages are trusted over web search.
+    text_field : str
+        Metadata field holding the passage text.
+    """
+
+    def __init__(
+        self,
+        embedder: Embeddings,
+        index: Any,
+        key: str = "catalogue",
+        k: int = 3,
+        min_score: float = 0.75,
+        text_field: str = "text",
+    ) -> None:
+        self.embedder = embedder
+        self.index = index
+        self.key = key
+        self.k = k
+        self.min_score = min_score
+        self.text_field = text_field
+
+    def _passages(self, response: Dict[str, Any]) -> List[Passage]:
+        """
+        Convert a search response into passages, skipping empty hits.
+        """
+        passages = []
+        scores = response["cosine_similarities"][0]
+        metadata = response.get("metadata") or [[None] * len(scores)]
+        for score, meta in zip(scores, metadata[0]):
+            if meta and meta.get(self.text_field):
+                passages.append(Passage(text=meta[self.text_field], score=score, metadata=meta))
+        return passages
+
+    def retrieve(self, query: str) -> List[Passage]:
+        """
+        Return the top-k catalogue passages for `query`, best first.
+        """
+        vector = self.embedder.embed_query(query)
+        return self._passages(self.index.search(self.key, vector, self.k, ["*"]))
+
+    async def aretrieve(self, query: str) -> List[Passage]:
+        """
+        Async variant of `retrieve`.
+        """
+        vector = await self.embedder.aembed_query(query)
+        return self._passages(await self.index.asearch(self.key, vector, self.k, ["*"]))
+
+    def is_confident(self, passages: List[Passage]) -> bool:
+        """
+        Whether the best passage is similar enough to answer without web search.
+        """
+        return bool(passages) and passages[0].score >= self.min_score
+
+
+def format_passages(passages: List[Passage]) -> str:
+    """
+    Render passages as a numbered list for the LLM.
+    """
+    if not passages:
+        return "В каталоге ничего не найдено."
+    return "\n\n".join(f"[{i}] {p.text}" for i, p in enumerate(passages, 1))
+
+
+def make_catalogue_tool(retriever: CatalogueRetriever) -> BaseTool:
+    """
+    Wrap a retriever as a LangChain tool the LLM can call.
+    """
+    def catalogue_search(query: str) -> str:
+        """Искать туры, отели и условия в каталоге турагентства"""
+        return format_passages(retriever.retrieve(query))
+
+    async def acatalogue_search(query: str) -> str:
+        return format_passages(await retriever.aretrieve(query))
+
+    return StructuredTool.from_function(
+        func=catalogue_search,
+        coroutine=acatalogue_search,
+        name="catalogue_search",
+        description="Искать туры, отели и условия в каталоге турагентства",
+    )
+
+
+_faiss_client: Optional[FaissServiceClient] = None
+_embedder: Optional[Embeddings] = None
+
+
+def faiss_client_from_env() -> FaissServiceClient:
+    """
+    Return the process-wide Faiss service client for FAISS_URL, so every
+    component shares one connection pool.
+    """
+    global _faiss_client
+    if _faiss_client is None:
+        _faiss_client = FaissServiceClient(os.getenv("FAISS_URL"))
+    return _faiss_client
+
+
+def embedder_from_env() -> Embeddings:
+    """
+    Return the process-wide GigaChat embeddings client (GIGACHAT_API_KEY).
+    """
+    global _embedder
+    if _embedder is None:
+        from langchain_gigachat import GigaChatEmbeddings
+
+        _embedder = GigaChatEmbeddings(
+            credentials=os.getenv("GIGACHAT_API_KEY"),
+            scope="GIGACHAT_API_PERS",
+            verify_ssl_certs=False,
+        )
+    return _embedder
+
+
+def retriever_from_env() -> Optional[CatalogueRetriever]:
+    """
+    Build the catalogue retriever from environment variables.
+
+    Environment variables:
+    ----------------------
+    FAISS_URL : str
+        Faiss service URL; retrieval is disabled when unset.
+    CATALOGUE_INDEX : str
+        Index key holding catalogue passages (default: catalogue).
+    RETRIEVAL_K : int
+        Number of passages per query (default: 3).
+    RETRIEVAL_MIN_SCORE : float
+        Similarity needed to skip web search (default: 0.75).
+    GIGACHAT_API_KEY : str
+        API key for GigaChat embeddings.
+    """
+    url = os.getenv("FAISS_URL")
+    if not url:
+        return None
+    return CatalogueRetriever(
+        embedder_from_env(),
+        faiss_client_from_env(),
+        key=os.getenv("CATALOGUE_INDEX", "catalogue"),
+        k=int(os.getenv("RETRIEVAL_K", "3")),
+        min_score=float(os.getenv("RETRIEVAL_MIN_SCORE", "0.75")),
+    )
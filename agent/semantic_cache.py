@@ -0,0 +1,324 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from langchain_core.embeddings import Embeddings
+
+from retrieval import embedder_from_env, faiss_client_from_env
+
+
+@dataclass
+class CacheLookup:
+    """
+    Result of a semantic cache lookup.
+
+    Attributes:
+    -----------
+    answer : str | None
+        Cached answer on a hit, None on a miss.
+    vector : List[float]
+        Embedding of the normalized question, reused by `store` after a miss.
+    score : float
+        Similarity of the closest cached question (0.0 if none).
+    """
+    answer: Optional[str]
+    vector: List[float]
+    score: float = 0.0
+
+
+def normalize_question(text: str) -> str:
+    """
+    Lower-case, strip punctuation and collapse whitespace so trivial variants embed alike.
+    """
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+class SemanticCache:
+    """
+    Cache of agent answers keyed by question embeddings, stored in the Faiss service.
+
+    Question vectors live in an ID-mapped flat index of the Faiss service with
+    the answer, creation time and token cost as metadata. A lookup is a hit
+    when the closest cached question has cosine similarity of at least
+    `threshold` and is younger than `ttl`. Recency is tracked locally in an
+    ordered dict; entries beyond `max_entries` are evicted least recently used
+    first and removed from the service.
+
+    `max_entries` bounds the entries this process has written or hit, not the
+    service index: entries left by earlier runs or by other agent processes
+    are not counted, and leave the index only when a lookup finds them
+    expired.
+
+    Thread-safe; `alookup` and `astore` are the variants for use from the event loop.
+    """
+
+    def __init__(
+        self,
+        embedder: Embeddings,
+        index: Any,
+        key: str = "semantic_cache",
+        threshold: float = 0.92,
+        ttl: float = 24 * 3600,
+        max_entries: int = 10000,
+        session_gap: float = 1800,
+    ) -> None:
+        """
+        Parameters:
+        ----------
+        embedder : Embeddings
+            Model turning questions into vectors
+        index : FaissServiceClient
+            Vector index client supporting create_index, search, upsert and remove_ids
+        key : str
+            Index key in the Faiss service
+        threshold : float
+            Minimum cosine similarity for a hit
+        ttl : float
+            Entry lifetime in seconds
+        max_entries : int
+            Maximum number of cached answers written or hit by this process
+        session_gap : float
+            Idle time in seconds after which a thread's next message starts a
+            new conversation and may be answered from the cache
+        """
+        self.embedder = embedder
+        self.index = index
+        self.key = key
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.session_gap = session_gap
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[int, float]" = OrderedDict()  # entry ID -> created_at
+        self._next_id = int(time.time() * 1000) << 16  # Unique across restarts
+        self._index_ready = False
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+
+    def lookup(self, question: str) -> CacheLookup:
+        """
+        Look up a cached answer for `question`.
+
+        An unreachable Faiss service counts as a miss.
+        """
+        vector = self.embedder.embed_query(normalize_question(question))
+        try:
+            response = self.index.search(self.key, vector, 1, ["answer", "created_at", "tokens"])
+        except httpx.HTTPError:
+            response = None
+        lookup, expired = self._evaluate(vector, response)
+        if expired is not None:
+            self._remove([expired])
+        return lookup
+
+    async def alookup(self, question: str) -> CacheLookup:
+        """
+        Async variant of `lookup`.
+        """
+        vector = await self.embedder.aembed_query(normalize_question(question))
+        try:
+            response = await self.index.asearch(self.key, vector, 1, ["answer", "created_at", "tokens"])
+        except httpx.HTTPError:
+            response = None
+        lookup, expired = self._evaluate(vector, response)
+        if expired is not None:
+            await self._aremove([expired])
+        return lookup
+
+    def _evaluate(self, vector: List[float], response: Optional[Dict[str, Any]]) -> Tuple[CacheLookup, Optional[int]]:
+        """
+        Turn a search response into a lookup result and update the counters.
+
+        Returns:
+        -------
+        Tuple[CacheLookup, Optional[int]]
+            The lookup and the ID of an expired closest entry to remove, if any
+        """
+        hit = None
+        expired = None
+        score = 0.0
+        if response and response["indices"][0] and response["indices"][0][0] >= 0:
+            entry_id = response["indices"][0][0]
+            score = response["cosine_similarities"][0][0]
+            meta = (response.get("metadata") or [[None]])[0][0]
+            if meta and score >= self.threshold:
+                if time.time() - meta["created_at"] > self.ttl:
+                    expired = entry_id
+                else:
+                    hit = (entry_id, meta)
+
+        with self._lock:
+            if hit is None:
+                self.misses += 1
+                return CacheLookup(answer=None, vector=vector, score=score), expired
+            entry_id, meta = hit
+            self.hits += 1
+            self.saved_tokens += meta.get("tokens") or 0
+            self._lru[entry_id] = meta["created_at"]
+            self._lru.move_to_end(entry_id)
+        return CacheLookup(answer=meta["answer"], vector=vector, score=score), None
+
+    def store(self, lookup: CacheLookup, answer: str, tokens: int = 0) -> None:
+        """
+        Cache `answer` for the question of a missed `lookup`, evicting LRU entries if full.
+
+        The cache index is not saved by the Faiss service, so after a service
+        restart the upsert gets a 404; the index is then created again and
+        the entry written to it.
+        """
+        entry_id, now, evicted = self._reserve()
+        columns = {"answer": [answer], "created_at": [now], "tokens": [tokens]}
+        try:
+            try:
+                self._upsert(entry_id, lookup.vector, columns)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise
+                self._index_lost(entry_id)
+                self._upsert(entry_id, lookup.vector, columns)
+        except httpx.HTTPError:
+            with self._lock:
+                self._lru.pop(entry_id, None)
+        if evicted:
+            self._remove(evicted)
+
+    async def astore(self, lookup: CacheLookup, answer: str, tokens: int = 0) -> None:
+        """
+        Async variant of `store`.
+        """
+        entry_id, now, evicted = self._reserve()
+        columns = {"answer": [answer], "created_at": [now], "tokens": [tokens]}
+        try:
+            try:
+                await self._aupsert(entry_id, lookup.vector, columns)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise
+                self._index_lost(entry_id)
+                await self._aupsert(entry_id, lookup.vector, columns)
+        except httpx.HTTPError:
+            with self._lock:
+                self._lru.pop(entry_id, None)
+        if evicted:
+            await self._aremove(evicted)
+
+    def _upsert(self, entry_id: int, vector: List[float], columns: Dict[str, List[Any]]) -> None:
+        """
+        Write one entry, creating the cache index first if this process has not yet.
+        """
+        if not self._index_ready:
+            self.index.create_index(self.key, len(vector), {"type": "flat", "id_map": True})
+            self._index_ready = True
+        self.index.upsert(self.key, [entry_id], [vector], columns)
+
+    async def _aupsert(self, entry_id: int, vector: List[float], columns: Dict[str, List[Any]]) -> None:
+        """
+        Async variant of `_upsert`.
+        """
+        if not self._index_ready:
+            await self.index.acreate_index(self.key, len(vector), {"type": "flat", "id_map": True})
+            self._index_ready = True
+        await self.index.aupsert(self.key, [entry_id], [vector], columns)
+
+    def _index_lost(self, entry_id: int) -> None:
+        """
+        Forget the cache index and its entries, except `entry_id`, after the service lost them.
+        """
+        with self._lock:
+            self._index_ready = False
+            self._lru = OrderedDict((key, created) for key, created in self._lru.items() if key == entry_id)
+
+    def _reserve(self) -> Tuple[int, float, List[int]]:
+        """
+        Allocate an entry ID and pop LRU entries beyond `max_entries`.
+
+        Returns:
+        -------
+        Tuple[int, float, List[int]]
+            New entry ID, its creation time and the IDs evicted to make room
+        """
+        now = time.time()
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._lru[entry_id] = now
+            evicted = []
+            while len(self._lru) > self.max_entries:
+                evicted.append(self._lru.popitem(last=False)[0])
+        return entry_id, now, evicted
+
+    def _remove(self, ids: List[int]) -> None:
+        """
+        Drop entries locally and from the Faiss service.
+        """
+        with self._lock:
+            for entry_id in ids:
+                self._lru.pop(entry_id, None)
+        try:
+            self.index.remove_ids(self.key, ids)
+        except httpx.HTTPError:
+            pass
+
+    async def _aremove(self, ids: List[int]) -> None:
+        """
+        Async variant of `_remove`.
+        """
+        with self._lock:
+            for entry_id in ids:
+                self._lru.pop(entry_id, None)
+        try:
+            await self.index.aremove_ids(self.key, ids)
+        except httpx.HTTPError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return hit/miss counters, hit rate and tokens saved by cache hits.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "saved_tokens": self.saved_tokens,
+                "entries": len(self._lru),
+            }
+
+
+def semantic_cache_from_env() -> Optional[SemanticCache]:
+    """
+    Build the semantic cache from environment variables.
+
+    Environment variables:
+    ----------------------
+    SEMANTIC_CACHE : str
+        "1" enables the cache (also requires FAISS_URL).
+    SEMANTIC_CACHE_INDEX : str
+        Index key in the Faiss service (default: semantic_cache).
+    SEMANTIC_CACHE_THRESHOLD : float
+        Minimum cosine similarity for a hit (default: 0.92).
+    SEMANTIC_CACHE_TTL : float
+        Entry lifetime in seconds (default: 86400).
+    SEMANTIC_CACHE_MAX_ENTRIES : int
+        Maximum number of cached answers per agent process (default: 10000).
+    SEMANTIC_CACHE_SESSION_GAP : float
+        Idle seconds after which a thread counts as a new conversation (default: 1800).
+    """
+    if os.getenv("SEMANTIC_CACHE", "0") != "1" or not os.getenv("FAISS_URL"):
+        return None
+    return SemanticCache(
+        embedder_from_env(),
+        faiss_client_from_env(),
+        key=os.getenv("SEMANTIC_CACHE_INDEX", "semantic_cache"),
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+        ttl=float(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600))),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000")),
+        session_gap=float(os.getenv("SEMANTIC_CACHE_SESSION_GAP", "1800")),
+    )
@@ -0,0 +1,246 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Set
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from prometheus_client import Counter, Histogram
+
+# Wall time of one /query or /query/stream request
+REQUEST_LATENCY = Histogram(
+    "agent_request_seconds",
+    "Time to answer one request",
+    ["endpoint", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+# Time from request start to the first streamed token
+FIRST_TOKEN_LATENCY = Histogram(
+    "agent_stream_first_token_seconds",
+    "Time until the first token of a streamed answer",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32),
+)
+
+# Time spent in one execution of a graph node
+NODE_LATENCY = Histogram(
+    "agent_node_seconds",
+    "Time spent in one graph node execution",
+    ["node"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32),
+)
+
+# Latency of one LLM call
+LLM_LATENCY = Histogram(
+    "agent_llm_call_seconds",
+    "Latency of one LLM call",
+    ["node"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+
+# Tokens reported by the LLM
+LLM_TOKENS = Counter(
+    "agent_llm_tokens_total",
+    "Tokens consumed by LLM calls",
+    ["node", "kind"],
+)
+
+# Tool invocations and their latency
+TOOL_CALLS = Counter(
+    "agent_tool_calls_total",
+    "Tool invocations",
+    ["tool", "outcome"],
+)
+TOOL_LATENCY = Histogram(
+    "agent_tool_seconds",
+    "Latency of one tool invocation",
+    ["tool"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16),
+)
+
+# Checkpoint reads and writes, by operation and the tier that served them
+CHECKPOINT_LATENCY = Histogram(
+    "agent_checkpoint_seconds",
+    "Latency of checkpoint operations",
+    ["op", "tier"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+
+class RequestTrace(BaseCallbackHandler):
+    """
+    Callback handler timing one request's graph nodes, LLM calls and tools.
+
+    Observations go to the Prometheus metrics above and are also aggregated
+    per request, so `summary` can be logged as one structured record when the
+    request ends. Pass a fresh instance in the run config of every request.
+    """
+
+    run_inline = True  # Called on the event loop thread; only updates dicts and metrics
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self._starts: Dict[UUID, float] = {}
+        self._names: Dict[UUID, str] = {}
+        self._tool_runs: Set[UUID] = set()
+        self.nodes: Dict[str, float] = {}
+        self.llm_calls: List[Dict[str, Any]] = []
+        self.tools: List[Dict[str, Any]] = []
+
+    def on_chain_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        tags: Optional[List[str]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        # Graph nodes are the chains tagged with their superstep
+        if any(tag.startswith("graph:step:") for tag in tags or ()):
+            self._starts[run_id] = time.perf_counter()
+            self._names[run_id] = (metadata or {}).get("langgraph_node") or kwargs.get("name") or "unknown"
+
+    def _end_node(self, run_id: UUID) -> None:
+        started = self._starts.pop(run_id, None)
+        if started is not None:
+            node = self._names.pop(run_id)
+            elapsed = time.perf_counter() - started
+            NODE_LATENCY.labels(node).observe(elapsed)
+            self.nodes[node] = self.nodes.get(node, 0.0) + elapsed
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_node(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_node(run_id)
+
+    def on_chat_model_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        messages: Any,
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._starts[run_id] = time.perf_counter()
+        self._names[run_id] = (metadata or {}).get("langgraph_node") or "unknown"
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._starts.pop(run_id, None)
+        node = self._names.pop(run_id, "unknown")
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        prompt, completion = _token_counts(response)
+        LLM_LATENCY.labels(node).observe(elapsed)
+        LLM_TOKENS.labels(node, "prompt").inc(prompt)
+        LLM_TOKENS.labels(node, "completion").inc(completion)
+        self.llm_calls.append({
+            "node": node, "seconds": round(elapsed, 4), "prompt_tokens": prompt, "completion_tokens": completion
+        })
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._starts.pop(run_id, None)
+        self._names.pop(run_id, None)
+
+    def on_tool_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        # A cached tool runs the wrapped tool as a child; count only the outer call
+        if parent_run_id in self._tool_runs:
+            return
+        self._tool_runs.add(run_id)
+        self._starts[run_id] = time.perf_counter()
+        self._names[run_id] = kwargs.get("name") or (serialized or {}).get("name") or "unknown"
+
+    def _end_tool(self, run_id: UUID, outcome: str) -> None:
+        started = self._starts.pop(run_id, None)
+        if started is None or run_id not in self._tool_runs:
+            return
+        tool = self._names.pop(run_id)
+        elapsed = time.perf_counter() - started
+        TOOL_CALLS.labels(tool, outcome).inc()
+        TOOL_LATENCY.labels(tool).observe(elapsed)
+        self.tools.append({"tool": tool, "seconds": round(elapsed, 4), "outcome": outcome})
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_tool(run_id, "ok")
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_tool(run_id, "error")
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Return the request's timings: total, per node, per LLM call and per tool call.
+        """
+        return {
+            "seconds": round(time.perf_counter() - self.started, 4),
+            "nodes": {node: round(seconds, 4) for node, seconds in self.nodes.items()},
+            "llm_calls": self.llm_calls,
+            "tools": self.tools,
+        }
+
+
+def _token_counts(response: LLMResult) -> tuple:
+    """
+    Return (prompt, completion) tokens of an LLM result, 0 if not reported.
+    """
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format log records as one JSON object per line, including any `extra` fields.
+    """
+
+    _standard = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in self._standard})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging() -> None:
+    """
+    Configure root logging from environment variables.
+
+    Environment variables:
+    ----------------------
+    AGENT_LOG_FORMAT : str
+        "json" for one JSON object per line, plain text otherwise (default: text).
+    AGENT_LOG_LEVEL : str
+        Root log level (default: INFO).
+    """
+    handler = logging.StreamHandler()
+    if os.getenv("AGENT_LOG_FORMAT", "text") == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.getenv("AGENT_LOG_LEVEL", "INFO"))
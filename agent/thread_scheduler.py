@@ -0,0 +1,117 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+
+class Superseded(Exception):
+    """
+    Raised to a caller whose message was merged into a later caller's turn.
+    """
+
+
+class _Batch:
+    """
+    Messages waiting for the next turn of a thread, answered to the latest caller.
+    """
+
+    def __init__(self) -> None:
+        self.messages: List[str] = []
+        self.future: Optional[asyncio.Future] = None
+
+
+class _ThreadState:
+    def __init__(self) -> None:
+        self.busy = False
+        self.pending: Optional[_Batch] = None
+
+
+class ThreadScheduler:
+    """
+    Serialize turns per conversation thread and merge messages that queue up.
+
+    At most one turn runs per thread; different threads run in parallel.
+    Messages arriving while a turn runs are collected into one pending batch;
+    when the turn ends the batch runs as a single turn whose text joins the
+    messages in order. Only the latest caller of a batch gets the answer:
+    earlier callers are released at once with `Superseded`, so no LLM call
+    is spent answering a message the user has already followed up on.
+
+    Must be used from a single event loop.
+    """
+
+    def __init__(self) -> None:
+        self._threads: Dict[str, _ThreadState] = {}
+        self.merged = 0
+
+    @asynccontextmanager
+    async def turn(self, thread_id: str, message: str) -> AsyncIterator[str]:
+        """
+        Wait for this thread's turn and yield the text to answer.
+
+        Parameters:
+        ----------
+        thread_id : str
+            Conversation thread identifier
+        message : str
+            User message of this request
+
+        Yields:
+        ------
+        str
+            `message`, or the merged text of all messages batched with it
+
+        Raises:
+        ------
+        Superseded
+            If a later message of the same thread joined the batch
+        """
+        state = self._threads.setdefault(thread_id, _ThreadState())
+        if not state.busy:
+            state.busy = True
+            text = message
+        else:
+            batch = state.pending
+            if batch is None:
+                batch = state.pending = _Batch()
+            elif batch.future is not None and not batch.future.done():
+                batch.future.set_exception(Superseded())
+                self.merged += 1
+            batch.messages.append(message)
+            future = batch.future = asyncio.get_running_loop().create_future()
+            try:
+                text = await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    # The turn was handed over just as the caller went away: pass it on
+                    self._release(thread_id, state)
+                elif state.pending is batch and batch.future is future:
+                    # Nobody is left to receive the batch's answer: drop it
+                    state.pending = None
+                raise
+
+        try:
+            yield text
+        finally:
+            self._release(thread_id, state)
+
+    def _release(self, thread_id: str, state: _ThreadState) -> None:
+        """
+        End the running turn: hand the thread to the pending batch or mark it idle.
+        """
+        batch, state.pending = state.pending, None
+        if batch is not None and batch.future is not None and not batch.future.done():
+            batch.future.set_result("\n".join(batch.messages))
+            return
+        state.busy = False
+        if self._threads.get(thread_id) is state:
+            del self._threads[thread_id]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the number of threads with a running turn, queued batches and merged messages.
+        """
+        return {
+            "busy_threads": sum(1 for state in self._threads.values() if state.busy),
+            "queued_batches": sum(1 for state in self._threads.values() if state.pending is not None),
+            "merged_messages": self.merged,
+        }
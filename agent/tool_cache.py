@@ -0,0 +1,355 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+
+
+def cache_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    """
+    Build a cache key from a tool name and its arguments.
+
+    String arguments are lower-cased with whitespace collapsed and keys are
+    sorted, so trivially different calls ("Отели  Анталии" / "отели анталии")
+    share one entry.
+    """
+    def normalize(value: Any) -> Any:
+        if isinstance(value, str):
+            return " ".join(value.lower().split())
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        return value
+
+    return tool_name + ":" + json.dumps(normalize(arguments), sort_keys=True, ensure_ascii=False, default=str)
+
+
+class _Flight:
+    """
+    A tool call in progress that concurrent identical calls wait for.
+    """
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ToolResultCache:
+    """
+    Bounded TTL cache of tool results with in-flight deduplication.
+
+    Entries are kept in an in-memory LRU of at most `max_entries` items and,
+    when `sqlite_path` is set, written through to SQLite so they survive
+    restarts and can be shared by workers on the same host. Concurrent
+    identical calls (same cache key) run the tool once and share the result.
+    Failed calls are never cached.
+
+    Thread-safe; async calls must come from a single event loop, and run
+    their SQLite reads and writes in worker threads so the loop never waits
+    on disk.
+    """
+
+    def __init__(
+        self,
+        default_ttl: float = 3600,
+        ttls: Optional[Dict[str, float]] = None,
+        max_entries: int = 2048,
+        sqlite_path: Optional[str] = None,
+    ) -> None:
+        """
+        Parameters:
+        ----------
+        default_ttl : float
+            Entry lifetime in seconds for tools without an explicit TTL
+        ttls : Dict[str, float], optional
+            Tool name -> entry lifetime in seconds (0 disables caching for the tool)
+        max_entries : int
+            Maximum number of entries held in memory
+        sqlite_path : str, optional
+            SQLite database file for persistent entries
+        """
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()  # key -> (expires_at, value)
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: Dict[str, asyncio.Future] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()  # Held for SQLite access only, never while `_lock` is
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tool_cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            self._db.execute("DELETE FROM tool_cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def ttl_for(self, tool_name: str) -> float:
+        return self.ttls.get(tool_name, self.default_ttl)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        Return (found, value) for a live entry, checking memory then SQLite.
+        """
+        found, value = self._recall(key)
+        if not found and self._db is not None:
+            found, value = self._load(key)
+        self._count(found)
+        return found, value
+
+    async def aget(self, key: str) -> Tuple[bool, Any]:
+        """
+        Async variant of `get`; the SQLite lookup runs in a worker thread.
+        """
+        found, value = self._recall(key)
+        if not found and self._db is not None:
+            found, value = await asyncio.to_thread(self._load, key)
+        self._count(found)
+        return found, value
+
+    def _recall(self, key: str) -> Tuple[bool, Any]:
+        """
+        Return (found, value) for a live in-memory entry, dropping it if expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            return False, None
+
+    def _load(self, key: str) -> Tuple[bool, Any]:
+        """
+        Return (found, value) for a live SQLite entry, keeping it in memory if found.
+        """
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM tool_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        if row is None:
+            return False, None
+        value = json.loads(row[0])
+        with self._lock:
+            self._remember(key, row[1], value)
+        return True, value
+
+    def _count(self, found: bool) -> None:
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """
+        Store `value` for `ttl` seconds.
+        """
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+        self._persist(key, value, expires_at)
+
+    async def aset(self, key: str, value: Any, ttl: float) -> None:
+        """
+        Async variant of `set`; the SQLite write and its fsync run in a worker thread.
+        """
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._persist, key, value, expires_at)
+
+    def _persist(self, key: str, value: Any, expires_at: float) -> None:
+        """
+        Write an entry through to SQLite, if configured.
+        """
+        if self._db is None:
+            return
+        try:
+            payload = json.dumps(value, ensure_ascii=False)
+        except TypeError:
+            return  # Not JSON-serializable: keep it in memory only
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tool_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, payload, expires_at)
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, expires_at: float, value: Any) -> None:
+        """
+        Insert into the in-memory LRU, evicting the oldest entries. Caller holds the lock.
+        """
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def call(self, key: str, ttl: float, fn: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for `key`, or run `fn` once for all concurrent callers and cache it.
+        """
+        found, value = self.get(key)
+        if found:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fn()
+            self.set(key, flight.value, ttl)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def acall(self, key: str, ttl: float, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async variant of `call`.
+
+        If the caller running `fn` is cancelled, the callers waiting on it are
+        not: they look the key up again and one of them runs `fn` itself.
+        """
+        while True:
+            found, value = await self.aget(key)
+            if found:
+                return value
+            flight = self._async_flights.get(key)
+            if flight is None:
+                break
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise  # This caller was cancelled, not the one it waited for
+
+        flight = asyncio.get_running_loop().create_future()
+        self._async_flights[key] = flight
+        try:
+            value = await fn()
+            flight.set_result(value)
+            await self.aset(key, value, ttl)
+            return value
+        except asyncio.CancelledError:
+            if not flight.done():
+                flight.cancel()
+            raise
+        except BaseException as e:
+            if not flight.done():
+                flight.set_exception(e)
+                flight.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._async_flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return hit/miss counters and the number of in-memory entries.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+class CachedTool(BaseTool):
+    """
+    Tool wrapper answering repeated calls from a `ToolResultCache`.
+
+    Exposes the wrapped tool's name, description and argument schema, so it
+    can replace the tool in `bind_tools` and `ToolNode` unchanged.
+    """
+
+    wrapped: BaseTool
+    cache: Any
+
+    def __init__(self, wrapped: BaseTool, cache: ToolResultCache) -> None:
+        super().__init__(
+            name=wrapped.name,
+            description=wrapped.description,
+            args_schema=wrapped.args_schema,
+            wrapped=wrapped,
+            cache=cache,
+        )
+
+    def _run(self, run_manager: Any = None, **kwargs: Any) -> Any:
+        return self.cache.call(
+            cache_key(self.name, kwargs),
+            self.cache.ttl_for(self.name),
+            lambda: self.wrapped.invoke(kwargs),
+        )
+
+    async def _arun(self, run_manager: Any = None, **kwargs: Any) -> Any:
+        return await self.cache.acall(
+            cache_key(self.name, kwargs),
+            self.cache.ttl_for(self.name),
+            lambda: self.wrapped.ainvoke(kwargs),
+        )
+
+
+def wrap_tools(tools: List[BaseTool], cache: Optional[ToolResultCache]) -> List[BaseTool]:
+    """
+    Wrap every tool with `cache`; return the tools unchanged if there is no cache.
+    """
+    if cache is None:
+        return tools
+    return [CachedTool(tool, cache) for tool in tools]
+
+
+def tool_cache_from_env() -> Optional[ToolResultCache]:
+    """
+    Build the tool result cache from environment variables.
+
+    Environment variables:
+    ----------------------
+    TOOL_CACHE : str
+        "0" disables the cache (enabled by default).
+    TOOL_CACHE_TTL : float
+        Default entry lifetime in seconds (default: 3600).
+    TOOL_CACHE_TTLS : str
+        Per-tool lifetimes, e.g. "tavily_search_results_json=21600,catalogue_search=300".
+    TOOL_CACHE_MAX_ENTRIES : int
+        Maximum number of entries held in memory (default: 2048).
+    TOOL_CACHE_SQLITE : str
+        SQLite file for persistent entries (memory only if unset).
+    """
+    if os.getenv("TOOL_CACHE", "1") == "0":
+        return None
+    ttls = {}
+    for item in filter(None, re.split(r"[,\s]+", os.getenv("TOOL_CACHE_TTLS", ""))):
+        name, _, ttl = item.partition("=")
+        ttls[name] = float(ttl)
+    return ToolResultCache(
+        default_ttl=float(os.getenv("TOOL_CACHE_TTL", "3600")),
+        ttls=ttls,
+        max_entries=int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "2048")),
+        sqlite_path=os.getenv("TOOL_CACHE_SQLITE") or None,
+    )
@@ -1,20 +1,38 @@
+import json
+import logging
 import os
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
 from pydantic.v1 import Field
 from langchain_gigachat import GigaChat
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langgraph.graph import StateGraph, MessagesState
 from langgraph.constants import START
 from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import MemorySaver
 from langchain_community.tools.tavily_search import TavilySearchResults
 
-from prompts import sys_prompt
+from checkpointer import TieredCheckpointer, checkpointer_from_env
+from concurrency import ConcurrencyLimiter, Overloaded, limiter_from_env
+from context_window import ContextWindow, add_usage, context_window_from_env
+from prompts import sys_prompt, catalogue_prompt, history_prompt
+from retrieval import CatalogueRetriever, format_passages, make_catalogue_tool, retriever_from_env
+from semantic_cache import CacheLookup, SemanticCache, semantic_cache_from_env
+from telemetry import FIRST_TOKEN_LATENCY, REQUEST_LATENCY, RequestTrace, configure_logging
+from thread_scheduler import Superseded, ThreadScheduler
+from tool_cache import ToolResultCache, tool_cache_from_env, wrap_tools
 from utils import print_messages
 
 load_dotenv()
+configure_logging()
+logger = logging.getLogger(__name__)
 
 
 class LangGraphAgent:
@@ -25,33 +43,69 @@ class LangGraphAgent:
     -----------
     llm : GigaChat
         Language model client instance.
+    retriever : CatalogueRetriever | None
+        Catalogue retriever backed by the Faiss service, if configured.
+    tool_cache : ToolResultCache | None
+        Cache of tool results shared by all threads, if enabled.
     tools : List[BaseTool]
         List of bound tool instances for retrieval and search.
     llm_with_tools : object
         LLM instance bound with tool invocation capabilities.
+    llm_with_local_tools : object
+        LLM instance bound with catalogue retrieval only, used when the
+        catalogue answers the question well enough to skip web search.
+    context_window : ContextWindow
+        Token budget for the history sent to the LLM.
     State : subclass of MessagesState
         Custom state schema for the graph nodes.
     builder : StateGraph
         Graph builder for constructing the conversational flow.
-    memory : MemorySaver
-        Checkpointer for persisting graph state.
+    memory : TieredCheckpointer
+        Checkpointer persisting graph state, with a hot tier of recent threads.
     graph : Compiled graph instance
         Executable state graph for processing messages.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        llm: Optional[Any] = None,
+        tools: Optional[List[Any]] = None,
+        retriever: Optional[CatalogueRetriever] = None,
+        tool_cache: Optional[ToolResultCache] = None,
+        checkpointer: Optional[TieredCheckpointer] = None,
+        context_window: Optional[ContextWindow] = None,
+    ):
         """
         Initialize LangGraphAgent, bind tools, and compile the state graph.
 
+        Parameters:
+        -----------
+        llm : BaseChatModel, optional
+            Chat model supporting tool binding; GigaChat-Pro by default.
+        tools : List[BaseTool], optional
+            Web tools; TavilySearchResults by default.
+        retriever : CatalogueRetriever, optional
+            Catalogue retriever; built from FAISS_URL by default, disabled if unset.
+        tool_cache : ToolResultCache, optional
+            Cache wrapped around every tool; built from TOOL_CACHE_* variables by default.
+        checkpointer : TieredCheckpointer, optional
+            Conversation state storage; built from CHECKPOINT_* variables by default.
+        context_window : ContextWindow, optional
+            History budget; built from CONTEXT_* variables by default.
+
         Environment variables:
         ----------------------
         GIGACHAT_API_KEY : str
             API key for GigaChat.
         TAVILY_API_KEY : str
             Api key for TavilySearchResults tool.
+        FAISS_URL : str
+            Faiss service URL enabling catalogue retrieval (see retrieval.retriever_from_env).
+        CHECKPOINT_URL : str
+            Postgres or SQLite URL for durable conversations (see checkpointer.checkpointer_from_env).
         """
         # Initialize GigaChat LLM
-        self.llm = GigaChat(
+        self.llm = llm or GigaChat(
             credentials=os.getenv("GIGACHAT_API_KEY"),
             scope="GIGACHAT_API_PERS",
             model="GigaChat-Pro",
@@ -61,81 +115,293 @@ class LangGraphAgent:
         )
 
         # Define external tools
-        self.tools = [
+        web_tools = tools if tools is not None else [
             TavilySearchResults(
                 max_results=3,
                 description="Искать актуальную информацию в интернете",
                 tavily_api_key=os.getenv("TAVILY_API_KEY")
             )
         ]
+        self.retriever = retriever if retriever is not None else retriever_from_env()
+        self.tool_cache = tool_cache if tool_cache is not None else tool_cache_from_env()
+        local_tools = [make_catalogue_tool(self.retriever)] if self.retriever else []
+        web_tools = wrap_tools(web_tools, self.tool_cache)
+        local_tools = wrap_tools(local_tools, self.tool_cache)
+        self.tools = local_tools + web_tools
         self.llm_with_tools = self.llm.bind_tools(self.tools)
+        self.llm_with_local_tools = self.llm.bind_tools(local_tools) if local_tools else self.llm_with_tools
+        self.context_window = context_window or context_window_from_env()
 
         # Define custom state
         class State(MessagesState):
             is_reasoning: bool
+            context: str
+            summary: str
+            usage: dict
 
         self.State = State
 
         # Build conversational graph
         self.builder = StateGraph(State)
-        self.builder.add_node('assistant', self.assistant)
+        # Nodes run natively under both graph.invoke and graph.ainvoke
+        self.builder.add_node('compact', RunnableLambda(self.compact, afunc=self.acompact))
+        self.builder.add_node('assistant', RunnableLambda(self.assistant, afunc=self.aassistant))
         self.builder.add_node('tools', ToolNode(self.tools))
-        self.builder.add_edge(START, 'assistant')
+        self.builder.add_edge(START, 'compact')
+        if self.retriever:
+            self.builder.add_node('retrieve', RunnableLambda(self.retrieve, afunc=self.aretrieve))
+            self.builder.add_edge('compact', 'retrieve')
+            self.builder.add_edge('retrieve', 'assistant')
+        else:
+            self.builder.add_edge('compact', 'assistant')
         self.builder.add_conditional_edges('assistant', tools_condition)
         self.builder.add_edge('tools', 'assistant')
 
         # Setup persistence
-        self.memory = MemorySaver()
+        self.memory = checkpointer if checkpointer is not None else checkpointer_from_env()
         self.graph = self.builder.compile(checkpointer=self.memory)
 
-    def assistant(self, state: MessagesState) -> dict:
+    def compact(self, state: MessagesState, config: RunnableConfig) -> dict:
+        """
+        Graph node: bring the history within the token budget at the start of a turn.
+
+        Tool outputs of earlier turns are shortened; when the history is still
+        over budget, the oldest turns are removed from state and folded into
+        the rolling summary. If summarization fails the history is kept as is.
+        Also resets the turn's token usage.
+
+        Parameters:
+        -----------
+        state : MessagesState
+            Current graph state ending with the new user message.
+        config : RunnableConfig
+            Run configuration, passed to the summarizing LLM call.
+
+        Returns:
+        -------
+        dict
+            messages: Shortened tool outputs and removals of evicted messages
+            summary: Updated summary, if turns were evicted
+            usage: Token usage of the turn so far
+        """
+        compaction = self.context_window.plan(state['messages'])
+        update = {"messages": compaction.updates, "usage": {}}
+        if compaction.evicted:
+            request = self.context_window.summary_request(state.get('summary', ''), compaction.evicted)
+            try:
+                response = self.llm.invoke(request, config)
+            except Exception:
+                logger.warning("History summarization failed; keeping full history", exc_info=True)
+                return update
+            update = self._summarized(update, compaction, response)
+        return update
+
+    async def acompact(self, state: MessagesState, config: RunnableConfig) -> dict:
+        """
+        Async variant of `compact`.
+        """
+        compaction = self.context_window.plan(state['messages'])
+        update = {"messages": compaction.updates, "usage": {}}
+        if compaction.evicted:
+            request = self.context_window.summary_request(state.get('summary', ''), compaction.evicted)
+            try:
+                response = await self.llm.ainvoke(request, config)
+            except Exception:
+                logger.warning("History summarization failed; keeping full history", exc_info=True)
+                return update
+            update = self._summarized(update, compaction, response)
+        return update
+
+    def _summarized(self, update: dict, compaction: Any, response: AIMessage) -> dict:
+        """
+        Extend a compaction update with the new summary and evicted message removals.
+        """
+        return {
+            "messages": update["messages"] + self.context_window.removals(compaction.evicted),
+            "summary": response.content,
+            "usage": add_usage({}, response),
+        }
+
+    def retrieve(self, state: MessagesState) -> dict:
+        """
+        Graph node: look the latest user message up in the tour catalogue.
+
+        Passages are kept only when the best one clears the retriever's
+        similarity threshold; otherwise the assistant falls back to web search.
+        A failed lookup (unreachable Faiss service, embedder error) is logged
+        and treated as no match, since the context is optional.
+
+        Parameters:
+        -----------
+        state : MessagesState
+            Current graph state containing message history.
+
+        Returns:
+        -------
+        dict
+            context: Formatted catalogue passages, or "" on low similarity
+        """
+        try:
+            passages = self.retriever.retrieve(state['messages'][-1].content)
+        except Exception:
+            logger.exception("Catalogue retrieval failed; answering without catalogue context")
+            passages = []
+        return self._context(passages)
+
+    async def aretrieve(self, state: MessagesState) -> dict:
+        """
+        Async variant of `retrieve`, used by `graph.ainvoke`.
+        """
+        try:
+            passages = await self.retriever.aretrieve(state['messages'][-1].content)
+        except Exception:
+            logger.exception("Catalogue retrieval failed; answering without catalogue context")
+            passages = []
+        return self._context(passages)
+
+    def _context(self, passages: list) -> dict:
+        """
+        Keep passages as context only when the retriever is confident in them.
+        """
+        if not self.retriever.is_confident(passages):
+            return {"context": ""}
+        return {"context": format_passages(passages)}
+
+    def assistant(self, state: MessagesState, config: RunnableConfig) -> dict:
         """
         Graph node: invoke LLM (with tools) to process conversation state.
 
+        When the catalogue returned confident passages, they are added to the
+        system prompt and only the catalogue tool is offered, so no web search
+        is made; otherwise all tools are available.
+
         Parameters:
         -----------
         state : MessagesState
             Current graph state containing message history and flags.
+        config : RunnableConfig
+            Run configuration, passed to the LLM so token streaming reaches
+            `graph.astream(stream_mode="messages")`.
 
         Returns:
         -------
         dict
             messages: List[BaseMessage] with new assistant response
             is_reasoning: False flag indicating tool use completed
+            usage: Token usage of the turn so far
         """
-        content = self.llm_with_tools.invoke(
-            [SystemMessage(content=sys_prompt)] + state['messages']
-        )
-        return {"messages": [content], "is_reasoning": False}
+        llm, messages = self._prompt(state)
+        content = llm.invoke(messages, config)
+        return {"messages": [content], "is_reasoning": False, "usage": self._usage(state, messages, content)}
+
+    async def aassistant(self, state: MessagesState, config: RunnableConfig) -> dict:
+        """
+        Async variant of `assistant`, used by `graph.ainvoke` and `graph.astream`.
+        """
+        llm, messages = self._prompt(state)
+        content = await llm.ainvoke(messages, config)
+        return {"messages": [content], "is_reasoning": False, "usage": self._usage(state, messages, content)}
+
+    def _usage(self, state: MessagesState, messages: list, response: AIMessage) -> dict:
+        """
+        Add an assistant call to the turn's token usage, tracking the largest prompt sent.
+        """
+        usage = add_usage(state.get('usage'), response)
+        usage["context_tokens"] = max(usage.get("context_tokens", 0), self.context_window.count(messages))
+        return usage
+
+    def _prompt(self, state: MessagesState) -> tuple:
+        """
+        Pick the tool-bound LLM and build the message list for the assistant node.
+        """
+        prompt = sys_prompt
+        if state.get('summary'):
+            prompt += history_prompt.format(summary=state['summary'])
+        context = state.get('context')
+        if context:
+            system = SystemMessage(content=prompt + catalogue_prompt.format(context=context))
+            return self.llm_with_local_tools, [system] + state['messages']
+        return self.llm_with_tools, [SystemMessage(content=prompt)] + state['messages']
+
+
+class _ReleasingStreamingResponse(StreamingResponse):
+    """
+    Streaming response that calls `release` once it is done, even if the body never started.
+
+    A client that disconnects before the body is iterated leaves the body
+    generator unstarted, so its `finally` never runs.
+    """
+
+    def __init__(self, content: AsyncIterator[str], release: Callable[[], Awaitable[None]], **kwargs: Any) -> None:
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.release()
 
 
 class AgentAPI:
     """
     FastAPI wrapper to expose LangGraphAgent via HTTP endpoints.
 
+    Requests run on the event loop through `graph.ainvoke`, so a conversation
+    waiting on the LLM or a tool does not hold a worker thread; the limiter
+    bounds how many run at once and sheds excess load with HTTP 503.
+
     Attributes:
     -----------
     agent : LangGraphAgent
         Underlying conversational agent instance.
+    cache : SemanticCache | None
+        Semantic answer cache consulted at the start of a conversation.
+    limiter : ConcurrencyLimiter
+        Admission control for concurrent conversations.
+    scheduler : ThreadScheduler
+        Serializes turns of each thread and merges messages sent in quick succession.
     app : FastAPI
         Web application instance.
     """
 
-    def __init__(self, agent: LangGraphAgent):
+    def __init__(
+        self,
+        agent: LangGraphAgent,
+        cache: Optional[SemanticCache] = None,
+        limiter: Optional[ConcurrencyLimiter] = None,
+    ):
         """
         Initialize API with provided agent.
 
         Mounts routes and binds query endpoint.
         """
         self.agent = agent
+        self.cache = cache
+        self.limiter = limiter or limiter_from_env()
+        self.scheduler = ThreadScheduler()
         self.app = FastAPI()
 
         class Query(BaseModel):
             message: str = Field(..., description="User message text")
             thread_id: str = Field(..., description="Unique conversation thread identifier")
 
+        @self.app.on_event("startup")
+        async def open_checkpointer() -> None:
+            """
+            Connect the durable conversation store.
+            """
+            await self.agent.memory.open()
+
+        @self.app.on_event("shutdown")
+        async def close_checkpointer() -> None:
+            """
+            Release the conversation store connection.
+            """
+            await self.agent.memory.close()
+
         @self.app.post("/query")
-        def query_endpoint(query: Query) -> dict:
+        async def query_endpoint(query: Query) -> dict:
             """
             HTTP endpoint to process user query through the agent.
 
@@ -144,41 +410,262 @@ class AgentAPI:
             query : Query
                 Parsed JSON body with `message` and `thread_id`.
 
+            The first message of a conversation is looked up in the semantic
+            cache (if enabled); a hit is recorded in the thread and returned
+            without running the graph.
+
+            Turns of one thread run one at a time. Messages sent while a turn
+            runs are answered together in the next turn, by the response to
+            the latest of them; the earlier requests return `merged` at once.
+
             Returns:
             -------
             dict
-                response: Agent-generated reply text.
+                response: Agent-generated reply text ("" when merged).
+                usage: Token usage of the turn (prompt, completion and total
+                tokens, LLM calls, largest prompt size); absent on cache hits.
+                merged: True if the message was answered by a later request.
 
             Raises:
             ------
+            HTTPException(503)
+                If too many requests are already running or waiting.
             HTTPException(500)
                 If processing or graph invocation fails.
             """
-            # Initialize state for new message
-            state = self.agent.State(
-                messages=[HumanMessage(content=query.message)],
-                is_reasoning=False
-            )
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                async with self.limiter.slot():
+                    async with self.scheduler.turn(query.thread_id, query.message) as text:
+                        result = await self._process(text, query.thread_id)
+                outcome = "ok" if "usage" in result else "cache_hit"
+                return result
+            except Superseded:
+                outcome = "merged"
+                return {"response": "", "merged": True}
+            except Overloaded as e:
+                outcome = "rejected"
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+            finally:
+                REQUEST_LATENCY.labels("query", outcome).observe(time.perf_counter() - started)
+
+        @self.app.post("/query/stream")
+        async def query_stream_endpoint(query: Query) -> StreamingResponse:
+            """
+            Streaming variant of `/query`.
+
+            Returns newline-delimited JSON events (see `_stream`) as the answer
+            is generated, so clients can show text as soon as the first tokens
+            arrive. The concurrency slot is held until the stream ends or the
+            client disconnects. A message merged into a later request's turn
+            gets a single {"type": "merged"} event.
+
+            Raises:
+            ------
+            HTTPException(503)
+                If too many requests are already running or waiting.
+            """
+            started = time.perf_counter()
+            slot = self.limiter.slot()
             try:
-                # Invoke the compiled graph flow
-                result = self.agent.graph.invoke(
-                    state, {"configurable": {"thread_id": query.thread_id}}
-                )
-                if 'messages' in result:
-                    content = result['messages'][-1].content
-                    print(
-                        "TOTAL TOKENS (without search): ",
-                        result['messages'][-1].response_metadata['token_usage']['total_tokens']
-                    )
-                    return {"response": content}
-                raise HTTPException(status_code=500, detail="Ошибка обработки запроса")
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
+                await slot.__aenter__()
+            except Overloaded as e:
+                REQUEST_LATENCY.labels("stream", "rejected").observe(time.perf_counter() - started)
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+            released = False
+
+            async def release() -> None:
+                nonlocal released
+                if not released:
+                    released = True
+                    await slot.__aexit__(None, None, None)
+
+            async def body() -> AsyncIterator[str]:
+                outcome = "error"
+                first_token = True
+                try:
+                    async with self.scheduler.turn(query.thread_id, query.message) as text:
+                        async for event in self._stream(text, query.thread_id):
+                            if event["type"] == "token" and first_token:
+                                FIRST_TOKEN_LATENCY.observe(time.perf_counter() - started)
+                                first_token = False
+                            elif event["type"] == "done":
+                                outcome = "ok" if "usage" in event else "cache_hit"
+                            yield json.dumps(event, ensure_ascii=False) + "\n"
+                except Superseded:
+                    outcome = "merged"
+                    yield json.dumps({"type": "merged"}) + "\n"
+                finally:
+                    await release()
+                    REQUEST_LATENCY.labels("stream", outcome).observe(time.perf_counter() - started)
+
+            return _ReleasingStreamingResponse(body(), release, media_type="application/x-ndjson")
+
+        @self.app.get("/cache/stats")
+        def cache_stats() -> dict:
+            """
+            Cache counters: semantic cache hits, misses, hit rate, saved tokens
+            and size, plus tool result cache and checkpoint hot tier counters.
+            """
+            tool_cache = self.agent.tool_cache.stats() if self.agent.tool_cache else None
+            checkpoints = self.agent.memory.stats()
+            if self.cache is None:
+                return {"enabled": False, "tool_cache": tool_cache, "checkpoints": checkpoints}
+            return {"enabled": True, **self.cache.stats(), "tool_cache": tool_cache, "checkpoints": checkpoints}
+
+        @self.app.get("/load")
+        def load_stats() -> dict:
+            """
+            Limiter counters (running, waiting and rejected requests) and
+            scheduler counters (busy threads, queued batches, merged messages).
+            """
+            return {**self.limiter.stats(), **self.scheduler.stats()}
+
+        @self.app.get("/metrics")
+        def metrics() -> Response:
+            """
+            Expose Prometheus metrics: request, node, LLM call, tool and checkpoint
+            latencies and LLM token counts.
+            """
+            return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+    async def _cached_answer(self, message: str, config: dict) -> Tuple[Optional[CacheLookup], Optional[str]]:
+        """
+        Consult the semantic cache for the first message of a conversation.
+
+        A hit is recorded in the thread as if the graph had answered it. A
+        failed lookup (embedder or Faiss service error) is logged and treated
+        as a miss whose answer is not stored.
+
+        Returns:
+        -------
+        Tuple[Optional[CacheLookup], Optional[str]]
+            The lookup to store the answer under after a miss (None when the
+            cache was not consulted or failed) and the cached answer on a hit
+        """
+        if not self.cache or not await self._starts_conversation(config):
+            return None, None
+        try:
+            lookup = await self.cache.alookup(message)
+        except Exception:
+            logger.exception("Semantic cache lookup failed; answering without the cache")
+            return None, None
+        if lookup.answer is not None:
+            await self.agent.graph.aupdate_state(
+                config,
+                {"messages": [HumanMessage(content=message), AIMessage(content=lookup.answer)]},
+                as_node='assistant'
+            )
+        return lookup, lookup.answer
+
+    async def _process(self, message: str, thread_id: str) -> dict:
+        """
+        Answer one message of a thread, from the semantic cache or the graph.
+        """
+        config = {"configurable": {"thread_id": thread_id}}
+        lookup, answer = await self._cached_answer(message, config)
+        if answer is not None:
+            return {"response": answer}
+
+        # Initialize state for new message
+        state = self.agent.State(
+            messages=[HumanMessage(content=message)],
+            is_reasoning=False
+        )
+        trace = RequestTrace()
+        try:
+            # Invoke the compiled graph flow
+            result = await self.agent.graph.ainvoke(state, {**config, "callbacks": [trace]})
+            if 'messages' in result:
+                content = result['messages'][-1].content
+                usage = result.get('usage') or {}
+                self._log_turn(thread_id, usage, trace)
+                if lookup is not None:
+                    await self.cache.astore(lookup, content, usage.get('total_tokens', 0))
+                return {"response": content, "usage": usage}
+            raise HTTPException(status_code=500, detail="Ошибка обработки запроса")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def _stream(self, message: str, thread_id: str) -> AsyncIterator[dict]:
+        """
+        Answer one message of a thread as a sequence of events.
+
+        Yields:
+        ------
+        dict
+            {"type": "token", "content": str} for each piece of assistant text,
+            {"type": "tool", "name": str} when a tool result arrives (text
+            streamed before it was a preamble to the tool call and should be
+            discarded), then a final {"type": "done", "response": str,
+            "usage": dict} or {"type": "error", "detail": str}
+        """
+        config = {"configurable": {"thread_id": thread_id}}
+        lookup, answer = await self._cached_answer(message, config)
+        if answer is not None:
+            yield {"type": "done", "response": answer}
+            return
+
+        state = self.agent.State(
+            messages=[HumanMessage(content=message)],
+            is_reasoning=False
+        )
+        trace = RequestTrace()
+        try:
+            async for chunk, metadata in self.agent.graph.astream(
+                state, {**config, "callbacks": [trace]}, stream_mode="messages"
+            ):
+                if isinstance(chunk, ToolMessage):
+                    yield {"type": "tool", "name": chunk.name}
+                elif (
+                    isinstance(chunk, AIMessage)
+                    and metadata.get('langgraph_node') == 'assistant'
+                    and isinstance(chunk.content, str)
+                    and chunk.content
+                ):
+                    yield {"type": "token", "content": chunk.content}
+
+            snapshot = await self.agent.graph.aget_state(config)
+            last = snapshot.values['messages'][-1]
+            usage = snapshot.values.get('usage') or {}
+            self._log_turn(thread_id, usage, trace)
+            if lookup is not None:
+                await self.cache.astore(lookup, last.content, usage.get('total_tokens', 0))
+            yield {"type": "done", "response": last.content, "usage": usage}
+        except Exception as e:
+            yield {"type": "error", "detail": str(e)}
+
+    @staticmethod
+    def _log_turn(thread_id: str, usage: dict, trace: RequestTrace) -> None:
+        """
+        Log one finished turn; with JSON logs the record carries the full usage and timing trace.
+        """
+        summary = trace.summary()
+        logger.info(
+            "turn thread=%s seconds=%.3f tokens=%s", thread_id, summary["seconds"], usage.get("total_tokens", 0),
+            extra={"thread_id": thread_id, "usage": usage, "trace": summary},
+        )
+
+    async def _starts_conversation(self, config: dict) -> bool:
+        """
+        Whether the next message of a thread is effectively single-turn.
+
+        True for threads without history and for threads idle longer than the
+        cache's session gap, so cached answers are never given to follow-up
+        questions that depend on earlier turns.
+        """
+        snapshot = await self.agent.graph.aget_state(config)
+        if not snapshot.values.get('messages') or not snapshot.created_at:
+            return True
+        last = datetime.fromisoformat(snapshot.created_at)
+        return (datetime.now(timezone.utc) - last).total_seconds() > self.cache.session_gap
 
 
 # Instantiate and mount API
 agent = LangGraphAgent()
-api = AgentAPI(agent).app
+api = AgentAPI(agent, semantic_cache_from_env()).app
 
 # Запуск приложения
 if __name__ == "__main__":
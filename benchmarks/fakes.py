@@ -0,0 +1,277 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+COUNTRIES = ["Турция", "Египет", "Таиланд", "ОАЭ", "Грузия", "Вьетнам", "Мальдивы", "Италия", "Армения", "Абхазия"]
+TOPICS = [
+    "Сколько стоит тур в {country} на {nights} ночей?",
+    "Нужна ли виза в {country}?",
+    "Какая погода в {country} в {month}?",
+    "Подберите отель всё включено в {country} до {budget} рублей",
+    "Какие экскурсии есть в {country}?",
+    "Как перенести даты тура в {country}?",
+]
+MONTHS = ["январе", "марте", "мае", "июле", "сентябре", "ноябре"]
+
+
+def _stable_hash(text: str) -> int:
+    return int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "little")
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for GigaChat with configurable latency.
+
+    Answers after `first_token_latency` seconds plus `token_latency` per
+    token, streaming one word per token. When tools are bound and the last
+    message is the user's, a share `tool_rate` of questions (chosen by a
+    stable hash of the text, so runs are repeatable) is answered with a tool
+    call instead. Usage metadata is reported like a real provider.
+    """
+
+    first_token_latency: float = 0.2
+    token_latency: float = 0.01
+    answer_tokens: int = 60
+    tool_rate: float = 0.5
+    tools: List[Dict[str, Any]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gigachat"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        return self.model_copy(update={"tools": [convert_to_openai_tool(tool)["function"] for tool in tools]})
+
+    def _reply(self, messages: List[BaseMessage]) -> AIMessage:
+        prompt_tokens = sum(len(str(message.content)) for message in messages) // 3
+        last = messages[-1]
+        if self.tools and isinstance(last, HumanMessage):
+            digest = _stable_hash(str(last.content))
+            if digest % 1000 < self.tool_rate * 1000:
+                tool = self.tools[digest % len(self.tools)]
+                argument = next(iter(tool.get("parameters", {}).get("properties", {})), "query")
+                return AIMessage(
+                    content="",
+                    tool_calls=[{"name": tool["name"], "args": {argument: str(last.content)}, "id": f"call_{digest:x}"}],
+                    usage_metadata={"input_tokens": prompt_tokens, "output_tokens": 10, "total_tokens": prompt_tokens + 10},
+                )
+        words = [f"слово{i}" for i in range(self.answer_tokens)]
+        return AIMessage(
+            content=" ".join(words),
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": self.answer_tokens,
+                "total_tokens": prompt_tokens + self.answer_tokens,
+            },
+        )
+
+    def _delay(self, message: AIMessage) -> float:
+        tokens = len(message.content.split()) if message.content else 10
+        return self.first_token_latency + self.token_latency * tokens
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._reply(messages)
+        time.sleep(self._delay(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._reply(messages)
+        await asyncio.sleep(self._delay(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, message: AIMessage) -> Iterator[AIMessageChunk]:
+        if message.tool_calls:
+            call = message.tool_calls[0]
+            yield AIMessageChunk(
+                content="",
+                tool_call_chunks=[{"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}],
+                usage_metadata=message.usage_metadata,
+            )
+            return
+        words = message.content.split()
+        for position, word in enumerate(words):
+            last = position == len(words) - 1
+            yield AIMessageChunk(
+                content=word if last else word + " ",
+                usage_metadata=message.usage_metadata if last else None,
+            )
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        message = self._reply(messages)
+        time.sleep(self.first_token_latency)
+        for chunk in self._chunks(message):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+            time.sleep(self.token_latency)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        message = self._reply(messages)
+        await asyncio.sleep(self.first_token_latency)
+        for chunk in self._chunks(message):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+            await asyncio.sleep(self.token_latency)
+
+
+class FakeSearchTool(BaseTool):
+    """
+    Offline stand-in for TavilySearchResults returning canned results after `latency` seconds.
+    """
+
+    name: str = "tavily_search_results_json"
+    description: str = "Искать актуальную информацию в интернете"
+    latency: float = 0.5
+    max_results: int = 3
+
+    def _results(self, query: str) -> List[Dict[str, str]]:
+        return [
+            {"url": f"https://example.org/{_stable_hash(query) % 10000}/{i}", "content": f"Результат {i} по запросу: {query}"}
+            for i in range(self.max_results)
+        ]
+
+    def _run(self, query: str, **kwargs: Any) -> List[Dict[str, str]]:
+        time.sleep(self.latency)
+        return self._results(query)
+
+    async def _arun(self, query: str, **kwargs: Any) -> List[Dict[str, str]]:
+        await asyncio.sleep(self.latency)
+        return self._results(query)
+
+
+def synthetic_corpus(count: int, dimension: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """
+    Generate a float32 corpus of `count` vectors drawn around `clusters` random centres.
+
+    Clustered data gives IVF and HNSW indexes a realistic structure, unlike
+    uniform noise.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimension)).astype("float32")
+    labels = rng.integers(0, clusters, count)
+    data = centres[labels] + 0.3 * rng.standard_normal((count, dimension)).astype("float32")
+    return np.ascontiguousarray(data, dtype="float32")
+
+
+def synthetic_questions(count: int, seed: int = 0) -> List[str]:
+    """
+    Generate `count` tourist questions from templates.
+    """
+    rng = random.Random(seed)
+    return [
+        rng.choice(TOPICS).format(
+            country=rng.choice(COUNTRIES),
+            nights=rng.choice([3, 5, 7, 10, 14]),
+            month=rng.choice(MONTHS),
+            budget=rng.choice([50000, 100000, 150000, 300000]),
+        )
+        for _ in range(count)
+    ]
+
+
+def synthetic_catalogue(count: int, seed: int = 0) -> List[str]:
+    """
+    Generate `count` catalogue passages describing tours.
+    """
+    rng = random.Random(seed)
+    return [
+        f"Тур в {rng.choice(COUNTRIES)}: отель {rng.randint(3, 5)}*, {rng.choice([5, 7, 10, 14])} ночей, "
+        f"питание {rng.choice(['всё включено', 'завтраки', 'полупансион'])}, цена от {rng.randint(40, 400)} 000 рублей."
+        for _ in range(count)
+    ]
+
+
+def synthetic_updates(users: int, messages_per_user: int, seed: int = 0) -> List[List[Dict[str, Any]]]:
+    """
+    Generate Telegram updates as the Bot API would deliver them.
+
+    Returns:
+    -------
+    List[List[dict]]
+        One list of private-chat text message updates per user, in send order
+    """
+    update_ids = itertools.count(1)
+    message_ids = itertools.count(1)
+    questions = iter(synthetic_questions(users * messages_per_user, seed))
+    conversations = []
+    for user in range(users):
+        user_id = 100000 + user
+        sender = {"id": user_id, "is_bot": False, "first_name": f"User{user}", "username": f"user{user}"}
+        conversations.append([
+            {
+                "update_id": next(update_ids),
+                "message": {
+                    "message_id": next(message_ids),
+                    "from": sender,
+                    "chat": {"id": user_id, "type": "private", "first_name": sender["first_name"]},
+                    "date": int(time.time()),
+                    "text": next(questions),
+                },
+            }
+            for _ in range(messages_per_user)
+        ])
+    return conversations
+
+
+class FakeTelegramAPI:
+    """
+    Replacement for `Bot.request` answering Bot API methods locally after `latency` seconds.
+
+    Counts calls per method, so a run shows how many edits streaming cost.
+    """
+
+    def __init__(self, latency: float = 0.05) -> None:
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self._message_ids = itertools.count(10 ** 6)
+
+    async def request(self, method: str, data: Optional[Dict[str, Any]] = None, files: Any = None) -> Any:
+        self.calls[method] = self.calls.get(method, 0) + 1
+        await asyncio.sleep(self.latency)
+        data = data or {}
+        if method in ("sendMessage", "editMessageText") and "chat_id" in data:
+            chat_id = int(data["chat_id"])
+            return {
+                "message_id": data.get("message_id") or next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": data.get("text", ""),
+            }
+        return True
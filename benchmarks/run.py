@@ -0,0 +1,153 @@
+"""
+Run the offline benchmark suite and save the results as JSON.
+
+Every case runs in a fresh interpreter, so peak RSS is measured per case
+and no state leaks between cases. Nothing leaves the machine: the LLM,
+web search and Telegram Bot API are replaced by the fakes in `fakes.py`,
+and services are served over loopback.
+
+Usage::
+
+    python benchmarks/run.py                       # every scenario, full cases
+    python benchmarks/run.py --quick               # small cases, about a minute
+    python benchmarks/run.py -s faiss_search -s faiss_build
+    python benchmarks/run.py --quick --compare benchmarks/results/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, "results")
+
+
+def _child(name: str, case: Dict[str, Any]) -> None:
+    """
+    Run one case in this process and print its metrics as one JSON line.
+    """
+    from scenarios import run_case
+
+    try:
+        metrics = run_case(name, case)
+    except ImportError as e:
+        metrics = {"skipped": f"missing dependency: {e.name}"}
+    # ru_maxrss is in kilobytes on Linux
+    metrics["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(json.dumps(metrics))
+
+
+def _run_case(name: str, case: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """
+    Run one case in a subprocess and return its metrics.
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--child", name, "--case", json.dumps(case)]
+    try:
+        done = subprocess.run(command, capture_output=True, text=True, timeout=timeout, cwd=HERE)
+    except subprocess.TimeoutExpired:
+        return {"error": f"timed out after {timeout} s"}
+    lines = done.stdout.strip().splitlines()
+    if done.returncode or not lines:
+        return {"error": (done.stderr.strip().splitlines() or ["no output"])[-1]}
+    return json.loads(lines[-1])
+
+
+def _environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=HERE
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _case_id(entry: Dict[str, Any]) -> Tuple[str, str]:
+    return entry["scenario"], json.dumps(entry["case"], sort_keys=True)
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> int:
+    """
+    Print throughput and p95 changes against a baseline file.
+
+    Returns:
+    -------
+    int
+        Number of cases whose throughput dropped or p95 grew by more than `tolerance`
+    """
+    with open(baseline_path) as f:
+        baseline = {_case_id(entry): entry["metrics"] for entry in json.load(f)["results"]}
+    regressions = 0
+    for entry in results:
+        before = baseline.get(_case_id(entry))
+        after = entry["metrics"]
+        if not before or "throughput" not in before or "throughput" not in after:
+            continue
+        throughput = after["throughput"] / before["throughput"] if before["throughput"] else None
+        p95 = after["p95_ms"] / before["p95_ms"] if before.get("p95_ms") and after.get("p95_ms") else None
+        regressed = (throughput is not None and throughput < 1 - tolerance) or (p95 is not None and p95 > 1 + tolerance)
+        regressions += regressed
+        print(
+            f"{'REGRESSION ' if regressed else ''}{entry['scenario']} {entry['case']}: "
+            f"throughput x{throughput:.2f}" + (f", p95 x{p95:.2f}" if p95 is not None else "")
+        )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-s", "--scenario", action="append", help="Scenario to run (repeatable; default: all)")
+    parser.add_argument("--quick", action="store_true", help="Run the small cases only")
+    parser.add_argument("-o", "--output", help="Result file (default: results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Baseline result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change counted as a regression")
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds allowed per case")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _child(args.child, json.loads(args.case))
+        return 0
+
+    from scenarios import SCENARIOS
+
+    names = args.scenario or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}; choose from {', '.join(SCENARIOS)}")
+
+    results = []
+    for name in names:
+        _, full, quick = SCENARIOS[name]
+        for case in quick if args.quick else full:
+            started = time.perf_counter()
+            metrics = _run_case(name, case, args.timeout)
+            results.append({"scenario": name, "case": case, "metrics": metrics})
+            print(f"{name} {case}: {json.dumps(metrics)} ({time.perf_counter() - started:.1f} s)", flush=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"environment": _environment(), "quick": args.quick, "results": results}, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,405 @@
+import asyncio
+import math
+import os
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import numpy as np
+
+from fakes import (
+    FakeChatModel,
+    FakeSearchTool,
+    FakeTelegramAPI,
+    synthetic_catalogue,
+    synthetic_corpus,
+    synthetic_questions,
+    synthetic_updates,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Vectors added per store.add call while building, as the binary upload route does
+BUILD_CHUNK_ROWS = 16384
+
+
+def use_service(name: str) -> None:
+    """
+    Make the flat-layout modules of one service (agent, bot or faiss), or the
+    stand-ins shared with the test suite (tests), importable.
+    """
+    path = os.path.join(ROOT, name)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class LatencyRecorder:
+    """
+    Collect per-operation latencies and summarize them as throughput and percentiles.
+    """
+
+    def __init__(self) -> None:
+        self.samples: List[float] = []
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def stop(self) -> None:
+        self.finished = time.perf_counter()
+
+    @staticmethod
+    def percentile(values: List[float], q: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self, operations: Optional[int] = None, prefix: str = "") -> Dict[str, Any]:
+        """
+        Return operation count, wall time, throughput and p50/p95/p99 latency in milliseconds.
+
+        Parameters:
+        ----------
+        operations : int, optional
+            Units of work done (e.g. queries answered); the number of samples by default
+        prefix : str
+            Prefix for the latency keys, to report several recorders side by side
+        """
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        operations = len(self.samples) if operations is None else operations
+        result = {
+            "operations": operations,
+            "seconds": round(elapsed, 4),
+            "throughput": round(operations / elapsed, 2) if elapsed > 0 else None,
+        } if not prefix else {}
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            value = self.percentile(self.samples, q)
+            result[f"{prefix}{name}_ms"] = round(value * 1000, 3) if value is not None else None
+        return result
+
+
+@asynccontextmanager
+async def serve(app: Any) -> AsyncIterator[str]:
+    """
+    Serve an ASGI app with uvicorn on a free loopback port and yield its base URL.
+
+    The server shares the benchmark's event loop, so requests go through the
+    real HTTP stack without leaving the machine.
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+
+def _build_store(store: Any, key: str, data: np.ndarray, index_type: str, shards: int = 1) -> None:
+    """
+    Create, train if needed and fill index `key` of a VectorStore with `data`.
+    """
+    from vector_store import IndexSpec
+
+    nlist = max(1, int(4 * math.sqrt(len(data) / shards)))
+    store.create(key, data.shape[1], IndexSpec(type=index_type, nlist=nlist, shards=shards))
+    if not store[key].is_trained:
+        store.train(key, data[:min(len(data), 64 * nlist)].copy())
+    for start in range(0, len(data), BUILD_CHUNK_ROWS):
+        store.add(key, data[start:start + BUILD_CHUNK_ROWS].copy())
+
+
+def faiss_build(count: int, dimension: int, index_type: str, shards: int = 1) -> Dict[str, Any]:
+    """
+    Time building an index of `count` synthetic vectors, training included.
+    """
+    use_service("faiss")
+    from vector_store import VectorStore
+
+    data = synthetic_corpus(count, dimension)
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = VectorStore(data_dir)
+        started = time.perf_counter()
+        _build_store(store, "bench", data, index_type, shards)
+        elapsed = time.perf_counter() - started
+        started = time.perf_counter()
+        size = store.save("bench")
+        saved = time.perf_counter() - started
+    return {
+        "operations": count,
+        "seconds": round(elapsed, 4),
+        "throughput": round(count / elapsed, 2),
+        "save_seconds": round(saved, 4),
+        "snapshot_mb": round(size / 2 ** 20, 2),
+    }
+
+
+def faiss_search(
+    count: int,
+    dimension: int,
+    index_type: str,
+    batch: int = 1,
+    concurrency: int = 16,
+    queries: int = 2000,
+    k: int = 5,
+    shards: int = 1,
+) -> Dict[str, Any]:
+    """
+    Measure /search (batch 1) or /search_batch throughput and latency over HTTP.
+
+    `concurrency` clients send requests back to back until `queries` queries
+    have been answered.
+    """
+    import httpx
+
+    data_dir = tempfile.mkdtemp()
+    os.environ["FAISS_DATA_DIR"] = data_dir
+    use_service("faiss")
+    import faiss_service
+
+    data = synthetic_corpus(count, dimension)
+    _build_store(faiss_service.store, "bench", data, index_type, shards)
+    rng = np.random.default_rng(1)
+    probes = data[rng.integers(0, count, queries)] + 0.1 * rng.standard_normal((queries, dimension)).astype("float32")
+    knobs = {"nprobe": 16} if index_type.startswith("ivf") else {"ef_search": 64} if index_type == "hnsw" else {}
+
+    async def run() -> Dict[str, Any]:
+        async with serve(faiss_service.app) as url:
+            limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+                offsets = iter(range(0, queries, batch))
+                recorder = LatencyRecorder()
+
+                async def worker() -> None:
+                    for offset in offsets:
+                        rows = probes[offset:offset + batch].tolist()
+                        started = time.perf_counter()
+                        if batch == 1:
+                            body = {"key": "bench", "query": rows[0], "k": k, **knobs}
+                            resp = await client.post("/search", json=body)
+                        else:
+                            body = {"key": "bench", "queries": rows, "k": k, **knobs}
+                            resp = await client.post("/search_batch", json=body)
+                        resp.raise_for_status()
+                        recorder.observe(time.perf_counter() - started)
+
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+                recorder.stop()
+                return recorder.summary(operations=queries)
+
+    return asyncio.run(run())
+
+
+def _agent_api(
+    first_token_latency: float,
+    token_latency: float,
+    tool_rate: float,
+    tool_latency: float,
+    max_concurrency: int,
+) -> Any:
+    """
+    Build an AgentAPI around the fake LLM and search tool and an in-process catalogue.
+    """
+    # Keep every component offline regardless of the developer's .env
+    os.environ.update({"FAISS_URL": "", "CHECKPOINT_URL": "", "SEMANTIC_CACHE": "0"})
+    os.environ.setdefault("GIGACHAT_API_KEY", "offline")
+    os.environ.setdefault("TAVILY_API_KEY", "offline")
+    os.environ.setdefault("AGENT_LOG_LEVEL", "WARNING")
+    use_service("agent")
+    use_service("tests")
+    import tour_agent
+    from concurrency import ConcurrencyLimiter
+    from retrieval import CatalogueRetriever
+    from stand_ins import FakeEmbedder, InProcessIndex
+
+    embedder = FakeEmbedder()
+    index = InProcessIndex(embedder.dimension)
+    passages = synthetic_catalogue(500)
+    index.add(embedder.embed_documents(passages), [{"text": text} for text in passages])
+    llm = FakeChatModel(first_token_latency=first_token_latency, token_latency=token_latency, tool_rate=tool_rate)
+    agent = tour_agent.LangGraphAgent(
+        llm=llm,
+        tools=[FakeSearchTool(latency=tool_latency)],
+        retriever=CatalogueRetriever(embedder, index),
+    )
+    limiter = ConcurrencyLimiter(max_concurrency=max_concurrency, max_queue=max_concurrency)
+    return tour_agent.AgentAPI(agent, limiter=limiter)
+
+
+def agent_conversations(
+    users: int,
+    turns: int = 3,
+    streaming: bool = False,
+    first_token_latency: float = 0.2,
+    token_latency: float = 0.01,
+    tool_rate: float = 0.5,
+    tool_latency: float = 0.5,
+) -> Dict[str, Any]:
+    """
+    Run `users` concurrent conversations of `turns` sequential turns against the agent API.
+
+    Streaming runs also report the time to the first token event.
+    """
+    import json
+
+    import httpx
+
+    api = _agent_api(first_token_latency, token_latency, tool_rate, tool_latency, users)
+    questions = synthetic_questions(users * turns)
+
+    async def run() -> Dict[str, Any]:
+        async with serve(api.app) as url:
+            limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+            async with httpx.AsyncClient(base_url=url, limits=limits, timeout=300) as client:
+                recorder = LatencyRecorder()
+                first_token = LatencyRecorder()
+
+                async def conversation(user: int) -> None:
+                    for turn in range(turns):
+                        payload = {"message": questions[user * turns + turn], "thread_id": f"bench-{user}"}
+                        started = time.perf_counter()
+                        if not streaming:
+                            resp = await client.post("/query", json=payload)
+                            resp.raise_for_status()
+                        else:
+                            first = None
+                            async with client.stream("POST", "/query/stream", json=payload) as resp:
+                                resp.raise_for_status()
+                                async for line in resp.aiter_lines():
+                                    if line and first is None and json.loads(line)["type"] == "token":
+                                        first = time.perf_counter() - started
+                            if first is not None:
+                                first_token.observe(first)
+                        recorder.observe(time.perf_counter() - started)
+
+                await asyncio.gather(*(conversation(user) for user in range(users)))
+                recorder.stop()
+                result = recorder.summary()
+                if streaming:
+                    result.update(first_token.summary(prefix="first_token_"))
+                return result
+
+    return asyncio.run(run())
+
+
+def bot_updates(
+    users: int,
+    messages_per_user: int = 3,
+    streaming: bool = True,
+    telegram_latency: float = 0.05,
+    first_token_latency: float = 0.2,
+    token_latency: float = 0.01,
+    tool_rate: float = 0.5,
+    tool_latency: float = 0.5,
+) -> Dict[str, Any]:
+    """
+    Feed synthetic Telegram updates through the bot's dispatcher into the agent API.
+
+    Bot API calls are answered by `FakeTelegramAPI`; the agent runs on the
+    fake LLM behind a loopback server. Latency covers one update from
+    dispatch until the handler has sent the final reply.
+    """
+    api = _agent_api(first_token_latency, token_latency, tool_rate, tool_latency, users)
+    updates = synthetic_updates(users, messages_per_user)
+
+    async def run() -> Dict[str, Any]:
+        async with serve(api.app) as url:
+            os.environ.update({
+                "BOT_TOKEN": "123456:offline-benchmark",
+                "AGENT_URL": f"{url}/query",
+                "AGENT_STREAMING": "1" if streaming else "0",
+                "DB_DSN": "",
+            })
+            use_service("bot")
+            import main
+            from aiogram import Bot, Dispatcher, types
+
+            telegram = FakeTelegramAPI(telegram_latency)
+            main.bot.request = telegram.request
+            Bot.set_current(main.bot)
+            Dispatcher.set_current(main.dp)
+            await main.agent_client.start()
+            recorder = LatencyRecorder()
+
+            async def chat(conversation: List[Dict[str, Any]]) -> None:
+                for update in conversation:
+                    started = time.perf_counter()
+                    await main.dp.process_update(types.Update.to_object(update))
+                    recorder.observe(time.perf_counter() - started)
+
+            try:
+                await asyncio.gather(*(chat(conversation) for conversation in updates))
+            finally:
+                await main.agent_client.close()
+            recorder.stop()
+            result = recorder.summary()
+            result["telegram_calls"] = dict(sorted(telegram.calls.items()))
+            return result
+
+    return asyncio.run(run())
+
+
+# Scenario name -> (function, full cases, quick cases)
+SCENARIOS: Dict[str, tuple] = {
+    "faiss_build": (
+        faiss_build,
+        [
+            {"count": count, "dimension": dimension, "index_type": index_type}
+            for index_type in ("flat", "hnsw", "ivf_flat", "ivf_pq")
+            for count in (10000, 100000)
+            for dimension in (128, 384)
+        ],
+        [{"count": 5000, "dimension": 64, "index_type": t} for t in ("flat", "hnsw", "ivf_flat")]
+        + [{"count": 5000, "dimension": 64, "index_type": "hnsw", "shards": 2}],
+    ),
+    "faiss_search": (
+        faiss_search,
+        [
+            {"count": count, "dimension": dimension, "index_type": index_type, "batch": batch}
+            for index_type in ("flat", "hnsw", "ivf_flat")
+            for count in (10000, 100000)
+            for dimension in (128, 384)
+            for batch in (1, 32)
+        ] + [
+            {"count": 100000, "dimension": 384, "index_type": index_type, "batch": batch, "shards": shards}
+            for index_type in ("flat", "hnsw")
+            for batch in (1, 32)
+            for shards in (2, 4)
+        ],
+        [{"count": 5000, "dimension": 64, "index_type": "flat", "batch": batch, "queries": 500} for batch in (1, 32)]
+        + [{"count": 5000, "dimension": 64, "index_type": "flat", "batch": 32, "queries": 500, "shards": 2}],
+    ),
+    "agent_conversations": (
+        agent_conversations,
+        [
+            {"users": users, "streaming": streaming}
+            for users in (10, 50, 200)
+            for streaming in (False, True)
+        ],
+        [
+            {"users": 5, "turns": 2, "streaming": streaming, "first_token_latency": 0.05, "tool_latency": 0.05}
+            for streaming in (False, True)
+        ],
+    ),
+    "bot_updates": (
+        bot_updates,
+        [{"users": users, "streaming": streaming} for users in (10, 50) for streaming in (False, True)],
+        [{"users": 3, "messages_per_user": 2, "first_token_latency": 0.05, "tool_latency": 0.05}],
+    ),
+}
+
+
+def run_case(name: str, case: Dict[str, Any]) -> Dict[str, Any]:
+    function: Callable[..., Dict[str, Any]] = SCENARIOS[name][0]
+    return function(**case)
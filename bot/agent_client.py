@@ -0,0 +1,283 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Errors raised before the request reached the agent, so resending cannot duplicate a turn
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Statuses returned by the agent's admission control before any processing
+RETRYABLE_STATUSES = {429, 503}
+
+
+class RequestStats:
+    """
+    Rolling timing statistics of agent requests.
+
+    Keeps the durations of the last `window` requests for percentiles plus
+    running counters of requests, failures and retries.
+    """
+
+    def __init__(self, window: int = 1000) -> None:
+        self.durations: Deque[float] = deque(maxlen=window)
+        self.first_event: Deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+
+    def observe(self, duration: float, ok: bool, first_event: Optional[float] = None) -> None:
+        self.requests += 1
+        self.failures += 0 if ok else 1
+        self.durations.append(duration)
+        if first_event is not None:
+            self.first_event.append(first_event)
+
+    @staticmethod
+    def _percentile(values: Deque[float], q: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return counters and p50/p95 of request duration and time to first streamed event.
+        """
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "retries": self.retries,
+            "duration_p50": self._percentile(self.durations, 0.5),
+            "duration_p95": self._percentile(self.durations, 0.95),
+            "first_event_p50": self._percentile(self.first_event, 0.5),
+            "first_event_p95": self._percentile(self.first_event, 0.95),
+        }
+
+
+class AgentClient:
+    """
+    Bot-wide client for the agent service over one pooled keep-alive connection pool.
+
+    Call `start` once the event loop runs (bot startup) and `close` on
+    shutdown. Requests that fail before reaching the agent (connection
+    errors, pool exhaustion) or that the agent rejects under load (429/503)
+    are retried with exponential backoff and full jitter; anything else is
+    raised to the caller, since resending could run a turn twice.
+    """
+
+    def __init__(
+        self,
+        query_url: str,
+        stream_url: Optional[str] = None,
+        timeout: float = 200.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+    ) -> None:
+        """
+        Parameters:
+        ----------
+        query_url : str
+            URL of the agent's `/query` endpoint
+        stream_url : str, optional
+            URL of the streaming endpoint; `query_url` + "/stream" by default
+        timeout : float
+            Read timeout in seconds (covers the whole LLM round trip)
+        connect_timeout : float
+            Connection and pool acquisition timeout in seconds
+        max_connections : int
+            Maximum open connections to the agent
+        max_keepalive_connections : int
+            Idle connections kept open for reuse
+        keepalive_expiry : float
+            Seconds an idle connection is kept
+        retries : int
+            Extra attempts for retryable failures
+        backoff : float
+            Base delay in seconds, doubled on every retry
+        """
+        self.query_url = query_url
+        self.stream_url = stream_url or f"{query_url.rstrip('/')}/stream"
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout, pool=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = RequestStats()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self) -> None:
+        """
+        Open the connection pool.
+        """
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+
+    async def close(self) -> None:
+        """
+        Close the connection pool and log the final statistics.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("Agent client stats: %s", self.stats.snapshot())
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("AgentClient.start() has not been called.")
+        return self._client
+
+    async def _sleep_before_retry(self, attempt: int, response: Optional[httpx.Response] = None) -> None:
+        """
+        Wait before retry number `attempt`, honouring Retry-After when given.
+        """
+        self.stats.retries += 1
+        delay = random.uniform(0, self.backoff * 2 ** attempt)
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            delay = max(delay, float(response.headers["Retry-After"]))
+        await asyncio.sleep(delay)
+
+    async def query(self, payload: dict) -> dict:
+        """
+        POST `payload` to the query endpoint and return the decoded JSON body.
+
+        Raises:
+        ------
+        httpx.RequestError
+            If the agent is unreachable after all retries
+        httpx.HTTPStatusError
+            If the agent returns an error status
+        ValueError
+            If the body is not JSON
+        """
+        started = time.perf_counter()
+        ok = False
+        try:
+            for attempt in range(self.retries + 1):
+                last = attempt == self.retries
+                try:
+                    resp = await self.client.post(self.query_url, json=payload)
+                except RETRYABLE_ERRORS:
+                    if last:
+                        raise
+                    await self._sleep_before_retry(attempt)
+                    continue
+                if resp.status_code in RETRYABLE_STATUSES and not last:
+                    await self._sleep_before_retry(attempt, resp)
+                    continue
+                resp.raise_for_status()
+                data = resp.json()
+                ok = True
+                return data
+        finally:
+            duration = time.perf_counter() - started
+            self.stats.observe(duration, ok)
+            logger.info("agent query thread=%s ok=%s %.3fs", payload.get("thread_id"), ok, duration)
+
+    async def stream(self, payload: dict) -> AsyncIterator[dict]:
+        """
+        POST `payload` to the streaming endpoint and yield its JSON events.
+
+        Retries apply only until the response starts; a stream broken midway
+        is raised to the caller.
+
+        Raises:
+        ------
+        httpx.RequestError
+            If the agent is unreachable after all retries or the stream breaks
+        httpx.HTTPStatusError
+            If the agent returns an error status (404 when streaming is unsupported)
+        ValueError
+            If an event is not valid JSON
+        """
+        started = time.perf_counter()
+        first_event = None
+        ok = False
+        try:
+            for attempt in range(self.retries + 1):
+                last = attempt == self.retries
+                try:
+                    async with self.client.stream("POST", self.stream_url, json=payload) as resp:
+                        if resp.status_code in RETRYABLE_STATUSES and not last:
+                            await self._sleep_before_retry(attempt, resp)
+                            continue
+                        resp.raise_for_status()
+                        async for line in resp.aiter_lines():
+                            if not line:
+                                continue
+                            if first_event is None:
+                                first_event = time.perf_counter() - started
+                            yield json.loads(line)
+                        ok = True
+                        return
+                except RETRYABLE_ERRORS:
+                    if last:
+                        raise
+                    await self._sleep_before_retry(attempt)
+        finally:
+            duration = time.perf_counter() - started
+            self.stats.observe(duration, ok, first_event)
+            logger.info(
+                "agent stream thread=%s ok=%s first_event=%s %.3fs",
+                payload.get("thread_id"), ok, f"{first_event:.3f}s" if first_event is not None else None, duration
+            )
+
+
+def agent_client_from_env() -> AgentClient:
+    """
+    Build the agent client from environment variables.
+
+    Environment variables:
+    ----------------------
+    AGENT_URL : str
+        URL of the agent's `/query` endpoint.
+    AGENT_STREAM_URL : str
+        URL of the streaming endpoint (default: AGENT_URL + "/stream").
+    AGENT_TIMEOUT : float
+        Read timeout in seconds (default: 200).
+    AGENT_CONNECT_TIMEOUT : float
+        Connect and pool timeout in seconds (default: 5).
+    AGENT_MAX_CONNECTIONS : int
+        Maximum open connections (default: 100).
+    AGENT_MAX_KEEPALIVE : int
+        Idle connections kept for reuse (default: 20).
+    AGENT_KEEPALIVE_EXPIRY : float
+        Seconds an idle connection is kept (default: 30).
+    AGENT_RETRIES : int
+        Extra attempts for retryable failures (default: 2).
+    AGENT_RETRY_BACKOFF : float
+        Base retry delay in seconds (default: 0.5).
+
+    Raises:
+    ------
+    ValueError
+        If AGENT_URL is not set
+    """
+    url = os.getenv("AGENT_URL")
+    if not url:
+        raise ValueError("AGENT_URL is not set; point it at the agent's /query endpoint.")
+    return AgentClient(
+        url,
+        stream_url=os.getenv("AGENT_STREAM_URL") or None,
+        timeout=float(os.getenv("AGENT_TIMEOUT", "200")),
+        connect_timeout=float(os.getenv("AGENT_CONNECT_TIMEOUT", "5")),
+        max_connections=int(os.getenv("AGENT_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("AGENT_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("AGENT_KEEPALIVE_EXPIRY", "30")),
+        retries=int(os.getenv("AGENT_RETRIES", "2")),
+        backoff=float(os.getenv("AGENT_RETRY_BACKOFF", "0.5")),
+    )
@@ -1,141 +1,51 @@
+import asyncio
+import logging
 import os
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-import faiss
-import numpy as np
 import asyncpg
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Deque, Optional, Tuple
 
 # Load environment variables
 load_dotenv()
 DB_DSN = os.getenv("DB_DSN")
-
-app = FastAPI()
-
-# In-memory storage for Faiss indices
-index_store: Dict[str, faiss.IndexFlatIP] = {}
-
-
-class CreateIndexRequest(BaseModel):
-    key: str        # Unique identifier for the index
-    dimension: int  # Dimensionality of input vectors
-
-
-class SearchQuery(BaseModel):
-    key: str            # Identifier of the index to query
-    query: List[float]  # Query vector
-    k: int = 5          # Number of nearest neighbors to return
-
-
-@app.post("/create_index")
-async def create_index(request: CreateIndexRequest) -> Dict[str, Any]:
-    """
-    Create a new Faiss index for cosine similarity search.
-
-    Parameters:
-    ----------
-    request : CreateIndexRequest
-        key: Unique key for the index
-        dimension: Dimensionality of vectors to be stored
-
-    Returns:
-    -------
-    dict
-        message: Confirmation that index is created
-        dimension: Dimensionality of the created index
-
-    Raises:
-    ------
-    HTTPException (400)
-        If an index with the given key already exists
-    """
-    if request.key in index_store:
-        raise HTTPException(status_code=400, detail=f"Index '{request.key}' already exists.")
-
-    index = faiss.IndexFlatIP(request.dimension)
-    index_store[request.key] = index
-    return {"message": f"Index '{request.key}' created.", "dimension": request.dimension}
-
-
-@app.post("/add_vectors/{key}")
-async def add_vectors(key: str, vectors: List[List[float]]) -> Dict[str, Any]:
-    """
-    Add vectors to an existing Faiss index.
-
-    Parameters:
-    ----------
-    key : str
-        Identifier of the index
-    vectors : List[List[float]]
-        Vectors to add; each vector length must match index dimensionality
-
-    Returns:
-    -------
-    dict
-        message: Number of vectors added and index key
-
-    Raises:
-    ------
-    HTTPException (404)
-        If the specified index is not found
-    HTTPException (400)
-        If vector dimensionality does not match index
-    """
-    if key not in index_store:
-        raise HTTPException(status_code=404, detail=f"Index '{key}' not found.")
-
-    index = index_store[key]
-    data = np.array(vectors, dtype='float32')
-    if data.shape[1] != index.d:
-        raise HTTPException(status_code=400, detail=f"Expected dimension {index.d}, got {data.shape[1]}.")
-
-    faiss.normalize_L2(data)
-    index.add(data)
-    return {"message": f"Added {len(vectors)} vectors to index '{key}'"}
-
-
-@app.post("/search")
-async def search(query: SearchQuery) -> Dict[str, Any]:
-    """
-    Search for nearest neighbors in a Faiss index using cosine similarity.
-
-    Parameters:
-    ----------
-    query : SearchQuery
-        key: Identifier of the index
-        query: Query vector
-        k: Number of neighbors to retrieve
-
-    Returns:
-    -------
-    dict
-        cosine_similarities: List of similarity scores
-        indices: List of corresponding vector indices
-
-    Raises:
-    ------
-    HTTPException (404)
-        If index not found
-    HTTPException (400)
-        If query dimension mismatch
-    """
-    if query.key not in index_store:
-        raise HTTPException(status_code=404, detail=f"Index '{query.key}' not found.")
-
-    index = index_store[query.key]
-    vec = np.array(query.query, dtype='float32').reshape(1, -1)
-    if vec.shape[1] != index.d:
-        raise HTTPException(status_code=400, detail=f"Expected dimension {index.d}, got {vec.shape[1]}.")
-
-    faiss.normalize_L2(vec)
-    distances, ids = index.search(vec, query.k)
-    return {"cosine_similarities": distances.tolist(), "indices": ids.tolist()}
+# Write-behind message log: flush when this many messages are queued...
+MESSAGE_LOG_BATCH = int(os.getenv("MESSAGE_LOG_BATCH", "200"))
+# ...or this many seconds after the first queued message
+MESSAGE_LOG_FLUSH_INTERVAL = float(os.getenv("MESSAGE_LOG_FLUSH_INTERVAL", "1.0"))
+# Messages kept in memory while the database is unavailable; older ones are dropped
+MESSAGE_LOG_MAX_QUEUE = int(os.getenv("MESSAGE_LOG_MAX_QUEUE", "10000"))
+# Chats whose user_id and current thread_id are kept in memory
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+# Create or refresh users by chat, returning their IDs; relies on the unique index from V0002
+UPSERT_USERS = """
+    INSERT INTO communications.users (username, tg_chat_id, forename, surname)
+    SELECT * FROM unnest($1::text[], $2::text[], $3::text[], $4::text[])
+    ON CONFLICT (tg_chat_id) DO UPDATE
+    SET username = EXCLUDED.username,
+        forename = EXCLUDED.forename,
+        surname = EXCLUDED.surname,
+        dttm_updated = NOW()
+    RETURNING tg_chat_id, user_id
+"""
+
+logger = logging.getLogger(__name__)
 
 
 class Database:
     """
     Asynchronous PostgreSQL database access using asyncpg.
+
+    Conversation messages are logged write-behind: `log_message` only appends
+    to an in-memory queue, and a background task writes queued messages in
+    batches with one COPY into `communications.messages`, resolving users and
+    threads for the whole batch in one query each. asyncpg prepares and
+    caches the statements per connection.
+
+    User IDs and current threads of the last USER_CACHE_SIZE chats are kept
+    in LRU caches, so known users cost no query at all.
     """
 
     def __init__(self) -> None:
@@ -146,12 +56,20 @@ class Database:
         ----------
         db_pool : asyncpg.Pool | None
             Connection pool (initialized in create_pool)
+        dropped : int
+            Messages discarded because the queue overflowed
         """
         self.db_pool = None
+        self._queue: Deque[Tuple[Any, str, str, Optional[int], datetime]] = deque()
+        self._user_ids: "OrderedDict[str, int]" = OrderedDict()  # tg_chat_id -> user_id
+        self._threads: "OrderedDict[str, int]" = OrderedDict()  # tg_chat_id -> thread_id
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self.dropped = 0
 
     async def create_pool(self) -> None:
         """
-        Establish a connection pool to the PostgreSQL database.
+        Establish a connection pool to the PostgreSQL database and start the message log flusher.
 
         Uses DSN from environment variable `DB_DSN`.
 
@@ -161,10 +79,59 @@ class Database:
             If pool creation fails.
         """
         self.db_pool = await asyncpg.create_pool(dsn=DB_DSN)
+        self._wakeup = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """
+        Flush queued messages and close the connection pool.
+        """
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self.db_pool is not None:
+            await self.flush()
+            await self.db_pool.close()
+            self.db_pool = None
+
+    @staticmethod
+    def _remember(cache: "OrderedDict[str, int]", chat_id: str, value: int) -> None:
+        cache[chat_id] = value
+        cache.move_to_end(chat_id)
+        while len(cache) > USER_CACHE_SIZE:
+            cache.popitem(last=False)
+
+    async def _upsert_users(self, conn: asyncpg.Connection, users: Dict[str, Any]) -> Dict[str, int]:
+        """
+        Create or refresh users in one statement and return their IDs.
+
+        Parameters:
+        ----------
+        conn : asyncpg.Connection
+            Connection to run the statement on
+        users : Dict[str, Any]
+            Telegram users by tg_chat_id
+
+        Returns:
+        -------
+        Dict[str, int]
+            user_id by tg_chat_id
+        """
+        chat_ids = list(users)
+        rows = await conn.fetch(
+            UPSERT_USERS,
+            [users[c].username for c in chat_ids], chat_ids,
+            [users[c].first_name for c in chat_ids], [users[c].last_name for c in chat_ids]
+        )
+        return {row['tg_chat_id']: row['user_id'] for row in rows}
 
     async def register_user_if_not_exists(self, user: Any) -> None:
         """
-        Insert a new user record in `communications.users` if not exists.
+        Insert a user record in `communications.users` unless the chat is already known.
 
         Parameters:
         ----------
@@ -176,29 +143,47 @@ class Database:
         asyncpg.PostgresError
             If database operation fails.
         """
+        chat_id = str(user.id)
+        if chat_id in self._user_ids:
+            self._user_ids.move_to_end(chat_id)
+            return
         async with self.db_pool.acquire() as conn:
-            uid = await conn.fetchval(
-                "SELECT user_id FROM communications.users WHERE tg_chat_id = $1",
-                str(user.id)
-            )
-            if not uid:
-                await conn.execute(
-                    """
-                    INSERT INTO communications.users 
-                    (username, tg_chat_id, forename, surname)
-                    VALUES ($1, $2, $3, $4)
-                    """,
-                    user.username, str(user.id), user.first_name, user.last_name
-                )
+            user_ids = await self._upsert_users(conn, {chat_id: user})
+        self._remember(self._user_ids, chat_id, user_ids[chat_id])
+
+    def log_message(self, user: Any, text: str, author: str, feedback: Optional[int] = None) -> None:
+        """
+        Queue a conversation message for batched insertion; never blocks.
+
+        Parameters:
+        ----------
+        user : Any
+            Telegram user (id, username, first_name, last_name) the message belongs to
+        text : str
+            Message text
+        author : str
+            'USER' or 'CONSULTANT'
+        feedback : int, optional
+            Feedback marker stored with the message
+        """
+        if len(self._queue) >= MESSAGE_LOG_MAX_QUEUE:
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append((user, text, author, feedback, datetime.now(timezone.utc)))
+        if self._wakeup is not None and (len(self._queue) >= MESSAGE_LOG_BATCH or len(self._queue) == 1):
+            self._wakeup.set()
 
     async def save_feedback(self, user: Any, feedback_text: str) -> None:
         """
         Save a feedback message linked to a new thread.
 
+        Written at once rather than through the message log, so the user is
+        thanked only after the feedback is stored.
+
         Parameters:
         ----------
         user : Any
-            Object with attribute `id` representing tg_chat_id
+            Telegram user (id, username, first_name, last_name) leaving the feedback
         feedback_text : str
             Feedback content
 
@@ -207,24 +192,96 @@ class Database:
         asyncpg.PostgresError
             If database operation fails.
         """
+        chat_id = str(user.id)
+        async with self.db_pool.acquire() as conn:
+            async with conn.transaction():
+                user_id = self._user_ids.get(chat_id)
+                if user_id is None:
+                    user_id = (await self._upsert_users(conn, {chat_id: user}))[chat_id]
+                thread_id = await conn.fetchval(
+                    "INSERT INTO communications.threads DEFAULT VALUES RETURNING thread_id"
+                )
+                await conn.execute(
+                    """
+                    INSERT INTO communications.messages (text, thread_id, user_id, author, feedback)
+                    VALUES ($1, $2, $3, 'USER', 1)
+                    """,
+                    feedback_text, thread_id, user_id
+                )
+        self._remember(self._user_ids, chat_id, user_id)
+
+    async def _flush_loop(self) -> None:
+        """
+        Background task: flush when a batch fills up or the first queued message has waited long enough.
+
+        A failed flush is logged and retried after MESSAGE_LOG_FLUSH_INTERVAL;
+        only cancellation stops the task.
+        """
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if len(self._queue) < MESSAGE_LOG_BATCH:
+                await asyncio.sleep(MESSAGE_LOG_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception:
+                logger.warning("Message log flush failed; will retry", exc_info=True)
+                await asyncio.sleep(MESSAGE_LOG_FLUSH_INTERVAL)
+                self._wakeup.set()
+
+    async def flush(self) -> None:
+        """
+        Write all queued messages.
+
+        Raises:
+        ------
+        asyncpg.PostgresError
+            If database operation fails; unwritten messages stay queued.
+        """
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(len(self._queue), MESSAGE_LOG_BATCH))]
+            try:
+                await self._write(batch)
+            except BaseException:
+                self._queue.extendleft(reversed(batch))
+                raise
+
+    async def _write(self, batch: List[Tuple[Any, str, str, Optional[int], datetime]]) -> None:
+        """
+        Insert one batch of messages, creating users and threads of new chats first.
+        """
         async with self.db_pool.acquire() as conn:
-            uid = await conn.fetchval(
-                "SELECT user_id FROM communications.users WHERE tg_chat_id = $1",
-                str(user.id)
-            )
-            tid = await conn.fetchval(
-                "INSERT INTO communications.threads DEFAULT VALUES RETURNING thread_id"
-            )
-            await conn.execute(
-                """
-                INSERT INTO communications.messages 
-                (text, thread_id, user_id, author, feedback)
-                VALUES ($1, $2, $3, 'USER', 1)
-                """,
-                feedback_text, tid, uid
-            )
-
-
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=5000)
+            async with conn.transaction():
+                users = {str(user.id): user for user, *_ in batch}
+                user_ids = {c: self._user_ids[c] for c in users if c in self._user_ids}
+                thread_ids = {c: self._threads[c] for c in users if c in self._threads}
+                unknown = {c: user for c, user in users.items() if c not in user_ids}
+                if unknown:
+                    user_ids.update(await self._upsert_users(conn, unknown))
+                missing = [c for c in users if c not in thread_ids]
+                if missing:
+                    rows = await conn.fetch(
+                        """
+                        INSERT INTO communications.threads (dttm_inserted)
+                        SELECT NOW() FROM generate_series(1, $1)
+                        RETURNING thread_id
+                        """,
+                        len(missing)
+                    )
+                    thread_ids.update(zip(missing, (row['thread_id'] for row in rows)))
+
+                records = []
+                for user, text, author, feedback, created in batch:
+                    chat_id = str(user.id)
+                    records.append((text, thread_ids[chat_id], user_ids[chat_id], author, feedback, created, created))
+                await conn.copy_records_to_table(
+                    'messages',
+                    schema_name='communications',
+                    columns=['text', 'thread_id', 'user_id', 'author', 'feedback', 'dttm_inserted', 'dttm_updated'],
+                    records=records,
+                )
+        # Cache only IDs the committed transaction created
+        for chat_id in users:
+            self._remember(self._user_ids, chat_id, user_ids[chat_id])
+            self._remember(self._threads, chat_id, thread_ids[chat_id])
+
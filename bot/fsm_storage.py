@@ -0,0 +1,256 @@
+import abc
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import typing
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.dispatcher.storage import BaseStorage
+
+# Address = (chat_id, user_id); aiogram passes either as int or str
+Address = Tuple[int, int]
+
+# Fields kept per (chat, user) and their values when unset
+FIELDS = {"state": None, "data": {}, "bucket": {}}
+
+
+class SQLStorage(BaseStorage, abc.ABC):
+    """
+    Aiogram FSM storage keeping one row per (chat, user) in a shared SQL table.
+
+    Unlike MemoryStorage, state survives restarts and is visible to every bot
+    worker process. Every call reads or writes the row directly, without a
+    cache, so a worker always sees what another one wrote last. Updates are
+    read-modify-write; they stay consistent because the ingress routes all
+    updates of a chat to the same worker, which runs them one at a time while
+    the chat is in an FSM state (see `ingress`). Rows whose state, data and bucket are all empty are deleted.
+
+    Subclasses implement `_read` and `_write`.
+    """
+
+    @abc.abstractmethod
+    async def _read(self, address: Address) -> Dict[str, Any]:
+        """
+        Return all fields of the row at `address`, with FIELDS defaults for a missing row.
+        """
+
+    @abc.abstractmethod
+    async def _write(self, address: Address, field: str, value: Any) -> None:
+        """
+        Set one field of the row at `address`, deleting the row once every field is empty.
+        """
+
+    def _address(self, chat: typing.Union[str, int, None], user: typing.Union[str, int, None]) -> Address:
+        chat, user = self.check_address(chat=chat, user=user)
+        return int(chat), int(user)
+
+    async def get_state(self, *, chat=None, user=None, default: Optional[str] = None) -> Optional[str]:
+        state = (await self._read(self._address(chat, user)))["state"]
+        return state if state is not None else self.resolve_state(default)
+
+    async def get_data(self, *, chat=None, user=None, default: Optional[dict] = None) -> Dict:
+        return (await self._read(self._address(chat, user)))["data"]
+
+    async def set_state(self, *, chat=None, user=None, state=None) -> None:
+        await self._write(self._address(chat, user), "state", self.resolve_state(state))
+
+    async def set_data(self, *, chat=None, user=None, data: Dict = None) -> None:
+        await self._write(self._address(chat, user), "data", dict(data or {}))
+
+    async def update_data(self, *, chat=None, user=None, data: Dict = None, **kwargs) -> None:
+        address = self._address(chat, user)
+        current = (await self._read(address))["data"]
+        current.update(data or {}, **kwargs)
+        await self._write(address, "data", current)
+
+    def has_bucket(self) -> bool:
+        return True
+
+    async def get_bucket(self, *, chat=None, user=None, default: Optional[dict] = None) -> Dict:
+        return (await self._read(self._address(chat, user)))["bucket"]
+
+    async def set_bucket(self, *, chat=None, user=None, bucket: Dict = None) -> None:
+        await self._write(self._address(chat, user), "bucket", dict(bucket or {}))
+
+    async def update_bucket(self, *, chat=None, user=None, bucket: Dict = None, **kwargs) -> None:
+        address = self._address(chat, user)
+        current = (await self._read(address))["bucket"]
+        current.update(bucket or {}, **kwargs)
+        await self._write(address, "bucket", current)
+
+
+class PostgresStorage(SQLStorage):
+    """
+    FSM storage in `communications.fsm_states` (see V0003), using the bot's asyncpg pool.
+    """
+
+    def __init__(self, db: Any) -> None:
+        """
+        Parameters:
+        ----------
+        db : Database
+            Bot database whose `db_pool` is used; the pool may be created after the storage
+        """
+        self.db = db
+
+    async def _read(self, address: Address) -> Dict[str, Any]:
+        row = await self.db.db_pool.fetchrow(
+            "SELECT state, data, bucket FROM communications.fsm_states WHERE chat_id = $1 AND user_id = $2",
+            *address,
+        )
+        if row is None:
+            return {field: (dict(empty) if empty is not None else None) for field, empty in FIELDS.items()}
+        return {"state": row["state"], "data": json.loads(row["data"]), "bucket": json.loads(row["bucket"])}
+
+    async def _write(self, address: Address, field: str, value: Any) -> None:
+        encoded = json.dumps(value) if field != "state" else value
+        # `field` is one of FIELDS, never user input
+        async with self.db.db_pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    f"""
+                    INSERT INTO communications.fsm_states (chat_id, user_id, {field})
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT (chat_id, user_id) DO UPDATE
+                    SET {field} = EXCLUDED.{field}, dttm_updated = NOW()
+                    """,
+                    *address, encoded,
+                )
+                if value in (None, {}):
+                    await conn.execute(
+                        """
+                        DELETE FROM communications.fsm_states
+                        WHERE chat_id = $1 AND user_id = $2
+                          AND state IS NULL AND data = '{}'::jsonb AND bucket = '{}'::jsonb
+                        """,
+                        *address,
+                    )
+
+    async def close(self) -> None:
+        pass  # The pool belongs to the database
+
+    async def wait_closed(self) -> None:
+        pass
+
+
+class SQLiteStorage(SQLStorage):
+    """
+    FSM storage in a local SQLite file, shared by worker processes on one host.
+
+    Meant for development and tests without PostgreSQL. Queries run in the
+    default thread pool over one WAL-mode connection per process, opened on
+    first use, so forked workers never share the parent's connection.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Parameters:
+        ----------
+        path : str
+            Database file; created with its table if missing
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Return this process's connection, creating it and the table if needed. Caller holds the lock.
+        """
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._pid = os.getpid()
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS fsm_states (
+                    chat_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    state TEXT,
+                    data TEXT NOT NULL DEFAULT '{}',
+                    bucket TEXT NOT NULL DEFAULT '{}',
+                    PRIMARY KEY (chat_id, user_id)
+                )
+                """
+            )
+        return self._conn
+
+    def _run(self, sql: str, *args: Any) -> Optional[tuple]:
+        with self._lock:
+            return self._connection().execute(sql, args).fetchone()
+
+    async def _read(self, address: Address) -> Dict[str, Any]:
+        row = await asyncio.get_running_loop().run_in_executor(
+            None, self._run, "SELECT state, data, bucket FROM fsm_states WHERE chat_id = ? AND user_id = ?", *address
+        )
+        if row is None:
+            return {field: (dict(empty) if empty is not None else None) for field, empty in FIELDS.items()}
+        return {"state": row[0], "data": json.loads(row[1]), "bucket": json.loads(row[2])}
+
+    def _write_sync(self, address: Address, field: str, value: Any) -> None:
+        encoded = json.dumps(value) if field != "state" else value
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    f"INSERT INTO fsm_states (chat_id, user_id, {field}) VALUES (?, ?, ?) "
+                    f"ON CONFLICT (chat_id, user_id) DO UPDATE SET {field} = excluded.{field}",
+                    (*address, encoded),
+                )
+                conn.execute(
+                    "DELETE FROM fsm_states WHERE chat_id = ? AND user_id = ? "
+                    "AND state IS NULL AND data = '{}' AND bucket = '{}'",
+                    address,
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    async def _write(self, address: Address, field: str, value: Any) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self._write_sync, address, field, value)
+
+    async def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    async def wait_closed(self) -> None:
+        pass
+
+
+def fsm_storage_from_env(db: Any) -> BaseStorage:
+    """
+    Build the FSM storage selected by the environment.
+
+    Environment variables:
+    ----------------------
+    FSM_STORAGE : str
+        `memory` (default; one process only), `postgres` or `sqlite`
+    FSM_SQLITE_PATH : str
+        SQLite file for `sqlite` (default: fsm_states.sqlite3)
+
+    Parameters:
+    ----------
+    db : Database
+        Bot database, whose pool backs the `postgres` storage
+
+    Raises:
+    ------
+    ValueError
+        If FSM_STORAGE names an unknown storage
+    """
+    kind = os.getenv("FSM_STORAGE", "memory")
+    if kind == "memory":
+        from aiogram.contrib.fsm_storage.memory import MemoryStorage
+        return MemoryStorage()
+    if kind == "postgres":
+        return PostgresStorage(db)
+    if kind == "sqlite":
+        return SQLiteStorage(os.getenv("FSM_SQLITE_PATH", "fsm_states.sqlite3"))
+    raise ValueError(f"Unknown FSM_STORAGE '{kind}'; use memory, postgres or sqlite.")
@@ -0,0 +1,299 @@
+import asyncio
+import functools
+import hmac
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import zlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.utils.exceptions import TelegramAPIError
+from aiohttp import ClientError, web
+
+logger = logging.getLogger(__name__)
+
+# Public HTTPS URL Telegram posts updates to; setting it switches the bot to webhook mode
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+# How updates arrive: `webhook` or `polling` (getUpdates, the fallback without a public URL)
+BOT_MODE = os.getenv("BOT_MODE", "webhook" if WEBHOOK_URL else "polling")
+# Address the webhook server listens on; TLS terminates in front of it
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Secret Telegram echoes in X-Telegram-Bot-Api-Secret-Token; other requests are rejected. Required in webhook mode
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Worker processes handling updates; all updates of one chat go to the same worker
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+# Updates queued per worker, and taken off its queue at once, before the ingress pushes back
+WORKER_QUEUE_SIZE = int(os.getenv("BOT_WORKER_QUEUE_SIZE", "1000"))
+# Updates a worker handles at once, across different chats
+WORKER_CONCURRENCY = int(os.getenv("BOT_WORKER_CONCURRENCY", "64"))
+# Long-polling timeout of getUpdates in polling mode, in seconds
+POLLING_TIMEOUT = int(os.getenv("BOT_POLLING_TIMEOUT", "20"))
+
+Hook = Callable[[Dispatcher], Awaitable[None]]
+
+
+def chat_key(update: Dict[str, Any]) -> int:
+    """
+    Return the chat a raw update belongs to, or its sender for updates outside
+    a chat (inline queries, poll answers); 0 if it has neither.
+    """
+    for body in update.values():
+        if not isinstance(body, dict):
+            continue
+        for holder in (body, body.get("message")):
+            if isinstance(holder, dict) and isinstance(holder.get("chat"), dict):
+                return int(holder["chat"]["id"])
+        sender = body.get("from") or body.get("user")
+        if isinstance(sender, dict):
+            return int(sender["id"])
+    return 0
+
+
+def worker_for(update: Dict[str, Any], workers: int) -> int:
+    """
+    Pick the worker of an update by a stable hash of its chat.
+    """
+    return zlib.crc32(str(chat_key(update)).encode()) % workers
+
+
+def user_key(update: Dict[str, Any]) -> Optional[int]:
+    """
+    Return the sender of a raw update, or None if it has none.
+    """
+    for body in update.values():
+        if isinstance(body, dict) and isinstance(body.get("from"), dict):
+            return int(body["from"]["id"])
+    return None
+
+
+async def _work(index: int, updates: "multiprocessing.Queue", dp: Dispatcher, on_startup: Hook, on_shutdown: Hook) -> None:
+    """
+    Handle the updates of one worker queue until a None sentinel arrives.
+
+    Updates of one chat start in arrival order. While the chat is in an FSM
+    state (the feedback flow), its update runs alone and the next one waits
+    for it to finish, so the state it sets or clears is seen; other updates
+    let the next one start at once, as in single-process polling, so text
+    messages overlap and the agent merges them into one turn. An update
+    takes one of WORKER_CONCURRENCY slots only once it may start, so a
+    waiting update never holds a slot. At most WORKER_QUEUE_SIZE updates are
+    taken off the queue at once; a busy worker leaves the rest queued and
+    the ingress pushes back.
+    """
+    Bot.set_current(dp.bot)
+    Dispatcher.set_current(dp)
+    await on_startup(dp)
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(WORKER_CONCURRENCY)
+    held = asyncio.Semaphore(WORKER_QUEUE_SIZE)
+    # Per chat: resolved once the chat's latest update lets the next one start
+    gates: Dict[int, asyncio.Future] = {}
+    tasks: Set[asyncio.Task] = set()
+
+    async def handle(update: Dict[str, Any], previous: Optional[asyncio.Future], gate: asyncio.Future) -> None:
+        try:
+            if previous is not None:
+                await previous
+            async with slots:
+                user = user_key(update)
+                if user is None or await dp.storage.get_state(chat=chat_key(update), user=user) is None:
+                    gate.set_result(None)
+                await dp.process_update(types.Update(**update))
+        except Exception:
+            logger.exception("Worker %d failed to handle update %s", index, update.get("update_id"))
+        finally:
+            if not gate.done():
+                gate.set_result(None)
+            held.release()
+
+    def forget(key: int, gate: asyncio.Future) -> None:
+        if gates.get(key) is gate:
+            del gates[key]
+
+    try:
+        while True:
+            await held.acquire()
+            update = await loop.run_in_executor(None, updates.get)
+            if update is None:
+                break
+            key = chat_key(update)
+            gate = loop.create_future()
+            task = asyncio.create_task(handle(update, gates.get(key), gate))
+            gates[key] = gate
+            gate.add_done_callback(functools.partial(forget, key))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(list(tasks))
+    finally:
+        await on_shutdown(dp)
+        await dp.storage.close()
+        await dp.storage.wait_closed()
+        await (await dp.bot.get_session()).close()
+
+
+def run_worker(index: int, updates: "multiprocessing.Queue", dp: Dispatcher, on_startup: Hook, on_shutdown: Hook) -> None:
+    """
+    Entry point of a worker process.
+    """
+    # Ctrl+C reaches the whole process group; workers stop via their queue instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_work(index, updates, dp, on_startup, on_shutdown))
+
+
+class UpdateRouter:
+    """
+    Fan raw updates out to BOT_WORKERS worker processes, by chat hash.
+
+    Workers are forked from the ingress process before it opens any
+    connection, so they inherit the dispatcher with its handlers and each
+    creates its own database pool, agent client and Telegram session in
+    `on_startup`. Every worker reads a bounded queue of its own.
+    """
+
+    def __init__(self, dp: Dispatcher, on_startup: Hook, on_shutdown: Hook, workers: int = BOT_WORKERS) -> None:
+        context = multiprocessing.get_context("fork")
+        self.queues: List["multiprocessing.Queue"] = [context.Queue(WORKER_QUEUE_SIZE) for _ in range(workers)]
+        self.processes = [
+            context.Process(
+                target=run_worker, args=(index, updates, dp, on_startup, on_shutdown), name=f"bot-worker-{index}"
+            )
+            for index, updates in enumerate(self.queues)
+        ]
+
+    def start(self) -> None:
+        for process in self.processes:
+            process.start()
+
+    def route(self, update: Dict[str, Any]) -> bool:
+        """
+        Queue an update for the worker of its chat; False if that worker's queue is full.
+        """
+        try:
+            self.queues[worker_for(update, len(self.queues))].put_nowait(update)
+        except queue.Full:
+            return False
+        return True
+
+    def stop(self, timeout: float = 60.0) -> None:
+        """
+        Let workers finish the queued updates, then wait for them to exit.
+        """
+        for updates in self.queues:
+            updates.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning("Worker %s did not stop in %.0f s; terminating it", process.name, timeout)
+                process.terminate()
+
+
+def webhook_app(bot: Bot, router: UpdateRouter) -> web.Application:
+    """
+    Build the aiohttp app receiving Telegram webhook calls and routing them to workers.
+
+    Calls without the WEBHOOK_SECRET header are rejected with 401, and
+    bodies that are not a JSON object with 400. Updates are acknowledged as soon as they are queued. When the worker's queue is
+    full the call is answered with 503, and Telegram redelivers it later.
+
+    Raises:
+    ------
+    ValueError
+        If WEBHOOK_URL or WEBHOOK_SECRET is not set
+    """
+    if not WEBHOOK_URL or not WEBHOOK_SECRET:
+        raise ValueError("Webhook mode needs WEBHOOK_URL and WEBHOOK_SECRET.")
+
+    async def receive(request: web.Request) -> web.Response:
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token.encode(), WEBHOOK_SECRET.encode()):
+            return web.Response(status=401)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(update, dict):
+            return web.Response(status=400)
+        if not router.route(update):
+            return web.Response(status=503)
+        return web.Response()
+
+    async def register(app: web.Application) -> None:
+        await bot.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+        logger.info("Webhook set to %s", WEBHOOK_URL)
+
+    async def close(app: web.Application) -> None:
+        # The webhook stays registered, so Telegram keeps updates while the bot restarts
+        await (await bot.get_session()).close()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, receive)
+    app.on_startup.append(register)
+    app.on_cleanup.append(close)
+    return app
+
+
+async def poll(bot: Bot, router: UpdateRouter) -> None:
+    """
+    Fetch updates with getUpdates and route them to workers, waiting while the target queue is full.
+    """
+    await bot.delete_webhook()  # getUpdates is refused while a webhook is set
+    offset = None
+    try:
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=POLLING_TIMEOUT)
+            except (TelegramAPIError, ClientError, asyncio.TimeoutError) as e:
+                logger.warning("getUpdates failed: %s", e)
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                while not router.route(update.to_python()):
+                    await asyncio.sleep(0.1)
+                offset = update.update_id + 1
+    finally:
+        await (await bot.get_session()).close()
+
+
+def serve(dp: Dispatcher, on_startup: Hook, on_shutdown: Hook, mode: str = BOT_MODE) -> None:
+    """
+    Run the ingress process: start the workers, then receive updates by webhook or polling until stopped.
+
+    Environment variables:
+    ----------------------
+    BOT_MODE : str
+        `webhook` (default when WEBHOOK_URL is set) or `polling`
+    BOT_WORKERS : int
+        Worker processes (default: 1)
+    WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET : str
+        Public URL, listen address and path, and secret token of the webhook;
+        the URL and the secret are required in webhook mode
+
+    Raises:
+    ------
+    ValueError
+        In webhook mode, if WEBHOOK_URL or WEBHOOK_SECRET is not set
+    """
+    if BOT_WORKERS > 1 and isinstance(dp.storage, MemoryStorage):
+        logger.warning("FSM_STORAGE=memory keeps FSM state per worker and loses it on restart")
+    router = UpdateRouter(dp, on_startup, on_shutdown)
+    # Built before the workers start, so a webhook without a secret never runs
+    app = webhook_app(dp.bot, router) if mode == "webhook" else None
+    router.start()
+    # Stop on `docker stop` as on Ctrl+C; aiohttp handles both itself in webhook mode
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        if mode == "webhook":
+            web.run_app(app, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+        else:
+            asyncio.run(poll(dp.bot, router))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        router.stop()
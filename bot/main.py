@@ -1,26 +1,37 @@
+import asyncio
+import logging
 import os
+from typing import List, Optional
 from aiogram import Bot, Dispatcher, types
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters import Command, Text
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from aiogram.utils import executor
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram.utils.exceptions import TelegramAPIError
 from dotenv import load_dotenv
+from agent_client import agent_client_from_env
 from database import Database
+from fsm_storage import fsm_storage_from_env
 import httpx
+import ingress
 
 # Load environment variables
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
-AGENT_URL = os.getenv("AGENT_URL")
+# Stream replies from the agent and edit them in place as tokens arrive
+AGENT_STREAMING = os.getenv("AGENT_STREAMING", "1") == "1"
+# Minimum seconds between edits of a streamed reply (Telegram rate-limits edits)
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+TELEGRAM_MESSAGE_LIMIT = 4096
 
-# Initialize bot and dispatcher
+# Initialize bot and dispatcher; FSM state lives in FSM_STORAGE, shared by all workers
 bot = Bot(token=BOT_TOKEN)
-storage = MemoryStorage()
+db = Database()
+storage = fsm_storage_from_env(db)
 dp = Dispatcher(bot, storage=storage)
 
-db = Database()
+agent_client = agent_client_from_env()
 
 
 class FeedbackState(StatesGroup):
@@ -41,7 +52,7 @@ async def on_startup(dp: Dispatcher) -> None:
     """
     Actions to run on bot startup.
 
-    Connects to the database pool.
+    Connects to the database pool and opens the agent connection pool.
 
     Parameters:
     ----------
@@ -53,9 +64,30 @@ async def on_startup(dp: Dispatcher) -> None:
     None
     """
     await db.create_pool()
+    await agent_client.start()
     print("Бот запущен и подключился к БД.")
 
 
+async def on_shutdown(dp: Dispatcher) -> None:
+    """
+    Actions to run on bot shutdown.
+
+    Closes the agent connection pool, then writes queued messages to the
+    database and closes its pool.
+
+    Parameters:
+    ----------
+    dp : Dispatcher
+        Aiogram Dispatcher instance (unused)
+
+    Returns:
+    -------
+    None
+    """
+    await agent_client.close()
+    await db.close()
+
+
 @dp.message_handler(Command("start"))
 async def start(message: types.Message) -> None:
     """
@@ -138,12 +170,144 @@ async def save_feedback(message: types.Message, state: FSMContext) -> None:
     await state.finish()
 
 
+def split_text(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """
+    Split text into Telegram-sized parts, preferring line breaks as cut points.
+    """
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    parts.append(text)
+    return parts
+
+
+async def query_agent(payload: dict) -> Optional[str]:
+    """
+    Send a message to the agent's `/query` endpoint and return the reply text.
+
+    Parameters:
+    ----------
+    payload : dict
+        Request body with `message` and `thread_id`
+
+    Returns:
+    -------
+    str | None
+        Agent reply, an error message for the user, or None if the message
+        was merged into a later one and will be answered with it
+    """
+    try:
+        data = await agent_client.query(payload)
+        if data.get("merged"):
+            return None
+        return data.get("response", "Агент вернул пустой ответ.")
+    except httpx.RequestError:
+        return "Не удалось связаться с сервисом агента."
+    except httpx.HTTPStatusError as e:
+        return f"Ошибка от агента: {e.response.status_code}"
+    except ValueError:
+        return "Некорректный формат ответа от агента."
+
+
+async def stream_agent_reply(message: types.Message, payload: dict) -> Optional[str]:
+    """
+    Stream the agent's reply into a Telegram message edited in place.
+
+    Reads the agent's streamed events through `agent_client`. The first
+    piece of text is sent as a new message, which is then edited at most once
+    per STREAM_EDIT_INTERVAL seconds as more text arrives; the final edit
+    carries the complete answer, with overflow beyond Telegram's message
+    limit sent as extra messages. Nothing is sent if the agent merged the
+    message into a later one. Falls back to `query_agent` if the agent
+    has no streaming endpoint.
+
+    Parameters:
+    ----------
+    message : types.Message
+        Incoming Telegram message
+    payload : dict
+        Request body with `message` and `thread_id`
+
+    Returns:
+    -------
+    str | None
+        Text sent to the user, or None if the message was merged
+    """
+    loop = asyncio.get_running_loop()
+    reply: Optional[types.Message] = None
+    shown = ""
+    text = ""
+    last_edit = 0.0
+
+    async def show(current: str) -> None:
+        nonlocal reply, shown, last_edit
+        preview = split_text(current)[0]
+        try:
+            if reply is None:
+                reply = await message.answer(preview)
+            elif preview != shown:
+                await reply.edit_text(preview)
+        except TelegramAPIError:
+            return  # Rate limited or not modified: the next update will catch up
+        shown = preview
+        last_edit = loop.time()
+
+    await bot.send_chat_action(message.chat.id, types.ChatActions.TYPING)
+    try:
+        async for event in agent_client.stream(payload):
+            if event["type"] == "token":
+                text += event["content"]
+            elif event["type"] == "tool":
+                # Text before a tool call was a preamble; the answer follows the tool result
+                text = ""
+                await bot.send_chat_action(message.chat.id, types.ChatActions.TYPING)
+            elif event["type"] == "done":
+                text = event["response"] or "Агент вернул пустой ответ."
+            elif event["type"] == "error":
+                text = f"Ошибка от агента: {event['detail']}"
+            elif event["type"] == "merged":
+                return None
+            if text and loop.time() - last_edit >= STREAM_EDIT_INTERVAL:
+                await show(text + " …")
+    except httpx.RequestError:
+        text = "Не удалось связаться с сервисом агента."
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            text = await query_agent(payload)
+            if text is None:
+                return None
+        else:
+            text = f"Ошибка от агента: {e.response.status_code}"
+    except (ValueError, KeyError):
+        text = "Некорректный формат ответа от агента."
+
+    text = text or "Агент вернул пустой ответ."
+    parts = split_text(text)
+    if reply is None:
+        await message.answer(parts[0], reply_markup=main_kb)
+    elif parts[0] != shown:
+        try:
+            await reply.edit_text(parts[0])
+        except TelegramAPIError:
+            await message.answer(parts[0], reply_markup=main_kb)
+    for part in parts[1:]:
+        await message.answer(part, reply_markup=main_kb)
+    return text
+
+
 @dp.message_handler()
 async def handle_message(message: types.Message) -> None:
     """
     Forward general messages to the external agent service and respond.
 
-    Sends user message to AGENT_URL, returns agent's response or error message.
+    Sends user message to the agent; with AGENT_STREAMING enabled (default)
+    the reply is streamed and shown progressively, otherwise it is sent once
+    complete. Both the message and the reply are queued to the database
+    message log.
 
     Parameters:
     ----------
@@ -156,23 +320,25 @@ async def handle_message(message: types.Message) -> None:
 
     Notes:
     -----
-    Uses httpx.AsyncClient for HTTP requests.
+    Uses the bot-wide pooled `agent_client` for HTTP requests.
     """
+    db.log_message(message.from_user, message.text, 'USER')
     payload = {"message": message.text, "thread_id": str(message.from_user.id)}
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.post(AGENT_URL, json=payload, timeout=200.0)
-            resp.raise_for_status()
-            data = resp.json()
-            text = data.get("response", "Агент вернул пустой ответ.")
-        except httpx.RequestError:
-            text = "Не удалось связаться с сервисом агента."
-        except httpx.HTTPStatusError as e:
-            text = f"Ошибка от агента: {e.response.status_code}"
-        except ValueError:
-            text = "Некорректный формат ответа от агента."
-    await message.answer(text, reply_markup=main_kb)
+    if AGENT_STREAMING:
+        text = await stream_agent_reply(message, payload)
+    else:
+        text = await query_agent(payload)
+        if text is not None:
+            await message.answer(text, reply_markup=main_kb)
+    if text is not None:
+        db.log_message(message.from_user, text, 'CONSULTANT')
 
 
 if __name__ == "__main__":
-    executor.start_polling(dp, on_startup=on_startup)
+    logging.basicConfig(level=logging.INFO)
+    if ingress.BOT_MODE == "polling" and ingress.BOT_WORKERS == 1:
+        # Single process: aiogram's own polling loop
+        executor.start_polling(dp, on_startup=on_startup, on_shutdown=on_shutdown)
+    else:
+        # Webhook and/or several workers: this process only receives updates and routes them by chat
+        ingress.serve(dp, on_startup, on_shutdown)
@@ -1,24 +1,203 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 import faiss
 import numpy as np
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict
+from fastapi import FastAPI, HTTPException, Request, Header, Query, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from pydantic import BaseModel, Field
+from typing import List, Dict, Optional, Tuple, AsyncIterator, Callable, Any
+
+from index_metrics import IndexCollector, observe_search
+from micro_batcher import MicroBatcher
+from vector_store import KEY_PATTERN, IndexSpec, VectorStore
 
 app = FastAPI()
 
-# Storage for Faiss indices
-index_store: Dict[str, faiss.IndexFlatIP] = {}
+# Number of threads running Faiss calls off the event loop (Faiss releases the GIL)
+SEARCH_THREADS = int(os.getenv("FAISS_SEARCH_THREADS", str(os.cpu_count() or 4)))
+executor = ThreadPoolExecutor(max_workers=SEARCH_THREADS, thread_name_prefix="faiss")
+
+# Number of vectors normalized and added per step of a binary upload
+INGEST_CHUNK_ROWS = int(os.getenv("FAISS_INGEST_CHUNK_ROWS", "16384"))
+
+# Directory holding index snapshots; loaded automatically on startup
+DATA_DIR = os.getenv("FAISS_DATA_DIR", "data")
+
+# Snapshots at least this large are memory-mapped read-only instead of read into RAM
+MMAP_MIN_BYTES = int(os.getenv("FAISS_MMAP_MIN_BYTES", str(256 * 1024 * 1024)))
+
+# Read replica mode: serve every snapshot in DATA_DIR memory-mapped and read-only,
+# reloading snapshots the primary rewrites. Replicas can run several uvicorn
+# workers (WEB_CONCURRENCY) that share the mapped pages through the page cache;
+# a writable primary must run a single worker, since its indexes live in process memory.
+REPLICA = os.getenv("FAISS_REPLICA", "0") == "1"
+# Seconds between checks for new snapshots in replica mode
+REPLICA_REFRESH = float(os.getenv("FAISS_REPLICA_REFRESH", "30"))
+
+# Faiss indexes with their specs, metadata, locks and aliases
+store = VectorStore(DATA_DIR, MMAP_MIN_BYTES)
+REGISTRY.register(IndexCollector(store))
+
+# Threads building new index versions for /rebuild, kept apart from the search pool
+REBUILD_THREADS = int(os.getenv("FAISS_REBUILD_THREADS", "1"))
+rebuild_executor = ThreadPoolExecutor(max_workers=REBUILD_THREADS, thread_name_prefix="faiss-rebuild")
+# OpenMP threads Faiss may use per rebuild (train/add), leaving the other cores to searches
+REBUILD_OMP_THREADS = int(os.getenv("FAISS_REBUILD_OMP_THREADS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Training sample per IVF inverted list when /rebuild trains a new version
+REBUILD_TRAIN_PER_LIST = int(os.getenv("FAISS_REBUILD_TRAIN_PER_LIST", "64"))
+
+# Last /rebuild job of each alias
+rebuilds: Dict[str, Dict[str, Any]] = {}
+
+# Opt-in coalescing of concurrent single-vector /search calls into batched searches
+MICROBATCH = os.getenv("FAISS_MICROBATCH", "0") == "1"
+MICROBATCH_MAX_BATCH = int(os.getenv("FAISS_MICROBATCH_MAX_BATCH", "64"))
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("FAISS_MICROBATCH_MAX_WAIT_MS", "2"))
+
+# Content types accepted by the binary ingestion route
+RAW_CONTENT_TYPE = "application/octet-stream"
+NPY_CONTENT_TYPES = ("application/x-npy", "application/npy")
+
+
+async def _run(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a blocking Faiss call in the shared thread pool without blocking the event loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
 
 
 class CreateIndexRequest(BaseModel):
     key: str        # Unique identifier for the index
     dimension: int  # Vector dimensionality
+    index: IndexSpec = Field(default_factory=IndexSpec)  # Index structure and build parameters
+
+
+class FilterCondition(BaseModel):
+    field: str                          # Filterable metadata field
+    eq: Optional[Any] = None            # Field equals this value
+    any_of: Optional[List[Any]] = None  # Field equals one of these values
+    gt: Optional[float] = None          # Field is greater than
+    gte: Optional[float] = None         # Field is greater than or equal to
+    lt: Optional[float] = None          # Field is less than
+    lte: Optional[float] = None         # Field is less than or equal to
 
 
 class SearchQuery(BaseModel):
     key: str         # Identifier of the index to search
     query: List[float]  # Query vector
-    k: int = 5         # Number of nearest neighbors to return (default: 5)
+    k: int = Field(5, gt=0)  # Number of nearest neighbors to return (default: 5)
+    nprobe: Optional[int] = None     # IVF indexes: number of inverted lists to visit
+    ef_search: Optional[int] = None  # HNSW indexes: beam width used while searching
+    fields: Optional[List[str]] = None  # Metadata fields to return per hit ("*" for all)
+    filters: List[FilterCondition] = []  # Conditions on filterable fields, combined with AND
+
+
+class SearchBatchQuery(BaseModel):
+    key: str                   # Identifier of the index to search
+    queries: List[List[float]]  # Query vectors
+    k: int = Field(5, gt=0)    # Number of nearest neighbors per query (default: 5)
+    nprobe: Optional[int] = None     # IVF indexes: number of inverted lists to visit
+    ef_search: Optional[int] = None  # HNSW indexes: beam width used while searching
+    fields: Optional[List[str]] = None  # Metadata fields to return per hit ("*" for all)
+    filters: List[FilterCondition] = []  # Conditions on filterable fields, combined with AND
+
+
+class UpsertRequest(BaseModel):
+    ids: List[int]               # Caller-supplied 64-bit vector IDs
+    vectors: List[List[float]]   # Vectors aligned with `ids`
+    metadata: Dict[str, List[Any]] = {}  # Field name -> values aligned with `ids`
+
+
+class RemoveRequest(BaseModel):
+    ids: List[int]  # IDs of the vectors to delete
+
+
+class AliasRequest(BaseModel):
+    version: str  # Index the alias should resolve to
+
+
+class RecallRequest(BaseModel):
+    k: int = Field(10, gt=0)         # Neighbors compared per query
+    sample: int = Field(100, gt=0)   # Stored vectors drawn as queries when `queries` is omitted
+    queries: Optional[List[List[float]]] = None  # Probe queries, e.g. logged user queries
+    nprobe: Optional[int] = None     # IVF indexes: number of inverted lists to visit
+    ef_search: Optional[int] = None  # HNSW indexes: beam width used while searching
+
+
+def _index_key(key: str) -> str:
+    """
+    Resolve an alias to the index version it points at.
+
+    Raises:
+    ------
+    HTTPException (404)
+        If no index or alias is registered under `key`
+    """
+    resolved = store.resolve(key)
+    if resolved not in store:
+        raise HTTPException(status_code=404, detail=f"Index with key '{key}' not found.")
+    return resolved
+
+
+def _require_writable(key: Optional[str] = None) -> None:
+    """
+    Raise HTTPException (409) if this is a read replica or index `key` is a
+    read-only memory-mapped snapshot.
+    """
+    if REPLICA:
+        raise HTTPException(status_code=409, detail="This Faiss service is a read-only replica.")
+    if key in store.read_only:
+        raise HTTPException(status_code=409, detail=f"Index '{key}' is memory-mapped and read-only.")
+
+
+async def _refresh_replica() -> None:
+    """
+    Reload snapshots rewritten by the primary, every REPLICA_REFRESH seconds.
+    """
+    while True:
+        await asyncio.sleep(REPLICA_REFRESH)
+        for key in store.changed_snapshots():
+            try:
+                await _run(store.load, key, True)
+            except (OSError, RuntimeError, ValueError, KeyError):
+                # Caught mid-write; the next check picks up the finished snapshot
+                continue
+        # Aliases go after snapshots, so they never point at a version not loaded yet
+        try:
+            await _run(store.load_aliases)
+        except (OSError, ValueError):
+            pass
+        for key in store.vanished_snapshots():
+            await _run(store.drop, key, False)
+
+
+@app.on_event("startup")
+async def load_snapshots() -> None:
+    """
+    Restore every index snapshot and the alias table found in DATA_DIR; replicas
+    memory-map all snapshots and start watching for new ones.
+    """
+    for key in store.snapshot_keys():
+        await _run(store.load, key, True if REPLICA else None)
+    await _run(store.load_aliases)
+    if REPLICA:
+        app.state.refresher = asyncio.create_task(_refresh_replica())
+
+
+def _require_trained(key: str) -> None:
+    """
+    Raise HTTPException (400) if index `key` still needs a /train call.
+    """
+    if not store[key].is_trained:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Index '{key}' must be trained via /train/{key} before adding vectors."
+        )
 
 
 @app.post("/create_index")
@@ -26,29 +205,163 @@ async def create_index(request: CreateIndexRequest):
     """
     Create a new Faiss index for cosine similarity search.
 
+    IVF-based index types (`ivf_flat`, `ivf_pq`) must be trained with
+    `/train/{key}` before vectors can be added. With `index.shards` > 1 the
+    vectors are split across that many sub-indexes searched in parallel.
+
     Parameters:
     ----------
     request : CreateIndexRequest
         key: Unique key for the index
         dimension: Dimensionality of vectors to be stored
+        index: Index type (flat, ivf_flat, hnsw, ivf_pq), shard count and build parameters
 
     Returns:
     -------
     dict
         message: Confirmation that index is created
         dimension: Dimensionality of the created index
+        type: Index type
+        is_trained: Whether vectors can be added right away
 
     Raises:
     ------
     HTTPException (400)
-        If an index with the given key already exists
+        If an index with the given key already exists or the parameters are invalid
+    HTTPException (409)
+        If this is a read replica
+    """
+    _require_writable()
+    try:
+        index = store.create(request.key, request.dimension, request.index)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "message": f"Index '{request.key}' created.",
+        "dimension": request.dimension,
+        "type": request.index.type,
+        "is_trained": index.is_trained,
+    }
+
+
+@app.post("/save/{key}")
+async def save(key: str):
+    """
+    Snapshot an index to `FAISS_DATA_DIR` with `faiss.write_index`, one file per shard.
+
+    The snapshot is restored automatically when the service starts, and read
+    replicas sharing the directory pick it up within FAISS_REPLICA_REFRESH seconds.
+
+    Parameters:
+    ----------
+    key : str
+        Identifier of the index
+
+    Returns:
+    -------
+    dict
+        message: Confirmation that the index is saved
+        bytes: Size of the index files
+
+    Raises:
+    ------
+    HTTPException (404)
+        If the specified index is not found
+    HTTPException (400)
+        If the key cannot be used as a file name
+    HTTPException (409)
+        If this is a read replica
     """
-    if request.key in index_store:
-        raise HTTPException(status_code=400, detail=f"Index with key '{request.key}' already exists.")
+    key = _index_key(key)
+    _require_writable()
+    if not KEY_PATTERN.match(key):
+        raise HTTPException(status_code=400, detail=f"Index key '{key}' is not a valid file name.")
 
-    index = faiss.IndexFlatIP(request.dimension)
-    index_store[request.key] = index
-    return {"message": f"Index '{request.key}' created.", "dimension": request.dimension}
+    size = await _run(store.save, key)
+    return {"message": f"Index '{key}' saved.", "bytes": size}
+
+
+def _vector_matrix(vectors: Any, dimension: int, noun: str = "Vector") -> np.ndarray:
+    """
+    Convert a JSON list of vectors into an (n, dimension) float32 matrix.
+
+    Parameters:
+    ----------
+    vectors : Any
+        Decoded JSON body or field
+    dimension : int
+        Expected number of components per vector
+    noun : str
+        What the vectors are, for the error message
+
+    Raises:
+    ------
+    HTTPException (400)
+        If `vectors` is not a non-empty list of numeric vectors of equal length,
+        or their dimensionality differs from `dimension`
+    """
+    try:
+        matrix = np.array(vectors, dtype='float32')
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Expected a list of numeric vectors of equal length.")
+    if matrix.ndim != 2 or matrix.shape[0] == 0:
+        raise HTTPException(status_code=400, detail="Expected a non-empty list of vectors.")
+    if matrix.shape[1] != dimension:
+        raise HTTPException(status_code=400, detail=f"{noun} dimensionality must be {dimension}.")
+    return matrix
+
+
+@app.post("/train/{key}")
+async def train(key: str, request: Request):
+    """
+    Train an index that learns its structure from data (IVF coarse centroids, PQ codebooks).
+
+    The body is either a JSON list of vectors, a raw little-endian float32 matrix
+    (`application/octet-stream`) or a `.npy` file (`application/x-npy`). A
+    representative sample of at least `nlist` vectors (ideally 30-256 per list)
+    should be sent.
+
+    Parameters:
+    ----------
+    key : str
+        Identifier of the index
+    request : Request
+        HTTP request whose body holds the training vectors
+
+    Returns:
+    -------
+    dict
+        message: Confirmation that the index is trained
+        trained_on: Number of training vectors
+
+    Raises:
+    ------
+    HTTPException (404)
+        If the specified index is not found
+    HTTPException (400)
+        If the index is already trained or the vectors are invalid
+    """
+    key = _index_key(key)
+    index = store[key]
+    _require_writable(key)
+    if index.is_trained:
+        raise HTTPException(status_code=400, detail=f"Index '{key}' is already trained.")
+
+    content_type = request.headers.get("content-type", RAW_CONTENT_TYPE).split(";")[0].strip()
+    if content_type == "application/json":
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body is not valid JSON.")
+        data = _vector_matrix(body, index.d)
+    else:
+        data = _decode_matrix(await request.body(), content_type, index.d)
+
+    try:
+        await _run(store.train, key, data)
+    except RuntimeError as e:
+        raise HTTPException(status_code=400, detail=f"Training failed: {e}")
+    return {"message": f"Index '{key}' trained.", "trained_on": len(data)}
 
 
 @app.post("/add_vectors/{key}")
@@ -75,18 +388,365 @@ async def add_vectors(key: str, vectors: List[List[float]]):
     HTTPException (400)
         If vector dimensionality does not match the index
     """
-    if key not in index_store:
-        raise HTTPException(status_code=404, detail=f"Index with key '{key}' not found.")
+    key = _index_key(key)
+    index = store[key]
+    _require_writable(key)
+    _require_trained(key)
+    data = _vector_matrix(vectors, index.d)
+    await _run(store.add, key, data)
+    return {"message": f"{len(vectors)} vectors added to index '{key}'."}
+
+
+async def _read_npy_header(stream: AsyncIterator[bytes]) -> Tuple[tuple, bytes]:
+    """
+    Consume the `.npy` header from the beginning of a byte stream.
+
+    Parameters:
+    ----------
+    stream : AsyncIterator[bytes]
+        Request body stream positioned at the start of the `.npy` file
+
+    Returns:
+    -------
+    tuple
+        (shape, leftover) where leftover holds body bytes already read past the header
+
+    Raises:
+    ------
+    HTTPException (400)
+        If the header is malformed or the array is not a C-ordered float32 matrix
+    """
+    prefix = bytearray()
+    header_end = None
+    async for piece in stream:
+        prefix += piece
+        if len(prefix) >= 10 and header_end is None:
+            if bytes(prefix[:6]) != b"\x93NUMPY":
+                raise HTTPException(status_code=400, detail="Payload is not a .npy file.")
+            major = prefix[6]
+            size_len = 2 if major == 1 else 4
+            if len(prefix) >= 8 + size_len:
+                header_len = int.from_bytes(prefix[8:8 + size_len], "little")
+                header_end = 8 + size_len + header_len
+        if header_end is not None and len(prefix) >= header_end:
+            break
+    if header_end is None or len(prefix) < header_end:
+        raise HTTPException(status_code=400, detail="Truncated .npy header.")
 
-    index = index_store[key]
-    data = np.array(vectors, dtype='float32')
+    header = io.BytesIO(bytes(prefix[:header_end]))
+    version = np.lib.format.read_magic(header)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+    if dtype != np.dtype("<f4") or fortran_order or len(shape) != 2:
+        raise HTTPException(
+            status_code=400,
+            detail="Expected a C-ordered little-endian float32 matrix of shape (count, dimension)."
+        )
+    return shape, bytes(prefix[header_end:])
 
-    if data.shape[1] != index.d:
+
+async def _add_block(key: str, buffer: bytearray, nbytes: int, dimension: int) -> int:
+    """
+    Normalize and add the vectors held in the first `nbytes` of `buffer`.
+
+    The buffer is reinterpreted in place with `np.frombuffer`, so no per-element
+    Python objects are created and the data is copied only once (from the socket).
+
+    Returns:
+    -------
+    int
+        Number of vectors added
+    """
+    data = np.frombuffer(buffer, dtype="<f4", count=nbytes // 4).reshape(-1, dimension)
+    await _run(store.add, key, data)
+    return data.shape[0]
+
+
+@app.post("/add_vectors_binary/{key}")
+async def add_vectors_binary(
+    key: str,
+    request: Request,
+    x_dimension: Optional[int] = Header(None),
+    x_count: Optional[int] = Header(None),
+):
+    """
+    Bulk-add vectors sent as a raw float32 buffer.
+
+    The body is either a raw little-endian float32 matrix
+    (`Content-Type: application/octet-stream`, row-major) or a `.npy` file
+    (`Content-Type: application/x-npy`). It is streamed in blocks of
+    `FAISS_INGEST_CHUNK_ROWS` vectors straight into the index, so the whole
+    payload is never held in memory.
+
+    Parameters:
+    ----------
+    key : str
+        Identifier of the index
+    request : Request
+        Raw HTTP request whose body holds the vectors
+    x_dimension : int, optional
+        `X-Dimension` header; checked against the index dimensionality
+    x_count : int, optional
+        `X-Count` header; expected number of vectors in the payload
+
+    Returns:
+    -------
+    dict
+        message: Number of vectors added and index key
+        added: Number of vectors added
+        seconds: Wall time spent on ingestion
+        vectors_per_second: Ingestion throughput
+
+    Raises:
+    ------
+    HTTPException (404)
+        If the specified index is not found
+    HTTPException (400)
+        If the payload does not match the index dimensionality or declared count
+    HTTPException (415)
+        If the content type is not supported
+    """
+    key = _index_key(key)
+    index = store[key]
+    _require_writable(key)
+    _require_trained(key)
+    content_type = request.headers.get("content-type", RAW_CONTENT_TYPE).split(";")[0].strip()
+    if content_type not in (RAW_CONTENT_TYPE,) + NPY_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type '{content_type}'.")
+
+    started = time.perf_counter()
+    stream = request.stream()
+    leftover = b""
+    dimension = x_dimension or index.d
+    if content_type in NPY_CONTENT_TYPES:
+        (count, dimension), leftover = await _read_npy_header(stream)
+        x_count = x_count or count
+
+    if dimension != index.d:
         raise HTTPException(status_code=400, detail=f"Vector dimensionality must be {index.d}.")
 
-    faiss.normalize_L2(data)
-    index.add(data)
-    return {"message": f"{len(vectors)} vectors added to index '{key}'."}
+    row_bytes = dimension * 4
+    content_length = request.headers.get("content-length")
+    if content_type == RAW_CONTENT_TYPE and content_length is not None:
+        if int(content_length) % row_bytes:
+            raise HTTPException(
+                status_code=400, detail=f"Payload size must be a multiple of {row_bytes} bytes."
+            )
+        if x_count is not None and int(content_length) != x_count * row_bytes:
+            raise HTTPException(status_code=400, detail=f"Payload does not hold {x_count} vectors.")
+
+    buffer = bytearray(INGEST_CHUNK_ROWS * row_bytes)
+    filled = 0
+    added = 0
+
+    async def pieces() -> AsyncIterator[bytes]:
+        if leftover:
+            yield leftover
+        async for piece in stream:
+            yield piece
+
+    async for piece in pieces():
+        view = memoryview(piece)
+        while view:
+            take = min(len(view), len(buffer) - filled)
+            buffer[filled:filled + take] = view[:take]
+            filled += take
+            view = view[take:]
+            if filled == len(buffer):
+                added += await _add_block(key, buffer, filled, dimension)
+                filled = 0
+
+    if filled % row_bytes:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Payload ended mid-vector; {added} complete vectors were added to index '{key}'."
+        )
+    if filled:
+        added += await _add_block(key, buffer, filled, dimension)
+    if x_count is not None and added != x_count:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Expected {x_count} vectors, received {added}; they were added to index '{key}'."
+        )
+
+    elapsed = time.perf_counter() - started
+    return {
+        "message": f"{added} vectors added to index '{key}'.",
+        "added": added,
+        "seconds": elapsed,
+        "vectors_per_second": added / elapsed if elapsed > 0 else None,
+    }
+
+
+def _search_response(
+    distances: np.ndarray,
+    indices: np.ndarray,
+    metadata: Optional[List[List[Optional[Dict[str, Any]]]]] = None,
+) -> Dict[str, Any]:
+    """
+    Shape search results into the JSON returned by the search routes.
+    """
+    response = {
+        'cosine_similarities': distances.tolist(),
+        'indices': indices.tolist()
+    }
+    if metadata is not None:
+        response['metadata'] = metadata
+    return response
+
+
+def _require_id_map(key: str) -> None:
+    """
+    Raise HTTPException (400) if index `key` was created without `id_map`.
+    """
+    if not store.specs[key].id_map:
+        raise HTTPException(
+            status_code=400, detail=f"Index '{key}' was created without id_map and has no stable IDs."
+        )
+
+
+@app.post("/upsert/{key}")
+async def upsert(key: str, request: UpsertRequest):
+    """
+    Insert or replace vectors with caller-supplied IDs, optionally with metadata.
+
+    Existing vectors with the same IDs are removed first, so the call also
+    updates tours in place. Only available for indexes created with `id_map`.
+
+    Parameters:
+    ----------
+    key : str
+        Identifier of the index
+    request : UpsertRequest
+        ids: 64-bit vector IDs
+        vectors: Vectors aligned with `ids`
+        metadata: Columnar metadata, field name -> values aligned with `ids`
+
+    Returns:
+    -------
+    dict
+        message: Number of vectors written and index key
+
+    Raises:
+    ------
+    HTTPException (404)
+        If the specified index is not found
+    HTTPException (400)
+        If the index has no id_map, the payload is malformed or the index
+        type cannot overwrite existing IDs
+    """
+    key = _index_key(key)
+    index = store[key]
+    _require_writable(key)
+    _require_id_map(key)
+    _require_trained(key)
+    if len(request.ids) != len(request.vectors):
+        raise HTTPException(status_code=400, detail="ids and vectors must have the same length.")
+    if not request.ids:
+        return {"message": f"0 vectors written to index '{key}'."}
+
+    data = _vector_matrix(request.vectors, index.d)
+    ids = np.array(request.ids, dtype='int64')
+    if len(np.unique(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="ids must be unique.")
+    for name, values in request.metadata.items():
+        if len(values) != len(ids):
+            raise HTTPException(status_code=400, detail=f"Metadata field '{name}' must have {len(ids)} values.")
+
+    try:
+        await _run(store.upsert, key, ids, data, request.metadata)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"{len(ids)} vectors written to index '{key}'."}
+
+
+@app.post("/remove_ids/{key}")
+async def remove_ids(key: str, request: RemoveRequest):
+    """
+    Delete vectors and their metadata by ID.
+
+    Parameters:
+    ----------
+    key : str
+        Identifier of the index
+    request : RemoveRequest
+        ids: IDs of the vectors to delete; unknown IDs are ignored
+
+    Returns:
+    -------
+    dict
+        message: Confirmation
+        removed: Number of vectors actually removed
+
+    Raises:
+    ------
+    HTTPException (404)
+        If the specified index is not found
+    HTTPException (400)
+        If the index has no id_map or its type does not support removal (HNSW)
+    """
+    key = _index_key(key)
+    _require_writable(key)
+    _require_id_map(key)
+    try:
+        removed = await _run(store.remove, key, np.array(request.ids, dtype='int64'))
+    except RuntimeError:
+        raise HTTPException(
+            status_code=400, detail=f"Index type '{store.specs[key].type}' does not support removal."
+        )
+    return {"message": f"{removed} vectors removed from index '{key}'.", "removed": removed}
+
+
+async def _filtered_search(
+    key: str,
+    queries: np.ndarray,
+    k: int,
+    nprobe: Optional[int],
+    ef_search: Optional[int],
+    fields: Optional[List[str]],
+    filters: List[FilterCondition],
+    name: Optional[str] = None,
+) -> Tuple[np.ndarray, np.ndarray, Optional[List[List[Optional[Dict[str, Any]]]]]]:
+    """
+    Run `store.search` in the thread pool, mapping filter errors to HTTP 400 and
+    recording its latency under `name`, the alias or key the caller used.
+    """
+    conditions = [dict(condition) for condition in filters]
+    started = time.perf_counter()
+    try:
+        result = await _run(store.search, key, queries, k, nprobe, ef_search, fields, conditions)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    observe_search(name or key, k, len(queries), time.perf_counter() - started)
+    return result
+
+
+# Micro-batchers keyed by index key; each groups its queries by search
+# parameters, since only queries sharing all of them can be answered by one call,
+# and by the alias or key the caller used, which labels the latency metrics
+batchers: Dict[str, MicroBatcher] = {}
+
+
+def _batcher(key: str) -> MicroBatcher:
+    """
+    Return the micro-batcher of index version `key`, creating it if needed.
+
+    Idle batchers of indexes dropped since (retired versions, vanished
+    replica snapshots) are discarded first.
+    """
+    for gone in [name for name, batcher in batchers.items() if name not in store and batcher.idle]:
+        del batchers[gone]
+    batcher = batchers.get(key)
+    if batcher is None:
+        async def search_fn(queries: np.ndarray, group: tuple):
+            name, k, nprobe, ef_search, fields = group
+            return await _filtered_search(
+                key, queries, k, nprobe, ef_search, list(fields) if fields is not None else None, [], name
+            )
+        batcher = batchers[key] = MicroBatcher(key, search_fn, MICROBATCH_MAX_BATCH, MICROBATCH_MAX_WAIT_MS)
+    return batcher
 
 
 @app.post("/search")
@@ -94,18 +754,26 @@ async def search(query: SearchQuery):
     """
     Search for nearest neighbors in a Faiss index using cosine similarity.
 
+    With `FAISS_MICROBATCH=1`, unfiltered queries arriving concurrently with the
+    same parameters are coalesced into one batched search.
+
     Parameters:
     ----------
     query : SearchQuery
         key: Identifier of the index to search
         query: Query vector
         k: Number of nearest neighbors to retrieve
+        nprobe: IVF indexes only, number of inverted lists to visit
+        ef_search: HNSW indexes only, search beam width
+        fields: Metadata fields to return per hit ("*" for all)
+        filters: Conditions on filterable metadata fields, combined with AND
 
     Returns:
     -------
     dict
         cosine_similarities: List of similarity scores
-        indices: List of indices of nearest vectors
+        indices: List of indices of nearest vectors (caller-supplied IDs for id_map indexes)
+        metadata: Metadata dict of each hit, if fields were requested
 
     Raises:
     ------
@@ -114,23 +782,522 @@ async def search(query: SearchQuery):
     HTTPException (400)
         If query vector dimensionality does not match the index
     """
-    if query.key not in index_store:
-        raise HTTPException(status_code=404, detail=f"Index with key '{query.key}' not found.")
-
-    index = index_store[query.key]
+    key = _index_key(query.key)
+    index = store[key]
     query_vector = np.array(query.query, dtype='float32').reshape(1, -1)
 
     if query_vector.shape[1] != index.d:
         raise HTTPException(status_code=400, detail=f"Query vector dimensionality must be {index.d}.")
 
-    faiss.normalize_L2(query_vector)
-    distances, indices = index.search(query_vector, query.k)
+    if MICROBATCH and not query.filters:
+        fields = tuple(query.fields) if query.fields is not None else None
+        group = (query.key, query.k, query.nprobe, query.ef_search, fields)
+        result = await _batcher(key).submit(query_vector, group)
+    else:
+        result = await _filtered_search(
+            key, query_vector, query.k, query.nprobe, query.ef_search, query.fields, query.filters, query.key
+        )
+    return _search_response(*result)
+
+
+def _decode_matrix(body: bytes, content_type: str, dimension: int) -> np.ndarray:
+    """
+    Decode a binary request body into a writable (n, dimension) float32 matrix.
+
+    Parameters:
+    ----------
+    body : bytes
+        Raw little-endian float32 matrix or `.npy` file contents
+    content_type : str
+        `application/octet-stream` or one of the `.npy` content types
+    dimension : int
+        Expected number of columns
+
+    Raises:
+    ------
+    HTTPException (400)
+        If the body cannot be interpreted as a float32 matrix of the expected width
+    HTTPException (415)
+        If the content type is not supported
+    """
+    if content_type in NPY_CONTENT_TYPES:
+        try:
+            matrix = np.load(io.BytesIO(body), allow_pickle=False)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid .npy payload: {e}")
+        matrix = np.ascontiguousarray(matrix, dtype="float32")
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+    elif content_type == RAW_CONTENT_TYPE:
+        if len(body) % (dimension * 4):
+            raise HTTPException(
+                status_code=400, detail=f"Payload size must be a multiple of {dimension * 4} bytes."
+            )
+        matrix = np.frombuffer(bytearray(body), dtype="<f4").reshape(-1, dimension)
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type '{content_type}'.")
+
+    if matrix.ndim != 2 or matrix.shape[1] != dimension:
+        raise HTTPException(status_code=400, detail=f"Query vector dimensionality must be {dimension}.")
+    return matrix
+
+
+@app.post("/search_batch")
+async def search_batch(query: SearchBatchQuery):
+    """
+    Search for nearest neighbors of several query vectors in one Faiss call.
+
+    Parameters:
+    ----------
+    query : SearchBatchQuery
+        key: Identifier of the index to search
+        queries: Query vectors
+        k: Number of nearest neighbors to retrieve per query
+        nprobe: IVF indexes only, number of inverted lists to visit
+        ef_search: HNSW indexes only, search beam width
+        fields: Metadata fields to return per hit ("*" for all)
+        filters: Conditions on filterable metadata fields, combined with AND
+
+    Returns:
+    -------
+    dict
+        cosine_similarities: One list of similarity scores per query
+        indices: One list of IDs of nearest vectors per query
+        metadata: One list of metadata dicts per query, if fields were requested
+
+    Raises:
+    ------
+    HTTPException (404)
+        If the specified index is not found
+    HTTPException (400)
+        If query vector dimensionality does not match the index
+    """
+    key = _index_key(query.key)
+    index = store[key]
+    if not query.queries:
+        return {'cosine_similarities': [], 'indices': []}
+
+    queries = _vector_matrix(query.queries, index.d, "Query vector")
+    result = await _filtered_search(
+        key, queries, query.k, query.nprobe, query.ef_search, query.fields, query.filters, query.key
+    )
+    return _search_response(*result)
+
+
+@app.post("/search_batch/{key}")
+async def search_batch_binary(
+    key: str,
+    request: Request,
+    k: int = Query(5, gt=0),
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    fields: Optional[List[str]] = Query(None),
+    filters: Optional[str] = None,
+):
+    """
+    Batched search with queries sent as a binary float32 matrix.
+
+    The body is a raw row-major little-endian float32 matrix
+    (`Content-Type: application/octet-stream`) or a `.npy` file
+    (`Content-Type: application/x-npy`).
+
+    Parameters:
+    ----------
+    key : str
+        Identifier of the index to search
+    request : Request
+        Raw HTTP request whose body holds the query matrix
+    k : int
+        Number of nearest neighbors to retrieve per query (query parameter)
+    nprobe : int, optional
+        IVF indexes: number of inverted lists to visit (query parameter)
+    ef_search : int, optional
+        HNSW indexes: beam width used while searching (query parameter)
+    fields : List[str], optional
+        Metadata fields to return per hit, "*" for all (repeated query parameter)
+    filters : str, optional
+        JSON-encoded list of filter conditions (query parameter)
+
+    Returns:
+    -------
+    dict
+        cosine_similarities: One list of similarity scores per query
+        indices: One list of IDs of nearest vectors per query
+        metadata: One list of metadata dicts per query, if fields were requested
+
+    Raises:
+    ------
+    HTTPException (404)
+        If the specified index is not found
+    HTTPException (400)
+        If the payload does not match the index dimensionality
+    HTTPException (415)
+        If the content type is not supported
+    """
+    name = key
+    key = _index_key(name)
+    index = store[key]
+    content_type = request.headers.get("content-type", RAW_CONTENT_TYPE).split(";")[0].strip()
+    queries = _decode_matrix(await request.body(), content_type, index.d)
+    if not len(queries):
+        return {'cosine_similarities': [], 'indices': []}
+
+    try:
+        conditions = [FilterCondition(**c) for c in json.loads(filters)] if filters else []
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filters: {e}")
+    result = await _filtered_search(key, queries, k, nprobe, ef_search, fields, conditions, name)
+    return _search_response(*result)
+
+
+def _open_matrix(path: str, content_type: str, dimension: int) -> np.ndarray:
+    """
+    Memory-map a staged upload as a read-only (n, dimension) float32 matrix.
+
+    Raises:
+    ------
+    HTTPException (400)
+        If the file is empty or not a float32 matrix of the expected width
+    """
+    size = os.path.getsize(path)
+    if content_type in NPY_CONTENT_TYPES:
+        try:
+            matrix = np.load(path, mmap_mode="r", allow_pickle=False)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid .npy payload: {e}")
+        if matrix.dtype != np.dtype("<f4") or matrix.ndim != 2 or not matrix.flags.c_contiguous:
+            raise HTTPException(
+                status_code=400,
+                detail="Expected a C-ordered little-endian float32 matrix of shape (count, dimension)."
+            )
+    else:
+        if not size or size % (dimension * 4):
+            raise HTTPException(
+                status_code=400, detail=f"Payload size must be a positive multiple of {dimension * 4} bytes."
+            )
+        matrix = np.memmap(path, dtype="<f4", mode="r").reshape(-1, dimension)
+    if matrix.shape[1] != dimension:
+        raise HTTPException(status_code=400, detail=f"Vector dimensionality must be {dimension}.")
+    if not len(matrix):
+        raise HTTPException(status_code=400, detail="Payload holds no vectors.")
+    return matrix
+
+
+def _build_version(
+    alias: str, version: str, vectors: np.ndarray, path: str, train_size: Optional[int], job: Dict[str, Any]
+) -> None:
+    """
+    Train if needed, fill, save and swap in a new index version; runs on the rebuild pool.
+
+    Searches keep hitting the version the alias points at until the swap, and
+    never wait on this build: the new version has its own lock.
+    """
+    # Per-thread OpenMP setting: caps this build without touching search threads
+    faiss.omp_set_num_threads(REBUILD_OMP_THREADS)
+    started = time.perf_counter()
+    job["state"] = "building"
+    try:
+        if not store[version].is_trained:
+            size = min(len(vectors), train_size or REBUILD_TRAIN_PER_LIST * store.specs[version].nlist)
+            rows = np.sort(np.random.default_rng(0).choice(len(vectors), size, replace=False))
+            store.train(version, np.array(vectors[rows], dtype="float32"))
+        for start in range(0, len(vectors), INGEST_CHUNK_ROWS):
+            store.add(version, np.array(vectors[start:start + INGEST_CHUNK_ROWS], dtype="float32"))
+            job["added"] = min(len(vectors), start + INGEST_CHUNK_ROWS)
+        store.save(version)
+        retired = store.swap(alias, version)
+        job.update(state="done", retired=retired)
+    except Exception as e:
+        # Whatever failed, the alias still points at the old version; discard the partial one
+        store.drop(version)
+        job.update(state="failed", error=str(e))
+    finally:
+        job["seconds"] = time.perf_counter() - started
+        os.remove(path)
+
+
+async def _stage_rebuild(
+    alias: str, request: Request, index: Optional[str], dimension: Optional[int]
+) -> Tuple[str, np.ndarray, str]:
+    """
+    Create the next version of `alias` and stage the uploaded vectors for it.
+
+    Returns:
+    -------
+    Tuple[str, np.ndarray, str]
+        Key of the new, empty version, the memory-mapped vectors and the staged file
+    """
+    content_type = request.headers.get("content-type", RAW_CONTENT_TYPE).split(";")[0].strip()
+    if content_type not in (RAW_CONTENT_TYPE,) + NPY_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type '{content_type}'.")
+
+    current = store.resolve(alias)
+    try:
+        spec = IndexSpec(**json.loads(index)) if index else store.specs.get(current, IndexSpec())
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid index spec: {e}")
+    dimension = dimension or (store[current].d if current in store else None)
+    if dimension is None:
+        raise HTTPException(status_code=400, detail=f"'{alias}' is a new alias; pass its dimension.")
+
+    version = store.next_version(alias)
+    try:
+        store.create(version, dimension, spec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    os.makedirs(DATA_DIR, exist_ok=True)
+    staged = tempfile.NamedTemporaryFile(dir=DATA_DIR, prefix=f".{version}.", suffix=".upload", delete=False)
+    try:
+        with staged:
+            async for piece in request.stream():
+                staged.write(piece)
+        vectors = _open_matrix(staged.name, content_type, dimension)
+    except BaseException:
+        store.drop(version)
+        os.remove(staged.name)
+        raise
+    return version, vectors, staged.name
+
+
+@app.post("/rebuild/{alias}", status_code=202)
+async def rebuild(
+    alias: str,
+    request: Request,
+    index: Optional[str] = None,
+    dimension: Optional[int] = None,
+    train_size: Optional[int] = None,
+):
+    """
+    Build a new version of an index in the background and swap the alias to it.
+
+    The body holds the full set of vectors as a raw little-endian float32
+    matrix (`application/octet-stream`) or a `.npy` file (`application/x-npy`).
+    It is staged to a file in `FAISS_DATA_DIR`, then a rebuild thread trains
+    the new version `<alias>.v<n>` on a random sample if needed, adds the
+    vectors, saves the snapshot and atomically points the alias at it. Searches
+    through the alias are served by the previous version until then, which is
+    kept for `/aliases/{alias}/rollback`. An existing index named `alias`
+    becomes the first previous version.
+
+    Parameters:
+    ----------
+    alias : str
+        Alias to rebuild; searches and other routes accept it in place of an index key
+    request : Request
+        Raw HTTP request whose body holds the vectors
+    index : str, optional
+        JSON-encoded IndexSpec of the new version (query parameter); defaults to the current version's
+    dimension : int, optional
+        Vector dimensionality (query parameter); defaults to the current version's
+    train_size : int, optional
+        Training sample size for IVF indexes (query parameter); defaults to
+        FAISS_REBUILD_TRAIN_PER_LIST vectors per inverted list
+
+    Returns:
+    -------
+    dict
+        message: Confirmation that the rebuild is queued
+        version: Key of the version being built
+        vectors: Number of vectors it will hold
+
+    Raises:
+    ------
+    HTTPException (400)
+        If the alias, spec or payload is invalid, or the dimension is unknown
+    HTTPException (409)
+        If this is a read replica or a rebuild of the alias is already running
+    HTTPException (415)
+        If the content type is not supported
+    """
+    _require_writable()
+    if not KEY_PATTERN.match(alias):
+        raise HTTPException(status_code=400, detail=f"Alias '{alias}' is not a valid file name.")
+    last = rebuilds.get(alias)
+    if last and last["state"] in ("uploading", "queued", "building"):
+        raise HTTPException(status_code=409, detail=f"A rebuild of '{alias}' is already running.")
+    # Claimed before the first await, so a concurrent rebuild of the alias gets 409
+    job = rebuilds[alias] = {"version": None, "state": "uploading", "vectors": 0, "added": 0, "error": None}
+    try:
+        version, vectors, path = await _stage_rebuild(alias, request, index, dimension)
+    except BaseException:
+        if last is None:
+            del rebuilds[alias]
+        else:
+            rebuilds[alias] = last
+        raise
+
+    job.update(version=version, state="queued", vectors=len(vectors))
+    asyncio.get_running_loop().run_in_executor(
+        rebuild_executor, _build_version, alias, version, vectors, path, train_size, job
+    )
+    return {"message": f"Rebuild of '{alias}' queued.", "version": version, "vectors": len(vectors)}
+
+
+@app.get("/rebuild/{alias}")
+async def rebuild_status(alias: str):
+    """
+    Report the last rebuild of an alias.
+
+    Returns:
+    -------
+    dict
+        version: Key of the version built
+        state: uploading, queued, building, done or failed
+        vectors: Number of vectors in the upload
+        added: Number of vectors added so far
+        error: Failure reason, if the rebuild failed
+        retired: Version dropped by the swap, if any
+        seconds: Build time, once finished
+
+    Raises:
+    ------
+    HTTPException (404)
+        If the alias was never rebuilt by this process
+    """
+    if alias not in rebuilds:
+        raise HTTPException(status_code=404, detail=f"No rebuild of '{alias}' found.")
+    return rebuilds[alias]
+
+
+@app.get("/aliases")
+async def aliases():
+    """
+    List aliases with the version each resolves to and its rollback target.
+    """
     return {
-        'cosine_similarities': distances.tolist(),
-        'indices': indices.tolist()
+        alias: {"current": version, "previous": store.previous.get(alias)}
+        for alias, version in store.aliases.items()
     }
 
 
+@app.post("/aliases/{alias}")
+async def set_alias(alias: str, request: AliasRequest):
+    """
+    Atomically point an alias at an existing index version.
+
+    The version the alias pointed at is kept for rollback; the one before it is
+    dropped with its snapshot. Save the version first for the swap to survive
+    a restart.
+
+    Parameters:
+    ----------
+    alias : str
+        Alias to create or move
+    request : AliasRequest
+        version: Key of the index the alias should resolve to
+
+    Returns:
+    -------
+    dict
+        current: Version the alias now resolves to
+        previous: Rollback target
+        retired: Version dropped by the swap, if any
+
+    Raises:
+    ------
+    HTTPException (400)
+        If the alias is invalid, or the version does not exist or is an alias itself
+    HTTPException (409)
+        If this is a read replica
+    """
+    _require_writable()
+    try:
+        retired = await _run(store.swap, alias, request.version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"current": store.resolve(alias), "previous": store.previous.get(alias), "retired": retired}
+
+
+@app.post("/aliases/{alias}/rollback")
+async def rollback_alias(alias: str):
+    """
+    Point an alias back at its previous version; a second rollback undoes the first.
+
+    Returns:
+    -------
+    dict
+        current: Version the alias now resolves to
+        previous: Version it resolved to before the rollback
+
+    Raises:
+    ------
+    HTTPException (400)
+        If the alias has no previous version
+    HTTPException (409)
+        If this is a read replica
+    """
+    _require_writable()
+    try:
+        current = await _run(store.rollback, alias)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"current": current, "previous": store.previous.get(alias)}
+
+
+@app.get("/stats")
+async def stats():
+    """
+    Report every index: type, dimensionality, vector count, estimated memory,
+    shard count, aliases, add/search counters, queries per second over the
+    last minute and the last recall probe.
+    """
+    return {"replica": REPLICA, "indexes": store.stats()}
+
+
+@app.post("/recall/{key}")
+async def recall(key: str, request: RecallRequest):
+    """
+    Estimate recall@k of an index against exact (flat) search.
+
+    The probe queries are searched with the given `nprobe`/`ef_search`, and
+    the hits are compared with the exact nearest neighbors from a blockwise
+    brute-force scan of the stored vectors. Runs on the search thread pool
+    and scans the whole index, so keep `sample` modest on large indexes. The
+    result is also exported as the `faiss_index_recall` metric.
+
+    Parameters:
+    ----------
+    key : str
+        Identifier or alias of the index
+    request : RecallRequest
+        k: Neighbors compared per query
+        sample: Stored vectors drawn as queries when `queries` is omitted
+        queries: Probe query vectors; real user queries give the most faithful estimate
+        nprobe: IVF indexes only, number of inverted lists to visit
+        ef_search: HNSW indexes only, search beam width
+
+    Returns:
+    -------
+    dict
+        recall: Share of the exact k nearest neighbors the index returned
+        k, queries, nprobe, ef_search: Probe settings
+        seconds: Probe duration
+
+    Raises:
+    ------
+    HTTPException (404)
+        If the specified index is not found
+    HTTPException (400)
+        If the index is empty, or the queries are malformed or do not match its dimensionality
+    """
+    key = _index_key(key)
+    queries = _vector_matrix(request.queries, store[key].d, "Query vector") if request.queries is not None else None
+    try:
+        return await _run(store.recall, key, request.k, queries, request.sample, request.nprobe, request.ef_search)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Expose Prometheus metrics: per-index size, memory and counters, recall of
+    the last probe, search latency by index, k and batch size, and micro-batch
+    size and queue wait histograms.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=5000)
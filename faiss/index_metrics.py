@@ -0,0 +1,75 @@
+from typing import Iterator, Sequence
+
+from prometheus_client import Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+
+from vector_store import VectorStore
+
+# Upper bounds used as `k` and `batch` label values; keeps label cardinality bounded
+SIZE_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 1024)
+
+# Latency of one Faiss search call, thread pool wait included
+SEARCH_LATENCY = Histogram(
+    "faiss_search_seconds",
+    "Latency of one search call",
+    ["index", "k", "batch"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+def size_label(value: int, bounds: Sequence[int] = SIZE_BOUNDS) -> str:
+    """
+    Return the smallest bound not below `value`, as a label value ("+Inf" above the largest).
+    """
+    for bound in bounds:
+        if value <= bound:
+            return str(bound)
+    return "+Inf"
+
+
+def observe_search(index: str, k: int, batch: int, seconds: float) -> None:
+    """
+    Record the latency of one search of `batch` queries for `k` neighbors each.
+    """
+    SEARCH_LATENCY.labels(index, size_label(k), size_label(batch)).observe(seconds)
+
+
+class IndexCollector:
+    """
+    Prometheus collector reporting `VectorStore.stats()` at scrape time.
+
+    Sizes and counters are read when Prometheus scrapes, so searches and adds
+    pay nothing extra for them. Register it once with
+    `prometheus_client.REGISTRY.register(IndexCollector(store))`.
+    """
+
+    def __init__(self, store: VectorStore) -> None:
+        self.store = store
+
+    def collect(self) -> Iterator[Metric]:
+        info = GaugeMetricFamily(
+            "faiss_index_info", "Index structure", labels=["index", "type", "dimension", "shards", "read_only"]
+        )
+        vectors = GaugeMetricFamily("faiss_index_vectors", "Vectors stored", labels=["index"])
+        memory = GaugeMetricFamily("faiss_index_memory_bytes", "Estimated memory held by the index", labels=["index"])
+        recall = GaugeMetricFamily("faiss_index_recall", "Recall@k measured by the last recall probe", labels=["index", "k"])
+        counters = {
+            name: CounterMetricFamily(f"faiss_index_{name}", description, labels=["index"])
+            for name, description in (
+                ("searches", "Search calls"),
+                ("queries", "Query vectors searched"),
+                ("added", "Vectors added"),
+                ("removed", "Vectors removed"),
+            )
+        }
+        for key, stats in self.store.stats().items():
+            info.add_metric(
+                [key, stats["type"], str(stats["dimension"]), str(stats["shards"]), str(stats["read_only"]).lower()], 1
+            )
+            vectors.add_metric([key], stats["vectors"])
+            memory.add_metric([key], stats["memory_bytes"])
+            if stats["recall"] and stats["recall"]["recall"] is not None:
+                recall.add_metric([key, str(stats["recall"]["k"])], stats["recall"]["recall"])
+            for name, family in counters.items():
+                family.add_metric([key], stats[name])
+        yield from (info, vectors, memory, recall, *counters.values())
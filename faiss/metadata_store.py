@@ -0,0 +1,251 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+class MetadataStore:
+    """
+    Columnar metadata attached to the vectors of one index.
+
+    Values are kept as one list per field, aligned on a dense row number, and
+    a dict maps external vector IDs to rows. Compared to a dict per vector this
+    avoids repeating field names for every row, and whole columns can be turned
+    into numpy arrays for filtering.
+
+    Fields listed as filterable get precomputed bitsets over rows (one per
+    distinct value) for equality filters and a float column for range filters.
+    Both are rebuilt lazily after the first filtered search following a write.
+
+    Writes are not thread-safe: callers hold the index write lock. Concurrent
+    filtered reads may build the same cache twice, which is harmless.
+    """
+
+    def __init__(self, filterable: Optional[List[str]] = None) -> None:
+        """
+        Initialize an empty store.
+
+        Parameters:
+        ----------
+        filterable : List[str], optional
+            Fields that may be used in search filters
+
+        Attributes:
+        ----------
+        ids : List[int]
+            External ID stored in each row
+        rows : Dict[int, int]
+            Row number of each external ID
+        columns : Dict[str, List[Any]]
+            Field values, one list per field aligned with `ids`
+        filterable : List[str]
+            Fields that may be used in search filters
+        """
+        self.ids: List[int] = []
+        self.rows: Dict[int, int] = {}
+        self.columns: Dict[str, List[Any]] = {}
+        self.filterable: List[str] = list(filterable or [])
+        self._id_array: Optional[np.ndarray] = None
+        self._bitsets: Dict[str, Dict[Any, np.ndarray]] = {}
+        self._numeric: Dict[str, np.ndarray] = {}
+
+    def _invalidate(self) -> None:
+        """
+        Drop the filter caches after a write.
+        """
+        self._id_array = None
+        self._bitsets = {}
+        self._numeric = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def upsert(self, ids: List[int], columns: Dict[str, List[Any]]) -> None:
+        """
+        Insert or overwrite the given fields for `ids`.
+
+        Parameters:
+        ----------
+        ids : List[int]
+            External vector IDs
+        columns : Dict[str, List[Any]]
+            Field name -> values aligned with `ids`; fields not listed are left
+            unchanged for existing rows and set to None for new ones
+
+        Raises:
+        ------
+        ValueError
+            If a column length differs from the number of IDs
+        """
+        for name, values in columns.items():
+            if len(values) != len(ids):
+                raise ValueError(f"Metadata field '{name}' has {len(values)} values for {len(ids)} IDs.")
+            if name not in self.columns:
+                self.columns[name] = [None] * len(self.ids)
+        self._invalidate()
+
+        for position, vid in enumerate(ids):
+            row = self.rows.get(vid)
+            if row is None:
+                row = len(self.ids)
+                self.rows[vid] = row
+                self.ids.append(vid)
+                for column in self.columns.values():
+                    column.append(None)
+            for name, values in columns.items():
+                self.columns[name][row] = values[position]
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """
+        Drop the rows of `ids`, moving the last row into each freed slot.
+        """
+        self._invalidate()
+        for vid in ids:
+            row = self.rows.pop(vid, None)
+            if row is None:
+                continue
+            last = len(self.ids) - 1
+            if row != last:
+                moved = self.ids[last]
+                self.ids[row] = moved
+                self.rows[moved] = row
+                for column in self.columns.values():
+                    column[row] = column[last]
+            self.ids.pop()
+            for column in self.columns.values():
+                column.pop()
+
+    def get(self, ids: Iterable[int], fields: Optional[List[str]] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Fetch metadata for `ids`.
+
+        Parameters:
+        ----------
+        ids : Iterable[int]
+            External vector IDs (-1, as returned by Faiss for missing hits, yields None)
+        fields : List[str], optional
+            Fields to return; all fields if omitted
+
+        Returns:
+        -------
+        List[Optional[dict]]
+            One dict per ID, or None for IDs without metadata
+        """
+        names = [name for name in (fields or self.columns) if name in self.columns]
+        result = []
+        for vid in ids:
+            row = self.rows.get(int(vid))
+            if row is None:
+                result.append(None)
+            else:
+                result.append({name: self.columns[name][row] for name in names})
+        return result
+
+    def _value_bitsets(self, field: str) -> Dict[Any, np.ndarray]:
+        """
+        Return (building if needed) the packed row bitset of every distinct value of `field`.
+        """
+        bitsets = self._bitsets.get(field)
+        if bitsets is None:
+            groups: Dict[Any, List[int]] = {}
+            for row, value in enumerate(self.columns.get(field, ())):
+                try:
+                    groups.setdefault(value, []).append(row)
+                except TypeError:
+                    continue  # Unhashable values (lists, dicts) never match equality filters
+            bitsets = {}
+            for value, rows in groups.items():
+                mask = np.zeros(len(self.ids), dtype=bool)
+                mask[rows] = True
+                bitsets[value] = np.packbits(mask)
+            self._bitsets[field] = bitsets
+        return bitsets
+
+    def _numeric_column(self, field: str) -> np.ndarray:
+        """
+        Return (building if needed) `field` as a float array, NaN where not numeric.
+        """
+        column = self._numeric.get(field)
+        if column is None:
+            values = self.columns.get(field, [None] * len(self.ids))
+            column = np.array(
+                [v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan for v in values],
+                dtype='float64'
+            )
+            self._numeric[field] = column
+        return column
+
+    def filter_ids(self, conditions: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Return the IDs whose metadata satisfies every condition.
+
+        Parameters:
+        ----------
+        conditions : List[dict]
+            Each dict has `field` and any of `eq`, `any_of` (equality, via
+            bitsets) and `gt`, `gte`, `lt`, `lte` (numeric range)
+
+        Returns:
+        -------
+        np.ndarray
+            Matching IDs as int64
+
+        Raises:
+        ------
+        ValueError
+            If a condition uses a field not declared filterable
+        """
+        n = len(self.ids)
+        selected = np.packbits(np.ones(n, dtype=bool))
+        empty = np.zeros_like(selected)
+        for condition in conditions:
+            field = condition["field"]
+            if field not in self.filterable:
+                raise ValueError(f"Field '{field}' is not filterable.")
+
+            values = list(condition.get("any_of") or [])
+            if condition.get("eq") is not None:
+                values.append(condition["eq"])
+            if values:
+                bitsets = self._value_bitsets(field)
+                matched = empty.copy()
+                for value in values:
+                    try:
+                        matched |= bitsets.get(value, empty)
+                    except TypeError:
+                        continue
+                selected &= matched
+
+            bounds = {op: condition.get(op) for op in ("gt", "gte", "lt", "lte")}
+            if any(bound is not None for bound in bounds.values()):
+                column = self._numeric_column(field)
+                mask = np.ones(n, dtype=bool)
+                if bounds["gt"] is not None:
+                    mask &= column > bounds["gt"]
+                if bounds["gte"] is not None:
+                    mask &= column >= bounds["gte"]
+                if bounds["lt"] is not None:
+                    mask &= column < bounds["lt"]
+                if bounds["lte"] is not None:
+                    mask &= column <= bounds["lte"]
+                selected &= np.packbits(mask)
+
+        if self._id_array is None:
+            self._id_array = np.array(self.ids, dtype='int64')
+        return self._id_array[np.flatnonzero(np.unpackbits(selected, count=n))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serialize the store to a JSON-compatible dict.
+        """
+        return {"ids": self.ids, "columns": self.columns}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], filterable: Optional[List[str]] = None) -> "MetadataStore":
+        """
+        Rebuild a store produced by `to_dict`.
+        """
+        store = cls(filterable)
+        store.ids = list(data["ids"])
+        store.rows = {vid: row for row, vid in enumerate(store.ids)}
+        store.columns = {name: list(values) for name, values in data["columns"].items()}
+        return store
@@ -0,0 +1,127 @@
+import asyncio
+import time
+import numpy as np
+from prometheus_client import Histogram
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+# Number of queries executed per coalesced index.search call
+BATCH_SIZE = Histogram(
+    "faiss_microbatch_size",
+    "Queries per coalesced search call",
+    ["index"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+# Time a query spent queued before its batch was dispatched
+QUEUE_WAIT = Histogram(
+    "faiss_microbatch_queue_wait_seconds",
+    "Time a query waited for its batch to be dispatched",
+    ["index"],
+    buckets=(0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05),
+)
+
+SearchResult = Tuple[np.ndarray, np.ndarray, Optional[List[Any]]]
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-vector searches on one index into matrix searches.
+
+    Each query comes with a hashable group (the search parameters); only
+    queries of the same group can share a call. Queries of a group are queued
+    until either `max_batch_size` of them are waiting or the oldest one has
+    waited `max_wait_ms`; the batch then runs as a single `search_fn` call and
+    every caller receives its own row of the result. A group's queue is
+    discarded once dispatched, so groups seen once hold no memory.
+
+    All methods must be called from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        search_fn: Callable[[np.ndarray, Hashable], Awaitable[SearchResult]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 2.0,
+    ) -> None:
+        """
+        Parameters:
+        ----------
+        name : str
+            Index key, used as the metrics label
+        search_fn : Callable[[np.ndarray, Hashable], Awaitable[SearchResult]]
+            Coroutine searching an (n, d) query matrix with the parameters of
+            a group, returning (distances, indices, metadata or None)
+        max_batch_size : int
+            Dispatch a group as soon as this many of its queries are queued
+        max_wait_ms : float
+            Dispatch a group after its first queued query has waited this long
+        """
+        self.name = name
+        self.search_fn = search_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending: Dict[Hashable, List[Tuple[np.ndarray, asyncio.Future, float]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()  # Running dispatches, kept so they are not collected
+
+    @property
+    def idle(self) -> bool:
+        """
+        Whether no query is queued or being searched.
+        """
+        return not self._pending and not self._tasks
+
+    async def submit(self, query: np.ndarray, group: Hashable = None) -> SearchResult:
+        """
+        Queue a (1, d) query of `group` and wait for its slice of the batched result.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(group, [])
+        pending.append((query, future, time.perf_counter()))
+        if len(pending) >= self.max_batch_size:
+            self._flush(group)
+        elif group not in self._timers:
+            self._timers[group] = loop.call_later(self.max_wait, self._flush, group)
+        return await future
+
+    def _flush(self, group: Hashable) -> None:
+        """
+        Hand the queued queries of `group` to a background task as one batch.
+        """
+        timer = self._timers.pop(group, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(group, None)
+        if batch:
+            task = asyncio.ensure_future(self._dispatch(batch, group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: List[Tuple[np.ndarray, asyncio.Future, float]], group: Hashable) -> None:
+        """
+        Run one search over `batch` and resolve each caller's future with its row,
+        or fail every future with the error.
+        """
+        now = time.perf_counter()
+        BATCH_SIZE.labels(self.name).observe(len(batch))
+        for _, _, queued_at in batch:
+            QUEUE_WAIT.labels(self.name).observe(now - queued_at)
+
+        try:
+            queries = np.vstack([query for query, _, _ in batch])
+            distances, indices, metadata = await self.search_fn(queries, group)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for row, (_, future, _) in enumerate(batch):
+            if not future.done():
+                future.set_result((
+                    distances[row:row + 1],
+                    indices[row:row + 1],
+                    metadata[row:row + 1] if metadata is not None else None,
+                ))
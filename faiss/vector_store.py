@@ -0,0 +1,923 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Literal, Optional, Tuple
+
+import faiss
+import numpy as np
+from faiss.contrib.exhaustive_search import knn_ground_truth
+from faiss.contrib.inspect_tools import get_invlist
+from pydantic import BaseModel
+
+from metadata_store import MetadataStore
+
+# Index keys double as snapshot file names (`<key>.faiss`, `<key>.json`,
+# `<key>.meta.json`); keys ending in `.meta` would overwrite the metadata of
+# another key, `aliases` the alias table, and a leading dot marks staged uploads
+KEY_PATTERN = re.compile(r"^(?!\.)(?!aliases$)(?!.*\.meta$)[A-Za-z0-9_.-]+$")
+
+SearchResult = Tuple[np.ndarray, np.ndarray, Optional[List[List[Optional[Dict[str, Any]]]]]]
+
+# Read flags memory-mapping IVF inverted lists, and flat codes of other index
+# types on Faiss versions that support it (the two cannot be combined)
+IVF_MMAP_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+CODES_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+# Seconds of search history behind the queries-per-second figure in stats
+QPS_WINDOW = 60.0
+
+# Stored vectors scanned per block by the exact search of a recall probe
+RECALL_BLOCK_ROWS = 65536
+
+
+class RWLock:
+    """
+    Writer-preferring readers-writer lock.
+
+    Faiss indexes allow concurrent searches but not a search concurrent with `add`,
+    so searches take the shared side and mutations the exclusive side.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class IndexSpec(BaseModel):
+    type: Literal["flat", "ivf_flat", "hnsw", "ivf_pq"] = "flat"  # Index structure
+    nlist: int = 1024          # IVF: number of inverted lists (coarse centroids)
+    m: int = 32                # HNSW: number of graph neighbors per node
+    ef_construction: int = 40  # HNSW: beam width used while building the graph
+    pq_m: int = 8              # IVFPQ: number of sub-quantizers (must divide dimension)
+    nbits: int = 8             # IVFPQ: bits per sub-quantizer code
+    id_map: bool = False       # Store caller-supplied 64-bit IDs (IndexIDMap2) instead of positions
+    filterable: List[str] = []  # Metadata fields usable in search filters (bitset-indexed)
+    shards: int = 1            # Sub-indexes searched in parallel and merged (IndexShards)
+
+
+def build_index(dimension: int, spec: IndexSpec) -> faiss.Index:
+    """
+    Build an empty index for `spec` using the inner-product metric.
+
+    Vectors are L2-normalized before add and search for every index type, so
+    inner product equals cosine similarity regardless of the structure chosen.
+
+    With `shards` > 1 the result is a threaded `faiss.IndexShards` over that
+    many sub-indexes of the same type. Each sub-index stores IDs, so results
+    merged across shards stay unambiguous; vectors are routed to shards by
+    ID (see `VectorStore`).
+
+    Raises:
+    ------
+    ValueError
+        If the parameters are invalid for the given dimensionality
+    """
+    if spec.shards < 1:
+        raise ValueError("shards must be at least 1.")
+    if spec.shards > 1:
+        part = spec.model_copy(update={"shards": 1, "id_map": True})
+        index = faiss.IndexShards(dimension, True, False)
+        for _ in range(spec.shards):
+            index.add_shard(build_index(dimension, part))
+        return index
+    if spec.type == "flat":
+        description = "Flat"
+    elif spec.type == "ivf_flat":
+        description = f"IVF{spec.nlist},Flat"
+    elif spec.type == "hnsw":
+        description = f"HNSW{spec.m},Flat"
+    else:
+        if dimension % spec.pq_m:
+            raise ValueError(f"pq_m must divide dimension {dimension}.")
+        description = f"IVF{spec.nlist},PQ{spec.pq_m}x{spec.nbits}"
+    if spec.id_map and spec.type in ("flat", "hnsw"):
+        # IVF indexes store IDs in their inverted lists natively; wrapping them
+        # in an ID map would break on removal, since IVF does not renumber rows
+        description = "IDMap2," + description
+
+    try:
+        index = faiss.index_factory(dimension, description, faiss.METRIC_INNER_PRODUCT)
+    except RuntimeError as e:
+        raise ValueError(f"Cannot build index '{description}': {e}")
+    if spec.type == "hnsw":
+        inner = faiss.downcast_index(index.index) if spec.id_map else index
+        inner.hnsw.efConstruction = spec.ef_construction
+    return index
+
+
+def id_selector(ids: np.ndarray) -> faiss.IDSelector:
+    """
+    Build a Faiss ID selector accepting exactly `ids`.
+
+    Dense non-negative ID ranges use a bitmap (one bit per possible ID, O(1)
+    lookups); sparse 64-bit IDs fall back to a hash set.
+    """
+    if len(ids) and ids.min() >= 0 and ids.max() < 64 * len(ids):
+        mask = np.zeros(int(ids.max()) + 1, dtype=bool)
+        mask[ids] = True
+        bitmap = np.packbits(mask, bitorder="little")
+        selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        selector.bitmap_array = bitmap  # The selector does not own the buffer
+        return selector
+    return faiss.IDSelectorBatch(ids)
+
+
+class VectorStore:
+    """
+    Registry of named Faiss indexes with their specs, metadata and locks.
+
+    Every index gets a readers-writer lock: searches of one index run
+    concurrently, while add, upsert, remove and train are exclusive. All
+    methods block (Faiss releases the GIL), so async callers run them in a
+    thread pool. Vectors are L2-normalized in place on add and search.
+
+    Sharded indexes (`IndexSpec.shards` > 1) keep vector `id` in shard
+    `id % shards`; adds, upserts and removals go straight to the owning
+    shard, and searches run on all shards in parallel threads and merge.
+    Sharded indexes always store IDs: without `id_map` they are assigned
+    consecutively, so results still read as insertion positions.
+
+    Indexes can be snapshotted to `data_dir` and restored from it, one file
+    per shard; snapshot files of at least `mmap_min_bytes` are memory-mapped
+    and served read-only. Several processes mapping the same files share
+    their pages through the OS page cache, which is how read replicas scale
+    search across cores.
+
+    An alias names the current version of an index (`<alias>.v<n>`), so a
+    new version can be built beside the live one and swapped in atomically.
+    The version an alias pointed at before the last swap is kept for
+    rollback; older ones are dropped. Aliases shadow indexes of the same
+    name and are persisted to `aliases.json` in `data_dir`.
+    """
+
+    def __init__(self, data_dir: str = "data", mmap_min_bytes: int = 256 * 1024 * 1024) -> None:
+        """
+        Parameters:
+        ----------
+        data_dir : str
+            Directory holding index snapshots
+        mmap_min_bytes : int
+            Snapshot size from which indexes are memory-mapped instead of read into RAM
+
+        Attributes:
+        ----------
+        indexes : Dict[str, faiss.Index]
+            Faiss index of each key
+        specs : Dict[str, IndexSpec]
+            Build parameters each index was created with
+        metadata : Dict[str, MetadataStore]
+            Columnar metadata of each index, keyed by the IDs Faiss returns
+        next_ids : Dict[str, int]
+            Next automatically assigned ID of each ID-mapped or sharded index
+        read_only : set
+            Keys of memory-mapped indexes
+        aliases : Dict[str, str]
+            Index version each alias resolves to
+        previous : Dict[str, str]
+            Version each alias pointed at before its last swap, kept for rollback
+        """
+        self.data_dir = data_dir
+        self.mmap_min_bytes = mmap_min_bytes
+        self.indexes: Dict[str, faiss.Index] = {}
+        self.locks: Dict[str, RWLock] = {}
+        self.specs: Dict[str, IndexSpec] = {}
+        self.metadata: Dict[str, MetadataStore] = {}
+        self.next_ids: Dict[str, int] = {}
+        self.read_only: set = set()
+        self.aliases: Dict[str, str] = {}
+        self.previous: Dict[str, str] = {}
+        self._registry_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._recent: Dict[str, deque] = {}  # key -> (monotonic time, queries) of recent searches
+        self._recall: Dict[str, Dict[str, Any]] = {}  # key -> result of the last recall probe
+        self._loaded: Dict[str, float] = {}  # key -> modification time of the loaded snapshot
+        self._aliases_loaded: Optional[float] = None  # Modification time of the loaded alias file
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.indexes
+
+    def __getitem__(self, key: str) -> faiss.Index:
+        return self.indexes[key]
+
+    def keys(self) -> List[str]:
+        return list(self.indexes)
+
+    def resolve(self, key: str) -> str:
+        """
+        Return the index version alias `key` points at, or `key` itself if it is not an alias.
+        """
+        return self.aliases.get(key, key)
+
+    def _register(
+        self, key: str, index: faiss.Index, spec: IndexSpec, metadata: MetadataStore, next_id: int, read_only: bool
+    ) -> None:
+        """
+        Publish a ready index; the index itself goes last, so readers that see it see everything else.
+        """
+        self.locks[key] = RWLock()
+        self.specs[key] = spec
+        self.metadata[key] = metadata
+        self.next_ids[key] = next_id
+        self._counters[key] = {"searches": 0, "queries": 0, "added": 0, "removed": 0}
+        self._recent[key] = deque()
+        self._recall.pop(key, None)
+        if read_only:
+            self.read_only.add(key)
+        else:
+            self.read_only.discard(key)
+        self.indexes[key] = index
+
+    @staticmethod
+    def parts(index: faiss.Index) -> List[faiss.Index]:
+        """
+        Return the sub-indexes of a sharded index, or the index itself.
+        """
+        if isinstance(index, faiss.IndexShards):
+            return [faiss.downcast_index(index.at(i)) for i in range(index.count())]
+        return [index]
+
+    @staticmethod
+    def _route(ids: np.ndarray, shards: int) -> List[np.ndarray]:
+        """
+        Return, for each shard, the positions in `ids` of the vectors it owns.
+        """
+        owners = ids % shards
+        return [np.flatnonzero(owners == shard) for shard in range(shards)]
+
+    def _add_with_ids(self, index: faiss.Index, data: np.ndarray, ids: np.ndarray) -> None:
+        """
+        Add vectors with IDs, routing them to their shards if `index` is sharded. Caller holds the write lock.
+        """
+        parts = self.parts(index)
+        if len(parts) == 1:
+            index.add_with_ids(data, ids)
+            return
+        for part, positions in zip(parts, self._route(ids, len(parts))):
+            if len(positions):
+                part.add_with_ids(data[positions], ids[positions])
+        index.syncWithSubIndexes()
+
+    def _remove_ids(self, index: faiss.Index, ids: np.ndarray) -> int:
+        """
+        Remove IDs from their shards if `index` is sharded. Caller holds the write lock.
+        """
+        parts = self.parts(index)
+        if len(parts) == 1:
+            return index.remove_ids(faiss.IDSelectorBatch(ids))
+        removed = 0
+        for part, positions in zip(parts, self._route(ids, len(parts))):
+            if len(positions):
+                removed += part.remove_ids(faiss.IDSelectorBatch(ids[positions]))
+        index.syncWithSubIndexes()
+        return removed
+
+    def _stored_ids(self, index: faiss.Index) -> np.ndarray:
+        """
+        Return the IDs held by an ID-mapped flat or HNSW index, over all shards.
+        """
+        return np.concatenate([faiss.vector_to_array(part.id_map) for part in self.parts(index)])
+
+    @classmethod
+    def memory_bytes(cls, index: faiss.Index) -> int:
+        """
+        Estimate the memory an index holds: vector codes, IDs, HNSW links and IVF centroids.
+        """
+        total = 0
+        for part in cls.parts(index):
+            if isinstance(part, faiss.IndexIDMap):
+                total += 8 * part.ntotal
+                part = faiss.downcast_index(part.index)
+            ivf = faiss.try_extract_index_ivf(part)
+            if ivf is not None:
+                total += ivf.ntotal * (ivf.code_size + 8) + ivf.quantizer.ntotal * ivf.d * 4
+            elif isinstance(part, faiss.IndexHNSW):
+                total += part.ntotal * part.d * 4 + part.hnsw.neighbors.size() * 4
+            else:
+                total += part.ntotal * part.code_size
+        return total
+
+    def _count(self, key: str, **amounts: int) -> None:
+        with self._stats_lock:
+            counters = self._counters[key]
+            for name, amount in amounts.items():
+                counters[name] += amount
+            if amounts.get("queries"):
+                now = time.monotonic()
+                recent = self._recent[key]
+                recent.append((now, amounts["queries"]))
+                while recent[0][0] < now - QPS_WINDOW:
+                    recent.popleft()
+
+    def create(self, key: str, dimension: int, spec: Optional[IndexSpec] = None) -> faiss.Index:
+        """
+        Create an empty index under `key`.
+
+        Raises:
+        ------
+        ValueError
+            If the key is taken or the parameters are invalid
+        """
+        spec = spec or IndexSpec()
+        index = build_index(dimension, spec)
+        with self._registry_lock:
+            if key in self.indexes:
+                raise ValueError(f"Index with key '{key}' already exists.")
+            if key in self.aliases:
+                raise ValueError(f"Key '{key}' is an alias of index '{self.aliases[key]}'.")
+            self._register(key, index, spec, MetadataStore(spec.filterable), 0, False)
+        return index
+
+    def add(self, key: str, data: np.ndarray, ids: Optional[np.ndarray] = None) -> None:
+        """
+        Normalize `data` in place and add it to index `key` under its write lock.
+
+        ID-mapped indexes get `ids`, or consecutive IDs after the largest one seen
+        when `ids` is omitted.
+        """
+        faiss.normalize_L2(data)
+        with self.locks[key].write():
+            index = self.indexes[key]
+            spec = self.specs[key]
+            if not spec.id_map and spec.shards == 1:
+                index.add(data)
+            else:
+                if ids is None:
+                    ids = np.arange(self.next_ids[key], self.next_ids[key] + len(data), dtype='int64')
+                self._add_with_ids(index, data, ids)
+                if len(ids):
+                    self.next_ids[key] = max(self.next_ids[key], int(ids.max()) + 1)
+        self._count(key, added=len(data))
+
+    def upsert(self, key: str, ids: np.ndarray, data: np.ndarray, metadata: Dict[str, List[Any]]) -> None:
+        """
+        Replace the vectors and metadata of `ids` in ID-mapped index `key`.
+
+        Raises:
+        ------
+        ValueError
+            If the index type cannot overwrite existing IDs or the metadata is malformed
+        """
+        faiss.normalize_L2(data)
+        with self.locks[key].write():
+            index = self.indexes[key]
+            if self.specs[key].type == "hnsw":
+                # HNSW graphs do not support removal, so only new IDs can be written
+                if np.isin(ids, self._stored_ids(index)).any():
+                    raise ValueError("HNSW indexes cannot overwrite existing IDs.")
+            else:
+                self._remove_ids(index, ids)
+            self.metadata[key].upsert(ids.tolist(), metadata)
+            self._add_with_ids(index, data, ids)
+            if len(ids):
+                self.next_ids[key] = max(self.next_ids[key], int(ids.max()) + 1)
+        self._count(key, added=len(ids))
+
+    def remove(self, key: str, ids: np.ndarray) -> int:
+        """
+        Remove `ids` and their metadata from ID-mapped index `key`.
+
+        Returns:
+        -------
+        int
+            Number of vectors removed
+
+        Raises:
+        ------
+        RuntimeError
+            If the index type does not support removal
+        """
+        with self.locks[key].write():
+            removed = self._remove_ids(self.indexes[key], ids)
+            self.metadata[key].remove(ids.tolist())
+        self._count(key, removed=removed)
+        return removed
+
+    def train(self, key: str, data: np.ndarray) -> None:
+        """
+        Normalize `data` in place and train index `key` under its write lock.
+        """
+        faiss.normalize_L2(data)
+        with self.locks[key].write():
+            self.indexes[key].train(data)
+
+    def search_params(
+        self,
+        key: str,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        selector: Optional[faiss.IDSelector] = None,
+    ) -> Optional[faiss.SearchParameters]:
+        """
+        Build per-call search parameters for index `key`.
+
+        Parameters are passed to `index.search` instead of being set on the index,
+        so concurrent searches with different knobs do not interfere.
+        """
+        spec = self.specs[key]
+        extra = {"sel": selector} if selector is not None else {}
+        if spec.type in ("ivf_flat", "ivf_pq") and nprobe is not None:
+            return faiss.SearchParametersIVF(nprobe=nprobe, **extra)
+        if spec.type == "hnsw" and ef_search is not None:
+            return faiss.SearchParametersHNSW(efSearch=ef_search, **extra)
+        if spec.type in ("ivf_flat", "ivf_pq") and selector is not None:
+            return faiss.SearchParametersIVF(**extra)
+        if spec.type == "hnsw" and selector is not None:
+            return faiss.SearchParametersHNSW(**extra)
+        return faiss.SearchParameters(**extra) if selector is not None else None
+
+    def search(
+        self,
+        key: str,
+        queries: np.ndarray,
+        k: int,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        fields: Optional[List[str]] = None,
+        filters: Optional[List[Dict[str, Any]]] = None,
+    ) -> SearchResult:
+        """
+        Normalize `queries` in place and search index `key` under its read lock.
+
+        Filters are resolved to an ID selector from the metadata bitsets and passed
+        into Faiss, so non-matching vectors are skipped during the scan. When
+        `fields` is given, the metadata of every hit is looked up under the same
+        lock (`["*"]` selects all fields).
+
+        Raises:
+        ------
+        ValueError
+            If a filter uses a field that is not filterable
+        """
+        faiss.normalize_L2(queries)
+        with self.locks[key].read():
+            store = self.metadata[key]
+            selector = id_selector(store.filter_ids(filters)) if filters else None
+            params = self.search_params(key, nprobe, ef_search, selector)
+            distances, indices = self.indexes[key].search(queries, k, params=params)
+            hits = None
+            if fields is not None:
+                selected = None if "*" in fields else fields
+                hits = [store.get(row, selected) for row in indices.tolist()]
+        self._count(key, searches=1, queries=len(queries))
+        return distances, indices, hits
+
+    def _iter_vectors(self, index: faiss.Index) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Yield (ids, vectors) blocks covering every vector stored in `index`, with
+        the IDs search returns. Caller holds the read lock.
+
+        IVF-PQ vectors are decoded from their codes, so they carry the
+        quantization error.
+        """
+        for part in self.parts(index):
+            id_map = None
+            if isinstance(part, faiss.IndexIDMap):
+                id_map = faiss.vector_to_array(part.id_map)
+                part = faiss.downcast_index(part.index)
+            ivf = faiss.try_extract_index_ivf(part)
+            if ivf is not None:
+                ivf = faiss.downcast_index(ivf)
+            if ivf is None:
+                for start in range(0, part.ntotal, RECALL_BLOCK_ROWS):
+                    count = min(RECALL_BLOCK_ROWS, part.ntotal - start)
+                    ids = id_map[start:start + count] if id_map is not None else np.arange(start, start + count)
+                    yield ids, part.reconstruct_n(start, count)
+                continue
+            ids, vectors, held = [], [], 0
+            for list_no in range(ivf.nlist):
+                list_ids, codes = get_invlist(ivf.invlists, list_no)
+                if not len(list_ids):
+                    continue
+                if isinstance(ivf, faiss.IndexIVFPQ):
+                    decoded = ivf.pq.decode(codes)
+                    if ivf.by_residual:
+                        decoded += ivf.quantizer.reconstruct(list_no)
+                else:
+                    decoded = codes.view("float32")
+                ids.append(list_ids)
+                vectors.append(decoded)
+                held += len(list_ids)
+                if held >= RECALL_BLOCK_ROWS:
+                    yield np.concatenate(ids), np.concatenate(vectors)
+                    ids, vectors, held = [], [], 0
+            if held:
+                yield np.concatenate(ids), np.concatenate(vectors)
+
+    def recall(
+        self,
+        key: str,
+        k: int = 10,
+        queries: Optional[np.ndarray] = None,
+        sample: int = 100,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Estimate recall@k of index `key` against exact search over the vectors it stores.
+
+        Without `queries`, `sample` stored vectors are drawn as queries; they
+        sit in their own IVF cells and HNSW neighborhoods, so they overstate
+        the recall real queries get. The exact neighbors come from a brute-force scan of the stored vectors in
+        blocks (`faiss.contrib.exhaustive_search.knn_ground_truth`); for IVF-PQ
+        the scan runs over decoded codes, so the estimate covers the loss from
+        nlist/nprobe but not from quantization. The result is kept for `stats`.
+
+        Returns:
+        -------
+        dict
+            recall (share of exact neighbors found), k, queries, nprobe, ef_search, seconds
+
+        Raises:
+        ------
+        ValueError
+            If the index is empty or the queries do not match its dimensionality
+        """
+        started = time.perf_counter()
+        index = self.indexes[key]
+        params = self.search_params(key, nprobe, ef_search)
+        with self.locks[key].read():
+            if not index.ntotal:
+                raise ValueError(f"Index '{key}' is empty.")
+            if queries is None:
+                picks = np.sort(np.random.default_rng().choice(index.ntotal, min(sample, index.ntotal), replace=False))
+                rows, seen = [], 0
+                for _, vectors in self._iter_vectors(index):
+                    rows.append(vectors[picks[(picks >= seen) & (picks < seen + len(vectors))] - seen])
+                    seen += len(vectors)
+                queries = np.concatenate(rows)
+            queries = np.array(queries, dtype="float32")
+            if queries.ndim != 2 or queries.shape[1] != index.d:
+                raise ValueError(f"Query vector dimensionality must be {index.d}.")
+            faiss.normalize_L2(queries)
+            _, found = index.search(queries, k, params=params)
+            stored_ids = []
+
+            def blocks() -> Iterator[np.ndarray]:
+                for ids, vectors in self._iter_vectors(index):
+                    stored_ids.append(ids)
+                    yield vectors
+
+            _, positions = knn_ground_truth(queries, blocks(), k, metric_type=faiss.METRIC_INNER_PRODUCT, ngpu=0)
+        exact = np.concatenate(stored_ids)[np.maximum(positions, 0)]
+        exact[positions < 0] = -1
+        hits = sum(len(set(row[row >= 0]) & set(truth[truth >= 0])) for row, truth in zip(found, exact))
+        relevant = int((exact >= 0).sum())
+        result = {
+            "recall": hits / relevant if relevant else None,
+            "k": k,
+            "queries": len(queries),
+            "nprobe": nprobe,
+            "ef_search": ef_search,
+            "seconds": time.perf_counter() - started,
+        }
+        with self._stats_lock:
+            self._recall[key] = result
+        return result
+
+    def snapshot_paths(self, key: str) -> Tuple[str, str, str]:
+        """
+        Return the (index file, spec file, metadata file) paths of the snapshot of index `key`.
+        """
+        return (
+            os.path.join(self.data_dir, f"{key}.faiss"),
+            os.path.join(self.data_dir, f"{key}.json"),
+            os.path.join(self.data_dir, f"{key}.meta.json"),
+        )
+
+    def shard_paths(self, key: str, shards: int) -> List[str]:
+        """
+        Return the index file of each shard of a sharded snapshot.
+        """
+        return [os.path.join(self.data_dir, f"{key}.shards", f"{shard}.faiss") for shard in range(shards)]
+
+    def save(self, key: str) -> int:
+        """
+        Write index `key`, its spec and metadata to `data_dir`, atomically replacing
+        any previous snapshot file by file.
+
+        Sharded indexes are written one file per shard under `<key>.shards/`.
+        The spec file is replaced last and marks the snapshot as complete.
+
+        Returns:
+        -------
+        int
+            Total size of the written index files in bytes
+
+        Raises:
+        ------
+        ValueError
+            If the key cannot be used as a file name
+        """
+        if not KEY_PATTERN.match(key):
+            raise ValueError(f"Index key '{key}' is not a valid file name.")
+        index_path, spec_path, meta_path = self.snapshot_paths(key)
+        shards = self.specs[key].shards
+        paths = self.shard_paths(key, shards) if shards > 1 else [index_path]
+        os.makedirs(os.path.dirname(paths[0]), exist_ok=True)
+        with self.locks[key].read():
+            for part, path in zip(self.parts(self.indexes[key]), paths):
+                faiss.write_index(part, path + ".tmp")
+            spec = {"dimension": self.indexes[key].d, "index": dict(self.specs[key]), "next_id": self.next_ids[key]}
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(self.metadata[key].to_dict(), f)
+        with open(spec_path + ".tmp", "w") as f:
+            json.dump(spec, f)
+        for path in paths:
+            os.replace(path + ".tmp", path)
+        os.replace(meta_path + ".tmp", meta_path)
+        os.replace(spec_path + ".tmp", spec_path)
+        # Drop the layout the index had before a change in shard count
+        if shards > 1 and os.path.exists(index_path):
+            os.remove(index_path)
+        elif shards == 1:
+            shutil.rmtree(os.path.join(self.data_dir, f"{key}.shards"), ignore_errors=True)
+        self._loaded[key] = self._modified(key)
+        return sum(os.path.getsize(path) for path in paths)
+
+    def _modified(self, key: str) -> Optional[float]:
+        spec_path = self.snapshot_paths(key)[1]
+        return os.path.getmtime(spec_path) if os.path.exists(spec_path) else None
+
+    def _read(self, path: str, spec: IndexSpec, mmap: Optional[bool]) -> Tuple[faiss.Index, bool]:
+        """
+        Read one index file, memory-mapped if `mmap` is set or, when None, if it is large enough.
+        """
+        if mmap is None:
+            mmap = os.path.getsize(path) >= self.mmap_min_bytes
+        if not mmap:
+            return faiss.read_index(path), False
+        flags = IVF_MMAP_FLAGS if spec.type.startswith("ivf") else CODES_MMAP_FLAGS
+        return faiss.read_index(path, flags), True
+
+    def load(self, key: str, mmap: Optional[bool] = None) -> None:
+        """
+        Load the snapshot of index `key` from `data_dir` into the registry.
+
+        Files of at least `mmap_min_bytes` are opened with `IO_FLAG_MMAP`, so their
+        pages are shared between worker processes through the page cache and the
+        index is available without reading it fully; such indexes are read-only.
+        A loaded index replaces any index already registered under `key`.
+
+        Parameters:
+        ----------
+        key : str
+            Index key
+        mmap : bool, optional
+            Force memory-mapping on or off instead of deciding by file size
+        """
+        index_path, spec_path, meta_path = self.snapshot_paths(key)
+        modified = self._modified(key)
+        spec = IndexSpec()
+        next_id = 0
+        if os.path.exists(spec_path):
+            with open(spec_path) as f:
+                saved = json.load(f)
+            spec = IndexSpec(**saved["index"])
+            next_id = saved.get("next_id", 0)
+
+        if spec.shards > 1:
+            index = faiss.IndexShards(saved["dimension"], True, False)
+            mapped = False
+            for path in self.shard_paths(key, spec.shards):
+                part, part_mapped = self._read(path, spec, mmap)
+                index.add_shard(part)
+                mapped = mapped or part_mapped
+        else:
+            index, mapped = self._read(index_path, spec, mmap)
+        metadata = MetadataStore(spec.filterable)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                metadata = MetadataStore.from_dict(json.load(f), spec.filterable)
+
+        with self._registry_lock:
+            self._register(key, index, spec, metadata, next_id, mapped)
+            self._loaded[key] = modified
+
+    def snapshot_keys(self) -> List[str]:
+        """
+        Return the keys of all snapshots found in `data_dir`.
+        """
+        if not os.path.isdir(self.data_dir):
+            return []
+        keys = {}
+        for name in sorted(os.listdir(self.data_dir)):
+            key, ext = os.path.splitext(name)
+            if ext in (".faiss", ".shards") and KEY_PATTERN.match(key):
+                keys[key] = True
+        return list(keys)
+
+    def changed_snapshots(self) -> List[str]:
+        """
+        Return the keys whose snapshot was written since it was last loaded or saved here.
+        """
+        return [
+            key for key in self.snapshot_keys()
+            if self._modified(key) is not None and self._modified(key) != self._loaded.get(key)
+        ]
+
+    def vanished_snapshots(self) -> List[str]:
+        """
+        Return the keys loaded from a snapshot that has since been deleted from `data_dir`.
+        """
+        return [key for key, modified in list(self._loaded.items()) if modified is not None and self._modified(key) is None]
+
+    def drop(self, key: str, delete_snapshot: bool = True) -> None:
+        """
+        Unregister index `key` once in-flight operations on it finish, and delete its snapshot.
+        """
+        lock = self.locks.get(key)
+        if lock is None:
+            return
+        with lock.write():
+            with self._registry_lock:
+                # The index goes first, so readers stop finding the key before the rest disappears
+                self.indexes.pop(key, None)
+                for registry in (
+                    self.locks, self.specs, self.metadata, self.next_ids,
+                    self._counters, self._recent, self._recall, self._loaded,
+                ):
+                    registry.pop(key, None)
+                self.read_only.discard(key)
+        if delete_snapshot:
+            index_path, spec_path, meta_path = self.snapshot_paths(key)
+            # The spec file goes first, so replicas never load a partly deleted snapshot
+            for path in (spec_path, index_path, meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            shutil.rmtree(os.path.join(self.data_dir, f"{key}.shards"), ignore_errors=True)
+
+    def next_version(self, alias: str) -> str:
+        """
+        Return an unused version key for `alias`: `<alias>.v<n>` after the highest version in use.
+        """
+        pattern = re.compile(re.escape(alias) + r"\.v(\d+)$")
+        numbers = [0]
+        for key in list(self.indexes) + self.snapshot_keys():
+            match = pattern.match(key)
+            if match:
+                numbers.append(int(match.group(1)))
+        return f"{alias}.v{max(numbers) + 1}"
+
+    def swap(self, alias: str, version: str) -> Optional[str]:
+        """
+        Atomically point `alias` at index `version`.
+
+        The version the alias pointed at becomes its rollback target, and the
+        previous rollback target is dropped along with its snapshot. The alias
+        table is saved to `data_dir`.
+
+        Returns:
+        -------
+        str or None
+            Key of the dropped version, if any
+
+        Raises:
+        ------
+        ValueError
+            If the alias is not a valid file name, `version` is not an index or is another alias
+        """
+        if not KEY_PATTERN.match(alias):
+            raise ValueError(f"Alias '{alias}' is not a valid file name.")
+        with self._registry_lock:
+            if version not in self.indexes:
+                raise ValueError(f"Index with key '{version}' not found.")
+            if version != alias and version in self.aliases:
+                raise ValueError(f"Key '{version}' is an alias, not an index version.")
+            current = self.aliases.get(alias, alias if alias in self.indexes else None)
+            if current == version:
+                return None
+            retired = self.previous.get(alias)
+            self.aliases[alias] = version
+            if current is not None:
+                self.previous[alias] = current
+        self.save_aliases()
+        in_use = set(self.aliases.values()) | set(self.previous.values())
+        if retired is None or retired in in_use:
+            return None
+        self.drop(retired)
+        return retired
+
+    def rollback(self, alias: str) -> str:
+        """
+        Point `alias` back at the version it resolved to before its last swap.
+
+        The two versions trade places, so a second rollback undoes the first.
+
+        Returns:
+        -------
+        str
+            Key of the version the alias now resolves to
+
+        Raises:
+        ------
+        ValueError
+            If the alias has no previous version
+        """
+        version = self.previous.get(alias)
+        if version is None or version not in self.indexes:
+            raise ValueError(f"Alias '{alias}' has no previous version to roll back to.")
+        self.swap(alias, version)
+        return version
+
+    def _aliases_path(self) -> str:
+        return os.path.join(self.data_dir, "aliases.json")
+
+    def save_aliases(self) -> None:
+        """
+        Atomically write the alias table to `data_dir`.
+        """
+        path = self._aliases_path()
+        os.makedirs(self.data_dir, exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"aliases": self.aliases, "previous": self.previous}, f)
+        os.replace(path + ".tmp", path)
+        self._aliases_loaded = os.path.getmtime(path)
+
+    def load_aliases(self) -> bool:
+        """
+        Read the alias table from `data_dir` if it changed since it was last loaded or saved here.
+
+        Returns:
+        -------
+        bool
+            Whether the table was reloaded
+        """
+        path = self._aliases_path()
+        if not os.path.exists(path) or os.path.getmtime(path) == self._aliases_loaded:
+            return False
+        modified = os.path.getmtime(path)
+        with open(path) as f:
+            saved = json.load(f)
+        with self._registry_lock:
+            self.aliases = saved.get("aliases", {})
+            self.previous = saved.get("previous", {})
+            self._aliases_loaded = modified
+        return True
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return size, structure, memory footprint, operation counters, recent
+        queries per second and the last recall probe of every index.
+        """
+        now = time.monotonic()
+        with self._stats_lock:
+            counters = {key: dict(values) for key, values in self._counters.items()}
+            qps = {
+                key: sum(queries for at, queries in recent if at >= now - QPS_WINDOW) / QPS_WINDOW
+                for key, recent in self._recent.items()
+            }
+            recall = dict(self._recall)
+        return {
+            key: {
+                "type": self.specs[key].type,
+                "dimension": index.d,
+                "vectors": index.ntotal,
+                "is_trained": index.is_trained,
+                "read_only": key in self.read_only,
+                "shards": self.specs[key].shards,
+                "memory_bytes": self.memory_bytes(index),
+                "metadata_rows": len(self.metadata[key]),
+                "aliases": [alias for alias, version in list(self.aliases.items()) if version == key],
+                **counters.get(key, {}),
+                "queries_per_second": qps.get(key, 0.0),
+                "recall": recall.get(key),
+            }
+            for key, index in list(self.indexes.items())
+        }
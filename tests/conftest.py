@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Services use a flat module layout (as in their Docker images); module names do not overlap
+for service in ("agent", "bot", "faiss"):
+    path = os.path.join(ROOT, service)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture(scope="session")
+def tour_agent():
+    """
+    Import the agent service module offline; it builds its default agent on import.
+    """
+    os.environ.update({"FAISS_URL": "", "CHECKPOINT_URL": "", "SEMANTIC_CACHE": "0", "TOOL_CACHE_SQLITE": ""})
+    os.environ.setdefault("GIGACHAT_API_KEY", "offline")
+    os.environ.setdefault("TAVILY_API_KEY", "offline")
+    import tour_agent
+
+    return tour_agent
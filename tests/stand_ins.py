@@ -0,0 +1,131 @@
+import hashlib
+import math
+import re
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class FakeEmbedder(Embeddings):
+    """
+    Deterministic hashing embedder for tests and offline runs.
+
+    Every lower-cased word is hashed into one of `dimension` buckets with a
+    random sign, so texts sharing words get a high cosine similarity without
+    calling any external embedding API.
+    """
+
+    def __init__(self, dimension: int = 256) -> None:
+        self.dimension = dimension
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+class InProcessIndex:
+    """
+    In-process stand-in for `FaissServiceClient`, for tests and benchmarks.
+
+    Stores normalized vectors in a local ID-mapped `faiss.IndexFlatIP` and
+    metadata in a dict, and answers calls with the same JSON shape as the
+    service. A single instance serves every index key.
+    """
+
+    def __init__(self, dimension: int) -> None:
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self.metadata: Dict[int, Dict[str, Any]] = {}
+        self._next_id = 0
+
+    def add(self, vectors: List[List[float]], metadata: List[Dict[str, Any]]) -> None:
+        """
+        Add vectors with one metadata dict each, assigning consecutive IDs.
+        """
+        ids = list(range(self._next_id, self._next_id + len(vectors)))
+        names = {name for row in metadata for name in row}
+        columns = {name: [row.get(name) for row in metadata] for name in names}
+        self.upsert("", ids, vectors, columns)
+
+    def create_index(self, key: str, dimension: int, index: Optional[Dict[str, Any]] = None) -> bool:
+        return False
+
+    def upsert(
+        self, key: str, ids: List[int], vectors: List[List[float]], metadata: Dict[str, List[Any]]
+    ) -> None:
+        data = np.array(vectors, dtype="float32")
+        faiss.normalize_L2(data)
+        id_array = np.array(ids, dtype="int64")
+        self.index.remove_ids(faiss.IDSelectorBatch(id_array))
+        self.index.add_with_ids(data, id_array)
+        for position, vid in enumerate(ids):
+            row = self.metadata.setdefault(vid, {})
+            row.update({name: values[position] for name, values in metadata.items()})
+        self._next_id = max(self._next_id, max(ids, default=-1) + 1)
+
+    def remove_ids(self, key: str, ids: List[int]) -> int:
+        for vid in ids:
+            self.metadata.pop(vid, None)
+        return self.index.remove_ids(faiss.IDSelectorBatch(np.array(ids, dtype="int64")))
+
+    def search(self, key: str, vector: List[float], k: int, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        query = np.array([vector], dtype="float32")
+        faiss.normalize_L2(query)
+        distances, indices = self.index.search(query, k)
+        selected = None if fields is None or "*" in fields else fields
+        metadata = [
+            {name: self.metadata[i].get(name) for name in (selected or self.metadata[i])} if i >= 0 else None
+            for i in indices[0].tolist()
+        ]
+        return {
+            "cosine_similarities": distances.tolist(),
+            "indices": indices.tolist(),
+            "metadata": [metadata],
+        }
+
+    async def asearch(
+        self, key: str, vector: List[float], k: int, fields: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        return self.search(key, vector, k, fields)
+
+    async def acreate_index(self, key: str, dimension: int, index: Optional[Dict[str, Any]] = None) -> bool:
+        return self.create_index(key, dimension, index)
+
+    async def aupsert(
+        self, key: str, ids: List[int], vectors: List[List[float]], metadata: Dict[str, List[Any]]
+    ) -> None:
+        self.upsert(key, ids, vectors, metadata)
+
+    async def aremove_ids(self, key: str, ids: List[int]) -> int:
+        return self.remove_ids(key, ids)
+
+
+class QuietModel(BaseChatModel):
+    """
+    Chat model that answers "ok", counting its calls and recording the tool names it was bound to.
+    """
+
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "quiet"
+
+    def _generate(self, messages: List[BaseMessage], stop: Any = None, run_manager: Any = None, **kwargs: Any):
+        self.calls += 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+    def bind_tools(self, tools: List[Any], **kwargs: Any):
+        return self.bind(tools=[tool.name for tool in tools])
@@ -0,0 +1,107 @@
+import asyncio
+import json
+from typing import Callable, List
+
+import httpx
+import pytest
+
+import agent_client
+from agent_client import AgentClient, agent_client_from_env
+
+Handler = Callable[[httpx.Request], httpx.Response]
+
+
+def scripted(*steps) -> Handler:
+    """
+    Return a transport handler that plays `steps` in order: a status code,
+    a Response, or an exception class raised as if the connection failed.
+    """
+    remaining = list(steps)
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        step = remaining.pop(0)
+        if isinstance(step, type) and issubclass(step, Exception):
+            raise step("simulated", request=request)
+        if isinstance(step, int):
+            return httpx.Response(step, json={"response": "ok"} if step == 200 else {"detail": "busy"})
+        return step
+
+    handle.remaining = remaining
+    return handle
+
+
+def make_client(handler: Handler, retries: int = 2) -> AgentClient:
+    client = AgentClient("http://agent/query", retries=retries, backoff=0)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def query(client: AgentClient) -> dict:
+    return asyncio.run(client.query({"message": "hi", "thread_id": "1"}))
+
+
+@pytest.mark.parametrize("failure", [httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, 429, 503])
+def test_failures_before_processing_are_retried(failure):
+    handler = scripted(failure, failure, 200)
+    client = make_client(handler)
+    assert query(client) == {"response": "ok"}
+    assert handler.remaining == []
+    assert client.stats.snapshot()["retries"] == 2
+
+
+@pytest.mark.parametrize("failure, error", [
+    (500, httpx.HTTPStatusError),
+    (400, httpx.HTTPStatusError),
+    (httpx.ReadTimeout, httpx.ReadTimeout),
+    (httpx.RemoteProtocolError, httpx.RemoteProtocolError),
+])
+def test_failures_after_the_request_reached_the_agent_are_not_retried(failure, error):
+    handler = scripted(failure, 200)
+    client = make_client(handler)
+    with pytest.raises(error):
+        query(client)
+    assert len(handler.remaining) == 1
+    assert client.stats.snapshot()["failures"] == 1
+
+
+def test_gives_up_after_the_last_retry():
+    handler = scripted(503, 503, 503)
+    with pytest.raises(httpx.HTTPStatusError):
+        query(make_client(handler))
+    assert handler.remaining == []
+    handler = scripted(httpx.ConnectError, httpx.ConnectError)
+    with pytest.raises(httpx.ConnectError):
+        query(make_client(handler, retries=1))
+
+
+def test_retry_after_is_honoured(monkeypatch):
+    delays: List[float] = []
+
+    async def sleep(delay: float) -> None:
+        delays.append(delay)
+
+    monkeypatch.setattr(agent_client.asyncio, "sleep", sleep)
+    busy = httpx.Response(429, headers={"Retry-After": "3"}, json={"detail": "busy"})
+    assert query(make_client(scripted(busy, 200))) == {"response": "ok"}
+    assert delays == [3.0]
+
+
+def test_stream_retries_until_the_response_starts():
+    events = [{"type": "token", "content": "При"}, {"type": "done", "response": "Привет"}]
+    body = "\n".join(json.dumps(event) for event in events) + "\n"
+    handler = scripted(httpx.ConnectError, 503, httpx.Response(200, text=body))
+    client = make_client(handler)
+
+    async def collect() -> list:
+        return [event async for event in client.stream({"message": "hi", "thread_id": "1"})]
+
+    assert asyncio.run(collect()) == events
+    assert client.stats.snapshot()["retries"] == 2
+
+
+def test_from_env_requires_agent_url(monkeypatch):
+    monkeypatch.delenv("AGENT_URL", raising=False)
+    with pytest.raises(ValueError, match="AGENT_URL"):
+        agent_client_from_env()
+    monkeypatch.setenv("AGENT_URL", "http://agent:8000/query/")
+    assert agent_client_from_env().stream_url == "http://agent:8000/query/stream"
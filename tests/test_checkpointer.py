@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import START, MessagesState, StateGraph
+
+from checkpointer import TieredCheckpointer
+
+
+def compile_graph(checkpointer: TieredCheckpointer):
+    """
+    Graph of one node answering every message with its length, persisted by `checkpointer`.
+    """
+    def reply(state: MessagesState) -> dict:
+        return {"messages": [AIMessage(content=str(len(state["messages"][-1].content)))]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("reply", reply)
+    builder.add_edge(START, "reply")
+    return builder.compile(checkpointer=checkpointer)
+
+
+def config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def say(graph, thread_id: str, text: str) -> list:
+    return graph.invoke({"messages": [HumanMessage(content=text)]}, config(thread_id))["messages"]
+
+
+def contents(messages: list) -> list:
+    return [message.content for message in messages]
+
+
+def test_evicted_thread_is_restored_from_the_backend():
+    checkpointer = TieredCheckpointer(max_threads=1)
+    graph = compile_graph(checkpointer)
+    say(graph, "a", "hello")
+    say(graph, "b", "hi")  # Pushes "a" out of the hot tier
+    assert checkpointer.stats()["hot_threads"] == 1
+
+    assert checkpointer.backend.get_tuple(config("a")) is not None
+    misses = checkpointer.stats()["misses"]
+    assert contents(graph.get_state(config("a")).values["messages"]) == ["hello", "5"]
+    assert checkpointer.stats()["misses"] == misses + 1
+    assert contents(say(graph, "a", "again")) == ["hello", "5", "again", "5"]
+
+
+def test_idle_threads_leave_the_hot_tier():
+    checkpointer = TieredCheckpointer(idle_ttl=0.05)
+    graph = compile_graph(checkpointer)
+    say(graph, "a", "hello")
+    time.sleep(0.06)
+    say(graph, "b", "hi")
+    assert checkpointer.stats()["hot_threads"] == 1
+    assert contents(graph.get_state(config("a")).values["messages"]) == ["hello", "5"]
+
+
+def test_latest_checkpoint_is_served_from_the_hot_tier():
+    checkpointer = TieredCheckpointer()
+    graph = compile_graph(checkpointer)
+    say(graph, "a", "hello")
+    hits = checkpointer.stats()["hits"]
+    assert contents(graph.get_state(config("a")).values["messages"]) == ["hello", "5"]
+    assert checkpointer.stats()["hits"] == hits + 1
+
+
+def test_disabled_hot_tier_reads_the_backend():
+    checkpointer = TieredCheckpointer(max_threads=0)
+    graph = compile_graph(checkpointer)
+    say(graph, "a", "hello")
+    assert contents(say(graph, "a", "again")) == ["hello", "5", "again", "5"]
+    assert checkpointer.stats() == {"hits": 0, "misses": checkpointer.misses, "hot_threads": 0}
+
+
+def test_sqlite_conversations_survive_eviction_and_restart(tmp_path):
+    url = f"sqlite:///{tmp_path / 'checkpoints.sqlite3'}"
+
+    async def turn(checkpointer: TieredCheckpointer, thread_id: str, text: str) -> list:
+        graph = compile_graph(checkpointer)
+        result = await graph.ainvoke({"messages": [HumanMessage(content=text)]}, config(thread_id))
+        return contents(result["messages"])
+
+    async def scenario():
+        checkpointer = TieredCheckpointer(url=url, max_threads=1)
+        await checkpointer.open()
+        await turn(checkpointer, "a", "hello")
+        await turn(checkpointer, "b", "hi")  # Evicts "a"
+        evicted = await turn(checkpointer, "a", "again")
+        await checkpointer.close()
+
+        restarted = TieredCheckpointer(url=url)
+        await restarted.open()
+        try:
+            return evicted, await turn(restarted, "a", "once more")
+        finally:
+            await restarted.close()
+
+    evicted, restarted = asyncio.run(scenario())
+    assert evicted == ["hello", "5", "again", "5"]
+    assert restarted == ["hello", "5", "again", "5", "once more", "9"]
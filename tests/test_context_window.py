@@ -0,0 +1,66 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from context_window import TRUNCATED_MARK, ContextWindow
+
+
+def turn(number: int, size: int, tool_output: str = "") -> list:
+    """
+    Build one user turn, optionally with a tool call and its result.
+    """
+    messages = [HumanMessage(content=f"q{number} " + "x" * size, id=f"h{number}")]
+    if tool_output:
+        call = {"name": "search", "args": {"query": "q"}, "id": f"call{number}"}
+        messages.append(AIMessage(content="", tool_calls=[call], id=f"c{number}"))
+        messages.append(ToolMessage(content=tool_output, tool_call_id=f"call{number}", id=f"t{number}"))
+    messages.append(AIMessage(content=f"a{number} " + "y" * size, id=f"a{number}"))
+    return messages
+
+
+def test_within_budget_nothing_changes():
+    window = ContextWindow(max_tokens=1000, window_tokens=500)
+    compaction = window.plan(turn(1, 30) + [HumanMessage(content="next", id="h2")])
+    assert compaction.updates == []
+    assert compaction.evicted == []
+
+
+def test_old_tool_outputs_are_cut():
+    window = ContextWindow(max_tokens=10000, window_tokens=5000, tool_output_chars=20)
+    compaction = window.plan(turn(1, 10, tool_output="r" * 100) + [HumanMessage(content="next", id="h2")])
+    assert [message.id for message in compaction.updates] == ["t1"]
+    assert compaction.updates[0].content == "r" * 20 + TRUNCATED_MARK
+    # Already cut outputs are left alone
+    assert window.plan(turn(1, 10, tool_output=compaction.updates[0].content) + [HumanMessage(content="n")]).updates == []
+
+
+def test_latest_tool_output_is_kept_whole():
+    window = ContextWindow(max_tokens=10000, window_tokens=5000, tool_output_chars=20)
+    messages = turn(1, 10, tool_output="r" * 100)[:3]  # The tool result ends the history
+    assert window.plan(messages).updates == []
+
+
+def test_over_budget_evicts_oldest_whole_turns():
+    window = ContextWindow(max_tokens=200, window_tokens=100, tool_output_chars=10000)
+    messages = turn(1, 150, tool_output="r" * 60) + turn(2, 150) + turn(3, 60) + [HumanMessage(content="q4", id="h4")]
+    compaction = window.plan(messages)
+    evicted = [message.id for message in compaction.evicted]
+    assert evicted[:4] == ["h1", "c1", "t1", "a1"]
+    kept = [message for message in messages if message.id not in set(evicted)]
+    # The window starts at a user message, so tool calls stay with their results
+    assert isinstance(kept[0], HumanMessage)
+    assert kept[-1].id == "h4"
+    assert window.count(kept) <= window.window_tokens
+
+
+def test_oversized_latest_turn_is_kept_whole():
+    window = ContextWindow(max_tokens=50, window_tokens=20)
+    messages = turn(1, 100) + [HumanMessage(content="z" * 600, id="h2")]
+    compaction = window.plan(messages)
+    assert [message.id for message in compaction.evicted] == ["h1", "a1"]
+
+
+def test_evicted_messages_are_not_also_updated():
+    window = ContextWindow(max_tokens=100, window_tokens=50, tool_output_chars=10)
+    messages = turn(1, 100, tool_output="r" * 400) + [HumanMessage(content="q2", id="h2")]
+    compaction = window.plan(messages)
+    assert "t1" in {message.id for message in compaction.evicted}
+    assert compaction.updates == []
@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+pytest.importorskip("asyncpg")
+
+import database  # noqa: E402
+from database import Database  # noqa: E402
+
+
+class FlakyDatabase(Database):
+    """
+    Database whose batch writes fail with the given exceptions first, then succeed.
+    """
+
+    def __init__(self, *failures: BaseException) -> None:
+        super().__init__()
+        self.failures = list(failures)
+        self.written: List[str] = []
+
+    async def _write(self, batch) -> None:
+        if self.failures:
+            raise self.failures.pop(0)
+        self.written.extend(text for _, text, *_ in batch)
+
+
+def test_flush_loop_survives_failed_flushes(monkeypatch):
+    monkeypatch.setattr(database, "MESSAGE_LOG_FLUSH_INTERVAL", 0.01)
+    user = SimpleNamespace(id=1, username="u", first_name="U", last_name=None)
+
+    async def scenario():
+        db = FlakyDatabase(asyncio.TimeoutError(), RuntimeError("connection is closed"))
+        db._wakeup = asyncio.Event()
+        db._flusher = asyncio.create_task(db._flush_loop())
+        db.log_message(user, "hello", "USER")
+        for _ in range(100):
+            if db.written:
+                break
+            await asyncio.sleep(0.01)
+        alive = not db._flusher.done()
+        db.log_message(user, "again", "USER")
+        await asyncio.sleep(0.05)
+        db._flusher.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await db._flusher
+        return alive, db.written, db.failures
+
+    alive, written, failures = asyncio.run(scenario())
+    assert alive
+    assert failures == []
+    assert written == ["hello", "again"]
+
+
+class RecordingConnection:
+    """
+    Connection stand-in recording statements; every new thread gets ID 7 and every user ID 3.
+    """
+
+    def __init__(self) -> None:
+        self.statements: List[tuple] = []
+
+    def transaction(self) -> "RecordingConnection":
+        return self
+
+    async def __aenter__(self) -> "RecordingConnection":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+    async def fetch(self, query: str, *args) -> list:
+        self.statements.append(("fetch", args))
+        return [{"tg_chat_id": chat_id, "user_id": 3} for chat_id in args[1]]
+
+    async def fetchval(self, query: str, *args) -> int:
+        self.statements.append(("fetchval", args))
+        return 7
+
+    async def execute(self, query: str, *args) -> None:
+        self.statements.append(("execute", args))
+
+
+def test_feedback_is_written_at_once_into_a_new_thread():
+    conn = RecordingConnection()
+    db = Database()
+    db.db_pool = SimpleNamespace(acquire=lambda: conn)
+    user = SimpleNamespace(id=1, username="u", first_name="U", last_name=None)
+
+    asyncio.run(db.save_feedback(user, "Спасибо"))
+    assert conn.statements[-2:] == [("fetchval", ()), ("execute", ("Спасибо", 7, 3))]
+    assert list(db._queue) == []
+    conn.statements.clear()
+    asyncio.run(db.save_feedback(user, "Ещё"))  # Known user: no upsert
+    assert [kind for kind, _ in conn.statements] == ["fetchval", "execute"]
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("fastapi")
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    # The service reads its data directory at import time
+    os.environ["FAISS_DATA_DIR"] = str(tmp_path_factory.mktemp("faiss"))
+    from fastapi.testclient import TestClient
+
+    import faiss_service
+
+    with TestClient(faiss_service.app) as client:
+        assert client.post("/create_index", json={"key": "tours", "dimension": 2}).status_code == 200
+        assert client.post("/add_vectors/tours", json=[[1, 0], [0, 1], [1, 1]]).status_code == 200
+        yield client
+
+
+def test_search(client):
+    response = client.post("/search", json={"key": "tours", "query": [1, 0], "k": 2})
+    assert response.status_code == 200
+    assert response.json()["indices"][0][0] == 0
+
+
+@pytest.mark.parametrize("k", [0, -1])
+def test_search_rejects_non_positive_k(client, k):
+    assert client.post("/search", json={"key": "tours", "query": [1, 0], "k": k}).status_code == 422
+    assert client.post("/search_batch", json={"key": "tours", "queries": [[1, 0]], "k": k}).status_code == 422
+    body = np.array([[1, 0]], dtype="<f4").tobytes()
+    response = client.post(
+        f"/search_batch/tours?k={k}", content=body, headers={"content-type": "application/octet-stream"}
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("field", ["k", "sample"])
+def test_recall_rejects_non_positive_sizes(client, field):
+    assert client.post("/recall/tours", json={"k": 2, "sample": 3}).json()["recall"] == 1.0
+    assert client.post("/recall/tours", json={field: 0}).status_code == 422
+    assert client.post("/recall/tours", json={field: -1}).status_code == 422
+
+
+def test_search_batch_binary(client):
+    body = np.array([[1, 0], [0, 1]], dtype="<f4").tobytes()
+    response = client.post(
+        "/search_batch/tours?k=1", content=body, headers={"content-type": "application/octet-stream"}
+    )
+    assert response.status_code == 200
+    assert response.json()["indices"] == [[0], [1]]
+
+
+def test_search_batch_rejects_ragged_queries(client):
+    assert client.post("/search_batch", json={"key": "tours", "queries": [[1, 0], [1]]}).status_code == 400
+
+
+def test_batched_search_latency_is_labelled_by_caller_name(client, monkeypatch):
+    import faiss_service
+
+    observed = []
+    monkeypatch.setattr(faiss_service, "MICROBATCH", True)
+    monkeypatch.setattr(faiss_service, "observe_search", lambda name, *args: observed.append(name))
+    assert client.post("/aliases/hotels", json={"version": "tours"}).status_code == 200
+    response = client.post("/search", json={"key": "hotels", "query": [0, 1], "k": 1})
+    assert response.status_code == 200
+    assert response.json()["indices"] == [[1]]
+    assert observed == ["hotels"]
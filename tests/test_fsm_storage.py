@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+from fsm_storage import SQLiteStorage, SQLStorage  # noqa: E402
+
+
+def test_sql_storage_is_abstract():
+    with pytest.raises(TypeError):
+        SQLStorage()
+
+
+def test_sqlite_state_is_shared_and_cleared(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+
+    async def scenario():
+        writer, reader = SQLiteStorage(path), SQLiteStorage(path)  # As in two worker processes
+        await writer.set_state(chat=42, user=7, state="feedback")
+        await writer.update_data(chat=42, user=7, topic="visa")
+        seen = await reader.get_state(chat=42, user=7), await reader.get_data(chat=42, user=7)
+        await writer.reset_state(chat=42, user=7)
+        cleared = await reader.get_state(chat=42, user=7), await reader.get_data(chat=42, user=7)
+        await writer.close()
+        await reader.close()
+        return seen, cleared
+
+    seen, cleared = asyncio.run(scenario())
+    assert seen == ("feedback", {"topic": "visa"})
+    assert cleared == (None, {})
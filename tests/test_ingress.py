@@ -0,0 +1,167 @@
+import asyncio
+import multiprocessing
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+from aiogram import Bot, Dispatcher  # noqa: E402
+from aiogram.contrib.fsm_storage.memory import MemoryStorage  # noqa: E402
+
+import ingress  # noqa: E402
+
+
+def message(update_id: int, chat: int, text: str, sender: int = None) -> Dict[str, Any]:
+    sender = chat if sender is None else sender
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat, "type": "private"},
+            "from": {"id": sender, "is_bot": False, "first_name": "u"},
+            "text": text,
+        },
+    }
+
+
+def test_chat_key_of_update_kinds():
+    assert ingress.chat_key(message(1, 42, "hi", sender=7)) == 42
+    callback = {"update_id": 2, "callback_query": {"id": "c", "from": {"id": 7}, "message": {"chat": {"id": 42}}}}
+    assert ingress.chat_key(callback) == 42
+    assert ingress.chat_key({"update_id": 3, "inline_query": {"id": "i", "from": {"id": 7}, "query": ""}}) == 7
+    assert ingress.chat_key({"update_id": 4, "poll_answer": {"poll_id": "p", "user": {"id": 9}}}) == 9
+    assert ingress.chat_key({"update_id": 5}) == 0
+
+
+def test_worker_for_is_stable_per_chat():
+    workers = 4
+    picked = {ingress.worker_for(message(i, chat, str(i)), workers) for i, chat in enumerate([42] * 10)}
+    assert len(picked) == 1
+    callback = {"update_id": 1, "callback_query": {"id": "c", "from": {"id": 7}, "message": {"chat": {"id": 42}}}}
+    assert ingress.worker_for(callback, workers) in picked
+    assert all(0 <= ingress.worker_for(message(i, i, "x"), workers) < workers for i in range(100))
+    assert len({ingress.worker_for(message(i, i, "x"), workers) for i in range(100)}) == workers
+
+
+def test_user_key():
+    assert ingress.user_key(message(1, 42, "hi", sender=7)) == 7
+    assert ingress.user_key({"update_id": 2, "poll": {"id": "p"}}) is None
+
+
+class RecordingDispatcher(Dispatcher):
+    """
+    Dispatcher that records when each message starts and ends; "done" leaves the FSM state.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(Bot(token="1:test"), storage=MemoryStorage())
+        self.log: List[Tuple[str, str]] = []
+
+    async def process_update(self, update: Any) -> None:
+        text = update.message.text
+        self.log.append(("start", text))
+        if text == "done":
+            await self.storage.set_state(chat=update.message.chat.id, user=update.message.from_user.id, state=None)
+        await asyncio.sleep(0.05)
+        self.log.append(("end", text))
+
+
+def run_worker(updates: List[Dict[str, Any]], state: str = None) -> List[Tuple[str, str]]:
+    queue = multiprocessing.Queue()
+    for update in updates:
+        queue.put(update)
+    queue.put(None)
+
+    async def on_startup(dp: Dispatcher) -> None:
+        if state is not None:
+            await dp.storage.set_state(chat=42, user=42, state=state)
+
+    async def on_shutdown(dp: Dispatcher) -> None:
+        pass
+
+    dp = RecordingDispatcher()
+    asyncio.run(ingress._work(0, queue, dp, on_startup, on_shutdown))
+    return dp.log
+
+
+def test_chat_updates_overlap_outside_fsm_states():
+    log = run_worker([message(1, 42, "a"), message(2, 42, "b")])
+    assert log[:2] == [("start", "a"), ("start", "b")]
+
+
+def test_chat_updates_wait_while_in_fsm_state():
+    log = run_worker([message(1, 42, "done"), message(2, 42, "c"), message(3, 42, "d")], state="feedback")
+    # "done" runs alone because the chat is in a state; once it clears it, updates overlap again
+    assert log[:3] == [("start", "done"), ("end", "done"), ("start", "c")]
+    assert log.index(("start", "d")) < log.index(("end", "c"))
+
+
+def test_other_chats_do_not_wait_for_a_chat_in_fsm_state():
+    log = run_worker([message(1, 42, "done"), message(2, 7, "x")], state="feedback")
+    assert log[:2] == [("start", "done"), ("start", "x")]
+
+
+class QueueRouter:
+    """
+    Router stand-in accepting updates until `capacity` are queued.
+    """
+
+    def __init__(self, capacity: int = 10) -> None:
+        self.capacity = capacity
+        self.routed: List[Dict[str, Any]] = []
+
+    def route(self, update: Dict[str, Any]) -> bool:
+        if len(self.routed) >= self.capacity:
+            return False
+        self.routed.append(update)
+        return True
+
+
+class OfflineBot:
+    """
+    Bot stand-in for the webhook app's startup and cleanup hooks.
+    """
+
+    async def set_webhook(self, url: str, secret_token: str) -> None:
+        pass
+
+    async def get_session(self) -> "OfflineBot":
+        return self
+
+    async def close(self) -> None:
+        pass
+
+
+def post_webhook(router: QueueRouter, monkeypatch, *requests: Tuple[Dict[str, str], bytes]) -> List[int]:
+    from aiohttp.test_utils import TestClient, TestServer
+
+    monkeypatch.setattr(ingress, "WEBHOOK_URL", "https://bot.example/webhook")
+    monkeypatch.setattr(ingress, "WEBHOOK_SECRET", "s3cret")
+
+    async def scenario() -> List[int]:
+        async with TestClient(TestServer(ingress.webhook_app(OfflineBot(), router))) as client:
+            statuses = []
+            for headers, body in requests:
+                response = await client.post(ingress.WEBHOOK_PATH, data=body, headers=headers)
+                statuses.append(response.status)
+            return statuses
+
+    return asyncio.run(scenario())
+
+
+def test_webhook_checks_the_secret_and_the_body(monkeypatch):
+    secret = {"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+    router = QueueRouter(capacity=1)
+    statuses = post_webhook(
+        router, monkeypatch,
+        ({}, b'{"update_id": 1}'),
+        ({"X-Telegram-Bot-Api-Secret-Token": "wrong"}, b'{"update_id": 1}'),
+        (secret, b'{"update_id": '),
+        (secret, b'[1, 2]'),
+        (secret, b'{"update_id": 1}'),
+        (secret, b'{"update_id": 2}'),
+    )
+    assert statuses == [401, 401, 400, 400, 200, 503]
+    assert router.routed == [{"update_id": 1}]
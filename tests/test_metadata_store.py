@@ -0,0 +1,67 @@
+import pytest
+
+from metadata_store import MetadataStore
+
+
+@pytest.fixture
+def tours() -> MetadataStore:
+    store = MetadataStore(filterable=["country", "price"])
+    store.upsert(
+        [10, 11, 12, 13],
+        {"country": ["TR", "EG", "TR", "GE"], "price": [500, 300, 900, 400], "title": ["a", "b", "c", "d"]},
+    )
+    return store
+
+
+def test_get_returns_requested_fields(tours):
+    assert tours.get([11, 99], ["title"]) == [{"title": "b"}, None]
+    assert tours.get([13]) == [{"country": "GE", "price": 400, "title": "d"}]
+
+
+def test_upsert_and_remove(tours):
+    tours.upsert([11], {"price": [350]})
+    tours.remove([10])
+    assert tours.get([10, 11]) == [None, {"country": "EG", "price": 350, "title": "b"}]
+    assert len(tours) == 3
+
+
+def test_round_trip(tours):
+    restored = MetadataStore.from_dict(tours.to_dict(), ["country", "price"])
+    assert restored.get([12, 99], ["country"]) == [{"country": "TR"}, None]
+
+
+def test_filter_eq(tours):
+    assert sorted(tours.filter_ids([{"field": "country", "eq": "TR"}]).tolist()) == [10, 12]
+
+
+def test_filter_any_of(tours):
+    ids = tours.filter_ids([{"field": "country", "any_of": ["EG", "GE"]}])
+    assert sorted(ids.tolist()) == [11, 13]
+
+
+def test_filter_range_and_conditions_combine(tours):
+    ids = tours.filter_ids([{"field": "country", "eq": "TR"}, {"field": "price", "lt": 600}])
+    assert ids.tolist() == [10]
+    ids = tours.filter_ids([{"field": "price", "gte": 400, "lte": 500}])
+    assert sorted(ids.tolist()) == [10, 13]
+
+
+def test_filter_unknown_value_matches_nothing(tours):
+    assert tours.filter_ids([{"field": "country", "eq": "FR"}]).tolist() == []
+
+
+def test_filter_sees_writes(tours):
+    tours.filter_ids([{"field": "country", "eq": "TR"}])  # Builds the bitset cache
+    tours.upsert([11], {"country": ["TR"]})
+    tours.remove([10])
+    assert sorted(tours.filter_ids([{"field": "country", "eq": "TR"}]).tolist()) == [11, 12]
+
+
+def test_filter_rejects_fields_not_filterable(tours):
+    with pytest.raises(ValueError):
+        tours.filter_ids([{"field": "title", "eq": "a"}])
+
+
+def test_filter_survives_round_trip(tours):
+    restored = MetadataStore.from_dict(tours.to_dict(), ["country", "price"])
+    assert sorted(restored.filter_ids([{"field": "price", "gt": 450}]).tolist()) == [10, 12]
@@ -0,0 +1,84 @@
+import asyncio
+from typing import Hashable, List, Tuple
+
+import numpy as np
+
+from micro_batcher import MicroBatcher
+
+
+def recording_batcher(**kwargs) -> Tuple[MicroBatcher, List[Tuple[int, Hashable]]]:
+    calls: List[Tuple[int, Hashable]] = []
+
+    async def search(queries: np.ndarray, group: Hashable):
+        calls.append((len(queries), group))
+        return queries[:, :1], queries[:, :1].astype("int64"), None
+
+    return MicroBatcher("test", search, **kwargs), calls
+
+
+def query(value: float) -> np.ndarray:
+    return np.full((1, 4), value, dtype="float32")
+
+
+def test_concurrent_queries_share_a_call_and_get_their_rows():
+    async def scenario():
+        batcher, calls = recording_batcher(max_wait_ms=5)
+        results = await asyncio.gather(*(batcher.submit(query(i), group="k=1") for i in range(3)))
+        return batcher, calls, results
+
+    batcher, calls, results = asyncio.run(scenario())
+    assert calls == [(3, "k=1")]
+    assert [int(indices[0, 0]) for _, indices, _ in results] == [0, 1, 2]
+    assert batcher.idle
+
+
+def test_groups_are_never_mixed():
+    async def scenario():
+        batcher, calls = recording_batcher(max_wait_ms=5)
+        await asyncio.gather(*(batcher.submit(query(i), group=i % 2) for i in range(4)))
+        return calls
+
+    assert sorted(asyncio.run(scenario())) == [(2, 0), (2, 1)]
+
+
+def test_full_batch_dispatches_without_waiting():
+    async def scenario():
+        batcher, calls = recording_batcher(max_batch_size=2, max_wait_ms=10000)
+        await asyncio.wait_for(asyncio.gather(batcher.submit(query(0)), batcher.submit(query(1))), 1)
+        return calls
+
+    assert asyncio.run(scenario()) == [(2, None)]
+
+
+def test_search_errors_reach_every_caller():
+    async def failing(queries: np.ndarray, group: Hashable):
+        raise RuntimeError("index busy")
+
+    async def scenario():
+        batcher = MicroBatcher("test", failing, max_wait_ms=1)
+        return await asyncio.gather(batcher.submit(query(0)), batcher.submit(query(1)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_batcher_is_busy_until_the_search_finishes():
+    release = None
+
+    async def slow(queries: np.ndarray, group: Hashable):
+        await release.wait()
+        return queries[:, :1], queries[:, :1].astype("int64"), None
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        batcher = MicroBatcher("test", slow, max_wait_ms=1)
+        task = asyncio.ensure_future(batcher.submit(query(0)))
+        await asyncio.sleep(0.01)
+        busy = not batcher.idle  # Dispatched, not yet answered
+        release.set()
+        await task
+        await asyncio.sleep(0)
+        return busy, batcher.idle
+
+    assert asyncio.run(scenario()) == (True, True)
@@ -0,0 +1,76 @@
+import asyncio
+from typing import List
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import StructuredTool
+
+from retrieval import CatalogueRetriever
+from stand_ins import FakeEmbedder, InProcessIndex, QuietModel
+
+CATALOGUE = [
+    "Анталия отель Rixos пять звёзд всё включено первая линия",
+    "Шарм эль Шейх дайвинг тур на неделю с перелётом",
+    "Тбилиси гастрономический тур вино и хинкали",
+]
+
+
+class BrokenEmbedder(FakeEmbedder):
+    def embed_query(self, text: str) -> List[float]:
+        raise RuntimeError("embedding API is down")
+
+
+def web_search(query: str) -> str:
+    """Искать в интернете"""
+    return ""
+
+
+def catalogue_retriever(embedder: FakeEmbedder = None) -> CatalogueRetriever:
+    embedder = embedder or FakeEmbedder()
+    index = InProcessIndex(embedder.dimension)
+    index.add(FakeEmbedder(embedder.dimension).embed_documents(CATALOGUE), [{"text": text} for text in CATALOGUE])
+    return CatalogueRetriever(embedder, index, min_score=0.75)
+
+
+@pytest.fixture
+def agent(tour_agent):
+    tools = [StructuredTool.from_function(web_search)]
+    return tour_agent.LangGraphAgent(llm=QuietModel(), tools=tools, retriever=catalogue_retriever())
+
+
+def state(question: str) -> dict:
+    return {"messages": [HumanMessage(content=question)]}
+
+
+def test_retriever_returns_best_passage_first():
+    passages = catalogue_retriever().retrieve("Анталия отель всё включено")
+    assert passages[0].text == CATALOGUE[0]
+    assert [passage.score for passage in passages] == sorted((passage.score for passage in passages), reverse=True)
+
+
+def test_confident_hit_becomes_context(agent):
+    context = agent.retrieve(state("Анталия отель Rixos пять звёзд всё включено"))["context"]
+    assert context.startswith("[1] " + CATALOGUE[0])
+    assert asyncio.run(agent.aretrieve(state("Тбилиси гастрономический тур вино")))["context"].startswith(
+        "[1] " + CATALOGUE[2]
+    )
+
+
+def test_below_threshold_match_gives_no_context(agent):
+    passages = agent.retriever.retrieve("горнолыжный курорт в Альпах")
+    assert not agent.retriever.is_confident(passages)
+    assert agent.retrieve(state("горнолыжный курорт в Альпах")) == {"context": ""}
+
+
+def test_retrieval_failure_falls_back_to_no_context(tour_agent):
+    agent = tour_agent.LangGraphAgent(llm=QuietModel(), tools=[], retriever=catalogue_retriever(BrokenEmbedder()))
+    assert agent.retrieve(state("Анталия")) == {"context": ""}
+    assert asyncio.run(agent.aretrieve(state("Анталия"))) == {"context": ""}
+
+
+def test_confident_context_offers_catalogue_tool_only(agent):
+    llm, messages = agent._prompt({"messages": [HumanMessage(content="Анталия")], "context": "[1] Rixos"})
+    assert llm.kwargs["tools"] == ["catalogue_search"]
+    assert "[1] Rixos" in messages[0].content
+    llm, _ = agent._prompt({"messages": [HumanMessage(content="Альпы")], "context": ""})
+    assert llm.kwargs["tools"] == ["catalogue_search", "web_search"]
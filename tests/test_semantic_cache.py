@@ -0,0 +1,147 @@
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import httpx
+import pytest
+
+from retrieval import FaissServiceClient
+from semantic_cache import SemanticCache
+from stand_ins import FakeEmbedder, InProcessIndex, QuietModel
+
+
+class FaissStub:
+    """
+    In-memory Faiss service answering the HTTP routes the cache uses, for `httpx.MockTransport`.
+
+    Unknown index keys get a 404, as after a restart of the real service.
+    """
+
+    def __init__(self) -> None:
+        self.indexes: Dict[str, InProcessIndex] = {}
+        self.paths: List[str] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        body = json.loads(request.content)
+        self.paths.append(path)
+        if path == "/create_index":
+            if body["key"] in self.indexes:
+                return httpx.Response(400, json={"detail": "Index already exists."})
+            self.indexes[body["key"]] = InProcessIndex(body["dimension"])
+            return httpx.Response(200, json={})
+        key = body["key"] if path == "/search" else path.rsplit("/", 1)[-1]
+        index = self.indexes.get(key)
+        if index is None:
+            return httpx.Response(404, json={"detail": "Index not found."})
+        if path == "/search":
+            return httpx.Response(200, json=index.search(key, body["query"], body["k"], body["fields"]))
+        if path.startswith("/upsert/"):
+            index.upsert(key, body["ids"], body["vectors"], body["metadata"])
+            return httpx.Response(200, json={})
+        return httpx.Response(200, json={"removed": index.remove_ids(key, body["ids"])})
+
+    def size(self, key: str = "semantic_cache") -> int:
+        return self.indexes[key].index.ntotal
+
+
+@pytest.fixture
+def faiss_stub() -> FaissStub:
+    return FaissStub()
+
+
+def make_cache(stub: FaissStub, **kwargs) -> SemanticCache:
+    client = FaissServiceClient("http://faiss")
+    transport = httpx.MockTransport(stub)
+    client._client = httpx.Client(base_url="http://faiss", transport=transport)
+    client._aclient = httpx.AsyncClient(base_url="http://faiss", transport=transport)
+    return SemanticCache(FakeEmbedder(), client, **kwargs)
+
+
+def remember(cache: SemanticCache, question: str, answer: str) -> None:
+    lookup = cache.lookup(question)
+    assert lookup.answer is None
+    cache.store(lookup, answer, tokens=10)
+
+
+def test_hit_for_same_question(faiss_stub):
+    cache = make_cache(faiss_stub)
+    remember(cache, "Сколько стоит тур в Анталию?", "От 50 000 рублей")
+    assert cache.lookup("сколько стоит тур в анталию").answer == "От 50 000 рублей"
+    assert cache.lookup("Нужна ли виза в Грузию").answer is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["saved_tokens"]) == (1, 2, 10)
+
+
+def test_expired_entries_miss_and_leave_the_index(faiss_stub):
+    cache = make_cache(faiss_stub, ttl=0.05)
+    remember(cache, "Сколько стоит тур в Анталию?", "От 50 000 рублей")
+    time.sleep(0.06)
+    assert cache.lookup("Сколько стоит тур в Анталию?").answer is None
+    assert faiss_stub.size() == 0
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(faiss_stub):
+    cache = make_cache(faiss_stub, max_entries=2)
+    remember(cache, "виза в Грузию", "Не нужна")
+    remember(cache, "тур в Анталию", "От 50 000 рублей")
+    assert cache.lookup("виза в Грузию").answer == "Не нужна"  # Now the most recent
+    remember(cache, "дайвинг в Египте", "Шарм эль Шейх")
+    assert faiss_stub.size() == 2
+    assert cache.lookup("тур в Анталию").answer is None
+    assert cache.lookup("виза в Грузию").answer == "Не нужна"
+
+
+def test_index_is_recreated_after_the_service_lost_it(faiss_stub):
+    cache = make_cache(faiss_stub)
+    remember(cache, "виза в Грузию", "Не нужна")
+    faiss_stub.indexes.clear()  # The service restarted without the cache index
+    remember(cache, "тур в Анталию", "От 50 000 рублей")
+    assert faiss_stub.paths.count("/create_index") == 2
+    assert cache.lookup("тур в Анталию").answer == "От 50 000 рублей"
+    assert cache.stats()["entries"] == 1
+
+
+def test_async_store_recreates_a_lost_index(faiss_stub):
+    cache = make_cache(faiss_stub)
+
+    async def scenario():
+        for question, answer in [("виза в Грузию", "Не нужна"), ("тур в Анталию", "От 50 000 рублей")]:
+            lookup = await cache.alookup(question)
+            await cache.astore(lookup, answer)
+            faiss_stub.indexes.clear()
+        await cache.astore(await cache.alookup("дайвинг в Египте"), "Шарм эль Шейх")
+        return await cache.alookup("дайвинг в Египте")
+
+    assert asyncio.run(scenario()).answer == "Шарм эль Шейх"
+    assert faiss_stub.paths.count("/create_index") == 3
+
+
+def test_unreachable_service_is_a_miss():
+    def down(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+
+    cache = make_cache(down)
+    lookup = cache.lookup("виза в Грузию")
+    assert lookup.answer is None
+    cache.store(lookup, "Не нужна")  # Dropped without raising
+    assert cache.stats()["entries"] == 0
+
+
+def test_follow_ups_within_the_session_gap_skip_the_cache(tour_agent):
+    async def ask(api, message: str, thread_id: str) -> str:
+        return (await api._process(message, thread_id))["response"]
+
+    async def scenario(session_gap: float):
+        model = QuietModel()
+        cache = make_cache(FaissStub(), session_gap=session_gap)
+        api = tour_agent.AgentAPI(tour_agent.LangGraphAgent(llm=model, tools=[]), cache)
+        await ask(api, "тур в Анталию", "first")
+        await ask(api, "тур в Анталию", "second")  # New conversation: answered from the cache
+        await ask(api, "тур в Анталию", "second")  # Follow-up: the graph answers
+        return model.calls, cache.stats()["hits"]
+
+    assert asyncio.run(scenario(session_gap=1800)) == (2, 1)
+    assert asyncio.run(scenario(session_gap=0)) == (1, 2)
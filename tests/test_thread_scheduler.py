@@ -0,0 +1,66 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from thread_scheduler import Superseded, ThreadScheduler
+
+
+async def ask(scheduler: ThreadScheduler, thread_id: str, message: str, log: List[str], hold: float = 0.0) -> str:
+    async with scheduler.turn(thread_id, message) as text:
+        log.append(text)
+        await asyncio.sleep(hold)
+        return text
+
+
+def test_messages_queued_during_a_turn_are_merged():
+    async def scenario():
+        scheduler = ThreadScheduler()
+        log: List[str] = []
+        first = asyncio.create_task(ask(scheduler, "t", "a", log, hold=0.05))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(ask(scheduler, "t", "b", log))
+        await asyncio.sleep(0)
+        third = asyncio.create_task(ask(scheduler, "t", "c", log))
+        results = await asyncio.gather(first, second, third, return_exceptions=True)
+        return scheduler, log, results
+
+    scheduler, log, results = asyncio.run(scenario())
+    assert results[0] == "a"
+    assert isinstance(results[1], Superseded)
+    assert results[2] == "b\nc"
+    assert log == ["a", "b\nc"]
+    assert scheduler.stats() == {"busy_threads": 0, "queued_batches": 0, "merged_messages": 1}
+
+
+def test_threads_run_in_parallel():
+    async def scenario():
+        scheduler = ThreadScheduler()
+        log: List[str] = []
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*(ask(scheduler, str(i), "hi", log, hold=0.05) for i in range(5)))
+        return loop.time() - started
+
+    assert asyncio.run(scenario()) < 0.2
+
+
+def test_cancelled_waiter_drops_its_batch():
+    async def scenario():
+        scheduler = ThreadScheduler()
+        log: List[str] = []
+        first = asyncio.create_task(ask(scheduler, "t", "a", log, hold=0.05))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(ask(scheduler, "t", "b", log))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await first
+        # The thread is free again: the next message runs at once, alone
+        assert await ask(scheduler, "t", "c", log) == "c"
+        return scheduler, log
+
+    scheduler, log = asyncio.run(scenario())
+    assert log == ["a", "c"]
+    assert scheduler.stats()["busy_threads"] == 0
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from tool_cache import ToolResultCache, cache_key
+
+
+def test_cache_key_normalizes_arguments():
+    assert cache_key("search", {"query": "Отели  Анталии", "n": 3}) == cache_key(
+        "search", {"n": 3, "query": "отели анталии"}
+    )
+    assert cache_key("search", {"query": "a"}) != cache_key("catalogue", {"query": "a"})
+
+
+def test_entries_expire_after_their_ttl():
+    cache = ToolResultCache()
+    cache.set("k", "value", ttl=0.05)
+    assert cache.get("k") == (True, "value")
+    time.sleep(0.06)
+    assert cache.get("k") == (False, None)
+
+
+def test_zero_ttl_disables_caching():
+    cache = ToolResultCache(ttls={"search": 0})
+    cache.set("k", "value", cache.ttl_for("search"))
+    assert cache.get("k") == (False, None)
+
+
+def test_lru_bound():
+    cache = ToolResultCache(max_entries=2)
+    for key in "abc":
+        cache.set(key, key, ttl=60)
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["entries"] == 2
+
+
+def test_sqlite_entries_survive_restart(tmp_path):
+    path = str(tmp_path / "tools.sqlite3")
+    asyncio.run(ToolResultCache(sqlite_path=path).aset("k", {"hits": [1, 2]}, ttl=60))
+    assert ToolResultCache(sqlite_path=path).get("k") == (True, {"hits": [1, 2]})
+
+
+def test_concurrent_async_calls_run_once():
+    calls = 0
+
+    async def tool():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return calls
+
+    async def scenario(cache):
+        return await asyncio.gather(*(cache.acall("k", 60, tool) for _ in range(5)))
+
+    cache = ToolResultCache()
+    assert asyncio.run(scenario(cache)) == [1] * 5
+    assert calls == 1
+    assert asyncio.run(cache.acall("k", 60, tool)) == 1  # Served from the cache
+
+
+def test_concurrent_sync_calls_run_once():
+    calls = 0
+    release = threading.Event()
+
+    def tool():
+        nonlocal calls
+        calls += 1
+        release.wait(1)
+        return "result"
+
+    cache = ToolResultCache()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.call("k", 60, tool))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["result"] * 4
+    assert calls == 1
+
+
+def test_failures_are_shared_but_not_cached():
+    calls = 0
+
+    async def tool():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("search failed")
+
+    async def scenario(cache):
+        return await asyncio.gather(*(cache.acall("k", 60, tool) for _ in range(3)), return_exceptions=True)
+
+    cache = ToolResultCache()
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(scenario(cache)))
+    assert calls == 1
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.acall("k", 60, tool))
+    assert calls == 2
+
+
+def test_waiters_outlive_a_cancelled_leader():
+    calls = 0
+
+    async def tool():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    async def scenario(cache):
+        leader = asyncio.create_task(cache.acall("k", 60, tool))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(cache.acall("k", 60, tool)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(leader, *waiters, return_exceptions=True)
+
+    leader, *waiters = asyncio.run(scenario(ToolResultCache()))
+    assert isinstance(leader, asyncio.CancelledError)
+    assert waiters == [2, 2]
+    assert calls == 2
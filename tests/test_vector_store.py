@@ -0,0 +1,161 @@
+import os
+
+import numpy as np
+import pytest
+
+from vector_store import KEY_PATTERN, IndexSpec, VectorStore
+
+DIMENSION = 8
+
+
+def unit(*positions: int) -> np.ndarray:
+    """
+    Return one basis vector per position, as a float32 matrix.
+    """
+    vectors = np.zeros((len(positions), DIMENSION), dtype="float32")
+    vectors[np.arange(len(positions)), positions] = 1.0
+    return vectors
+
+
+@pytest.fixture
+def store(tmp_path) -> VectorStore:
+    store = VectorStore(data_dir=str(tmp_path))
+    store.create("tours", DIMENSION, IndexSpec(id_map=True, filterable=["country"]))
+    store.upsert("tours", np.array([100, 101, 102]), unit(0, 1, 2), {"country": ["TR", "EG", "TR"]})
+    return store
+
+
+def nearest(store: VectorStore, key: str, query: np.ndarray, k: int = 1, **kwargs) -> list:
+    _, indices, _ = store.search(key, query.copy(), k, **kwargs)
+    return indices[0].tolist()
+
+
+def test_upsert_returns_caller_ids_and_metadata(store):
+    _, indices, hits = store.search("tours", unit(1), 1, fields=["*"])
+    assert indices.tolist() == [[101]]
+    assert hits == [[{"country": "EG"}]]
+
+
+def test_upsert_replaces_existing_id(store):
+    store.upsert("tours", np.array([101]), unit(5), {"country": ["GE"]})
+    assert store["tours"].ntotal == 3
+    assert nearest(store, "tours", unit(5)) == [101]
+    assert store.metadata["tours"].get([101]) == [{"country": "GE"}]
+
+
+def test_remove_drops_vectors_and_metadata(store):
+    assert store.remove("tours", np.array([100, 999])) == 1
+    assert store["tours"].ntotal == 2
+    assert 100 not in nearest(store, "tours", unit(0), k=3)
+    assert store.metadata["tours"].get([100]) == [None]
+
+
+def test_filter_restricts_hits(store):
+    hits = nearest(store, "tours", unit(1), k=3, filters=[{"field": "country", "eq": "TR"}])
+    assert sorted(hit for hit in hits if hit >= 0) == [100, 102]
+
+
+def test_filter_on_field_not_filterable(store):
+    with pytest.raises(ValueError):
+        store.search("tours", unit(0), 1, filters=[{"field": "title", "eq": "x"}])
+
+
+def test_snapshot_round_trip(store, tmp_path):
+    store.save("tours")
+    restarted = VectorStore(data_dir=str(tmp_path))
+    assert restarted.snapshot_keys() == ["tours"]
+    restarted.load("tours")
+    _, indices, hits = restarted.search("tours", unit(2), 1, fields=["country"])
+    assert indices.tolist() == [[102]]
+    assert hits == [[{"country": "TR"}]]
+    assert nearest(restarted, "tours", unit(1), k=3, filters=[{"field": "country", "eq": "EG"}])[0] == 101
+
+
+def test_stats_count_operations(store):
+    store.search("tours", unit(0, 1), 1)
+    store.remove("tours", np.array([100]))
+    stats = store.stats()["tours"]
+    assert (stats["vectors"], stats["metadata_rows"]) == (2, 2)
+    assert (stats["added"], stats["removed"], stats["searches"], stats["queries"]) == (3, 1, 1, 2)
+
+
+def test_sharded_index_routes_ids(tmp_path):
+    store = VectorStore(data_dir=str(tmp_path))
+    store.create("tours", DIMENSION, IndexSpec(id_map=True, shards=2))
+    store.upsert("tours", np.array([1, 2, 3]), unit(1, 2, 3), {})
+    assert [part.ntotal for part in store.parts(store["tours"])] == [1, 2]
+    assert nearest(store, "tours", unit(2)) == [2]
+    store.remove("tours", np.array([3]))
+    assert store["tours"].ntotal == 2
+
+
+def build_version(store: VectorStore, alias: str, position: int) -> str:
+    version = store.next_version(alias)
+    store.create(version, DIMENSION, IndexSpec())
+    store.add(version, unit(position))
+    return version
+
+
+def test_swap_and_rollback(store):
+    v1 = build_version(store, "tours", 6)
+    assert v1 == "tours.v1"
+    assert store.swap("tours", v1) is None
+    assert store.resolve("tours") == v1
+    assert store.previous["tours"] == "tours"
+
+    assert store.rollback("tours") == "tours"
+    assert store.resolve("tours") == "tours"
+    assert store.rollback("tours") == v1
+    assert store.resolve("tours") == v1
+
+
+def test_swap_retires_the_version_before_previous(store):
+    v1 = build_version(store, "tours", 6)
+    store.swap("tours", v1)
+    store.save(v1)
+    v2 = build_version(store, "tours", 7)
+    assert store.swap("tours", v2) == "tours"
+    assert "tours" not in store
+    assert store.previous["tours"] == v1
+
+    v1_snapshot = store.snapshot_paths(v1)[0]
+    v3 = build_version(store, "tours", 5)
+    assert store.swap("tours", v3) == v1
+    assert v1 not in store
+    assert not os.path.exists(v1_snapshot)
+
+
+def test_aliases_survive_restart(store, tmp_path):
+    v1 = build_version(store, "tours", 6)
+    store.save(v1)
+    store.save("tours")
+    store.swap("tours", v1)
+
+    restarted = VectorStore(data_dir=str(tmp_path))
+    for key in restarted.snapshot_keys():
+        restarted.load(key)
+    assert restarted.load_aliases()
+    assert restarted.resolve("tours") == v1
+    assert restarted.previous["tours"] == "tours"
+
+
+def test_create_rejects_alias_names(store):
+    store.swap("news", build_version(store, "news", 6))
+    assert store.resolve("news") == "news.v1"
+    with pytest.raises(ValueError):
+        store.create("news", DIMENSION)
+
+
+def test_rollback_without_previous(store):
+    with pytest.raises(ValueError):
+        store.rollback("tours")
+
+
+@pytest.mark.parametrize("key", ["tours", "tours.v2", "a-b_c", "tours.metadata"])
+def test_key_pattern_accepts(key):
+    assert KEY_PATTERN.match(key)
+
+
+@pytest.mark.parametrize("key", ["tours.meta", "aliases", ".hidden", "a/b", "", "two words"])
+def test_key_pattern_rejects_snapshot_collisions(key):
+    assert not KEY_PATTERN.match(key)